@@ -1,13 +1,31 @@
+import numpy as np
 import pandas as pd
 import re
-from typing import Optional, Tuple
+
+from coordenadas import IndiceCoordenadas
+from esquema import compactar, relatorio_memoria
+from leitura import ler_excel
+from sequenciamento import sequenciar_rotas
 
 # Arquivos de entrada
 ARQUIVO_ROTAS = "QT Guanabara - Maio de 2025.xlsx"
 ARQUIVO_COORD = "Coordenadas_gua.xlsx"
 
-rotas = pd.read_excel(ARQUIVO_ROTAS)
-coordenadas = pd.read_excel(ARQUIVO_COORD)
+# Colunas usadas de cada planilha; as demais nem são carregadas
+COLUNAS_ROTAS = ["PREFIXO", "DESCRICAO DA LINHA", "ORIGEM", "DESTINO"]
+COLUNAS_COORD = ["CIDADE (UF)", "LAT", "LON"]
+
+# Projeção no grande círculo (mais fiel em linhas longas norte-sul, como
+# Fortaleza - São Paulo); desligada mantém a projeção no plano lat/lon
+PROJECAO_ESFERICA = False
+
+# Similaridade mínima (0 a 1) para aceitar uma cidade escrita de forma
+# diferente de Coordenadas_gua.xlsx; None aceita só correspondências exatas
+LIMIAR_APROXIMADO = None
+
+# Processos usados no sequenciamento (None = todos os núcleos). Compensa só
+# em arquivos grandes, como vários meses de QT juntos
+PROCESSOS = 1
 
 
 def format_city(cidade: str) -> str:
@@ -18,85 +36,43 @@ def format_city(cidade: str) -> str:
     return re.sub(r"\s*\((\w{2})\)", r" (\1)", cidade)
 
 
-rotas['ORIGEM'] = rotas['ORIGEM'].apply(format_city)
-rotas['DESTINO'] = rotas['DESTINO'].apply(format_city)
-rotas['DESCRICAO DA LINHA'] = rotas['DESCRICAO DA LINHA'].apply(
-    lambda x: ' - '.join(format_city(p) for p in x.split(' - '))
-)
-coordenadas['CIDADE (UF)'] = coordenadas['CIDADE (UF)'].apply(format_city)
-
-
-def get_coord(cidade: str) -> Optional[Tuple[float, float]]:
-    linha = coordenadas[coordenadas['CIDADE (UF)'] == cidade]
-    if linha.empty:
-        return None
-    return linha['LAT'].iloc[0], linha['LON'].iloc[0]
-
-
-def param_along(orig: Tuple[float, float], dest: Tuple[float, float], pt: Optional[Tuple[float, float]]) -> float:
-    """Calcula a projecao de pt no vetor origem->destino."""
-    if pt is None or orig is None or dest is None:
-        return float('inf')
-    ox, oy = orig
-    dx, dy = dest
-    px, py = pt
-    vx = dx - ox
-    vy = dy - oy
-    wx = px - ox
-    wy = py - oy
-    denom = vx * vx + vy * vy
-    if denom == 0:
-        return float('inf')
-    return (wx * vx + wy * vy) / denom
-
-
-resultado = []
-for (prefixo, desc), grupo in rotas.groupby(['PREFIXO', 'DESCRICAO DA LINHA']):
-    desc_fmt = format_city(desc)
-    partes = [p.strip() for p in desc_fmt.split(' - ')[:2]]
-    if len(partes) < 2:
-        continue
-    origem_desc, destino_desc = partes
-
-    cidades = pd.unique(grupo[['ORIGEM', 'DESTINO']].values.ravel('K'))
-    cidades = [format_city(c) for c in cidades if pd.notna(c)]
-
-    if origem_desc not in cidades:
-        cidades.insert(0, origem_desc)
-    if destino_desc not in cidades:
-        cidades.append(destino_desc)
-
-    # Remove duplicatas preservando ordem
-    cidades_unique = []
-    for c in cidades:
-        if c not in cidades_unique:
-            cidades_unique.append(c)
-
-    coord_origem = get_coord(origem_desc)
-    coord_destino = get_coord(destino_desc)
-
-    cidades_ord = sorted(
-        enumerate(cidades_unique),
-        key=lambda x: param_along(coord_origem, coord_destino, get_coord(x[1]))
+def _formatar_unicos(serie: pd.Series, funcao) -> pd.Series:
+    """Aplica ``funcao`` uma vez por valor distinto da coluna."""
+    codigos, unicos = pd.factorize(serie)
+    formatados = np.array([funcao(v) for v in unicos] + [np.nan], dtype=object)
+    return pd.Series(formatados[codigos], index=serie.index)
+
+
+def normalizar_rotas(rotas: pd.DataFrame) -> pd.DataFrame:
+    """ORIGEM, DESTINO e DESCRICAO DA LINHA no formato 'NOME (UF)'."""
+    rotas = rotas.copy()
+    rotas['ORIGEM'] = _formatar_unicos(rotas['ORIGEM'], format_city)
+    rotas['DESTINO'] = _formatar_unicos(rotas['DESTINO'], format_city)
+    rotas['DESCRICAO DA LINHA'] = _formatar_unicos(
+        rotas['DESCRICAO DA LINHA'],
+        lambda x: ' - '.join(format_city(p) for p in x.split(' - ')),
+    )
+    return rotas
+
+
+def indice_de_coordenadas(coordenadas: pd.DataFrame) -> IndiceCoordenadas:
+    coordenadas = coordenadas.copy()
+    coordenadas['CIDADE (UF)'] = coordenadas['CIDADE (UF)'].apply(format_city)
+    return IndiceCoordenadas.de_dataframe(coordenadas, 'CIDADE (UF)')
+
+
+# A execução fica protegida porque os processos do sequenciamento em paralelo
+# importam este módulo no Windows
+if __name__ == "__main__":
+    # Esquema compacto (ver esquema.py); as coordenadas ficam em float64
+    # porque vão para a planilha de saída
+    rotas = compactar(normalizar_rotas(ler_excel(ARQUIVO_ROTAS, colunas=COLUNAS_ROTAS)))
+    coordenadas = compactar(ler_excel(ARQUIVO_COORD, colunas=COLUNAS_COORD), coordenadas=False)
+    print(relatorio_memoria({"rotas": rotas, "coordenadas": coordenadas}).to_string(index=False))
+    indice_coords = indice_de_coordenadas(coordenadas)
+
+    df_resultado = sequenciar_rotas(
+        rotas, indice_coords, esferico=PROJECAO_ESFERICA, limiar_aproximado=LIMIAR_APROXIMADO,
+        processos=PROCESSOS,
     )
-    cidades_ord = [c for _, c in cidades_ord]
-
-    sentido = 'IDA' if cidades_ord and cidades_ord[0] == origem_desc else 'VOLTA'
-
-    for seq, cidade in enumerate(cidades_ord, start=1):
-        lat_lon = get_coord(cidade)
-        lat = lat_lon[0] if lat_lon else None
-        lon = lat_lon[1] if lat_lon else None
-        resultado.append({
-            'PREFIXO': prefixo,
-            'DESCRICAO DA LINHA': desc_fmt,
-            'CIDADES': cidade,
-            'LAT': lat,
-            'LON': lon,
-            'SENTIDO': sentido,
-            'SEQUENCIA': seq
-        })
-
-
-df_resultado = pd.DataFrame(resultado)
-df_resultado.to_excel('Rotas_Guanabara_Formatadas.xlsx', index=False)
\ No newline at end of file
+    df_resultado.to_excel('Rotas_Guanabara_Formatadas.xlsx', index=False)
@@ -0,0 +1,68 @@
+import re
+import sys
+from pathlib import Path
+
+from Formatacao_Gua import (
+    ARQUIVO_COORD,
+    COLUNAS_COORD,
+    COLUNAS_ROTAS,
+    LIMIAR_APROXIMADO,
+    PROCESSOS,
+    PROJECAO_ESFERICA,
+    indice_de_coordenadas,
+    normalizar_rotas,
+)
+from esquema import compactar, relatorio_memoria
+from leitura import ler_excel
+from sequenciamento import sequenciar_meses
+
+# Pasta com os QTs mensais ("QT Guanabara - Maio de 2025.xlsx", ...) e saída
+PASTA_QT = Path(".")
+PADRAO_QT = "QT Guanabara - *.xlsx"
+ARQUIVO_SAIDA = "Rotas_Guanabara_Meses.xlsx"
+
+MESES = {
+    "JANEIRO": 1, "FEVEREIRO": 2, "MARCO": 3, "MARÇO": 3, "ABRIL": 4, "MAIO": 5, "JUNHO": 6,
+    "JULHO": 7, "AGOSTO": 8, "SETEMBRO": 9, "OUTUBRO": 10, "NOVEMBRO": 11, "DEZEMBRO": 12,
+}
+
+
+def mes_do_arquivo(caminho: Path):
+    """Rótulo do mês ('Maio de 2025') e chave de ordenação (ano, mês).
+
+    Arquivos fora do padrão 'QT Guanabara - <Mês> de <Ano>' usam o nome do
+    arquivo como rótulo e vão para o fim, em ordem alfabética."""
+    rotulo = caminho.stem.split(" - ", 1)[-1].strip()
+    encontrado = re.match(r"(\w+)\s+de\s+(\d{4})$", rotulo, flags=re.IGNORECASE)
+    if encontrado and encontrado.group(1).upper() in MESES:
+        return rotulo, (int(encontrado.group(2)), MESES[encontrado.group(1).upper()], "")
+    return rotulo, (9999, 99, rotulo)
+
+
+def arquivos_qt(pasta: Path = PASTA_QT, padrao: str = PADRAO_QT):
+    """Arquivos de QT da pasta, em ordem cronológica, com o rótulo do mês."""
+    arquivos = [(mes_do_arquivo(a), a) for a in Path(pasta).glob(padrao)]
+    return [(rotulo, a) for (rotulo, _), a in sorted(arquivos, key=lambda x: x[0][1])]
+
+
+if __name__ == "__main__":
+    pasta = Path(sys.argv[1]) if len(sys.argv) > 1 else PASTA_QT
+    arquivos = arquivos_qt(pasta)
+    if not arquivos:
+        sys.exit(f"Nenhum arquivo '{PADRAO_QT}' em {pasta.resolve()}")
+
+    indice_coords = indice_de_coordenadas(ler_excel(ARQUIVO_COORD, colunas=COLUNAS_COORD))
+    rotas_por_mes = {
+        rotulo: compactar(normalizar_rotas(ler_excel(a, colunas=COLUNAS_ROTAS)))
+        for rotulo, a in arquivos
+    }
+    print(relatorio_memoria(rotas_por_mes).to_string(index=False))
+
+    df_resultado = sequenciar_meses(
+        rotas_por_mes, indice_coords, esferico=PROJECAO_ESFERICA,
+        limiar_aproximado=LIMIAR_APROXIMADO, processos=PROCESSOS,
+    )
+    for mes, tabela in df_resultado.groupby("MES", sort=False):
+        rotas = tabela.drop_duplicates(["PREFIXO", "DESCRICAO DA LINHA"])
+        print(f"{mes}: {len(rotas)} rotas, {int(rotas['ALTERADA'].sum())} novas ou alteradas")
+    df_resultado.to_excel(ARQUIVO_SAIDA, index=False)
@@ -1,48 +1,25 @@
 import pandas as pd
 
+from horarios import LARGURA_FAIXA_MIN, HistogramaPartidas
+
 ARQUIVO_MALHA = "Malha_Formatada.csv"
 CIDADE_ALVO = "FEIRA DE SANTANA"
 
-# Lê o CSV com separador ponto e vírgula
-df = pd.read_csv(ARQUIVO_MALHA, sep=';', encoding='utf-8-sig')
-
-# Filtra registros da localidade desejada
-feira = df[df['LOCALIDADE'].str.upper().str.contains(CIDADE_ALVO)].copy()
-
-# Converte o horário para datetime
-feira['HORARIO'] = pd.to_datetime(feira['HORARIO'], format='%H:%M', errors='coerce')
-
-# Intervalos de quatro horas
-time_bins = [0, 4, 8, 12, 16, 20, 24]
-faixas = [
-    '00:00-03:59',
-    '04:00-07:59',
-    '08:00-11:59',
-    '12:00-15:59',
-    '16:00-19:59',
-    '20:00-23:59',
-]
 
-feira['Faixa'] = pd.cut(
-    feira['HORARIO'].dt.hour,
-    bins=time_bins,
-    labels=faixas,
-    right=False,
-    include_lowest=True,
-)
+def contar_partidas_por_faixa(
+    df: pd.DataFrame,
+    cidade: str = CIDADE_ALVO,
+    largura_min: int = LARGURA_FAIXA_MIN,
+    por_dia: bool = False,
+) -> pd.DataFrame:
+    """Conta as partidas da cidade em cada faixa de horário, com total.
 
-contagem = feira['Faixa'].value_counts().sort_index()
-resultado = contagem.reset_index()
-resultado.columns = ['Faixa de horário', 'Quantidade de incidências']
+    Para várias cidades, monte o ``HistogramaPartidas`` uma vez e consulte
+    ``tabela`` para cada uma, sem recontar a malha."""
+    return HistogramaPartidas.de_malha(df, largura_min).tabela(cidade, por_dia=por_dia)
 
-# Adiciona linha de totais
-total = resultado['Quantidade de incidências'].sum()
-total_row = pd.DataFrame(
-    {
-        'Faixa de horário': ['Total'],
-        'Quantidade de incidências': [total]
-    }
-)
-resultado = pd.concat([resultado, total_row], ignore_index=True)
 
-print(resultado)
+if __name__ == "__main__":
+    # Lê o CSV em blocos, mantendo só as linhas da cidade
+    histograma = HistogramaPartidas.de_csv(ARQUIVO_MALHA, cidade=CIDADE_ALVO)
+    print(histograma.tabela(CIDADE_ALVO))
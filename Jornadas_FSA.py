@@ -0,0 +1,27 @@
+import pandas as pd
+
+from jornadas import HUB_PADRAO, GradeTrechos, trechos_da_malha, trechos_guanabara
+from leitura import ler_csv_em_blocos, ler_excel
+
+ARQUIVO_MALHA = "Malha_Formatada.csv"
+ARQUIVO_ROTAS_GUA = "Rotas_Guanabara_Formatadas.xlsx"
+ARQUIVO_SAIDA = "Jornadas_via_FSA.xlsx"
+COLUNAS_MALHA = [
+    "PREFIXO SIGMA", "NOME DA LINHA", "SERVICO", "LOCALIDADE", "HORARIO", "DIA_PARTIDA",
+    "TIPO_VEICULO", "FREQUENCIA", "LAT", "LON", "SEQUENCIA",
+]
+
+
+def montar_grade(arquivo_malha: str = ARQUIVO_MALHA, arquivo_rotas: str = ARQUIVO_ROTAS_GUA) -> GradeTrechos:
+    """Grade de trechos das duas empresas, montada uma vez para todas as consultas."""
+    malha = pd.concat(ler_csv_em_blocos(arquivo_malha, COLUNAS_MALHA), ignore_index=True)
+    rotas = ler_excel(arquivo_rotas)
+    trechos = pd.concat([trechos_da_malha(malha, rotas), trechos_guanabara(rotas)], ignore_index=True)
+    return GradeTrechos.de_trechos(trechos)
+
+
+if __name__ == "__main__":
+    grade = montar_grade()
+    jornadas = grade.jornadas_via_hub(HUB_PADRAO)
+    print(f"{len(grade)} trechos, {len(grade.paradas)} paradas, {len(jornadas)} pares via {HUB_PADRAO}")
+    jornadas.to_excel(ARQUIVO_SAIDA, index=False)
@@ -1,25 +1,26 @@
 import pandas as pd
 
+from corredores import IndiceCorredores
+from leitura import ler_excel
+
 LIMITE_LATITUDE = -12.2292842525
 ARQUIVO_ORIGEM = "Rotas_Guanabara_Formatadas.xlsx"
 ARQUIVO_DESTINO = "Linhas_selecionadas_Gua.xlsx"
 
+def filtrar_rotas_que_cruzam(df: pd.DataFrame,
+                             limite: float = LIMITE_LATITUDE) -> pd.DataFrame:
+    """Mantém somente os grupos de rotas que cruzam a latitude especificada.
+
+    Outras seleções (polilinhas, raio em torno de um HUB, polígonos) estão
+    em ``corredores.IndiceCorredores``."""
+    indice = IndiceCorredores(df)
+    return indice.linhas(indice.rotas_que_cruzam_latitude(limite))
+
 def selecionar_rotas_que_cruzam(arquivo_origem: str = ARQUIVO_ORIGEM,
                                 limite: float = LIMITE_LATITUDE) -> pd.DataFrame:
     """Retorna somente os grupos de rotas que cruzam a latitude especificada."""
-    df = pd.read_excel(arquivo_origem)
-
-    grupos = df.groupby(["PREFIXO", "DESCRICAO DA LINHA"])
-
-    selecionados = [
-        grupo
-        for _, grupo in grupos
-        if grupo["LAT"].max() > limite and grupo["LAT"].min() < limite
-    ]
-
-    if selecionados:
-        return pd.concat(selecionados, ignore_index=True)
-    return pd.DataFrame(columns=df.columns)
+    return filtrar_rotas_que_cruzam(ler_excel(arquivo_origem), limite)
 
-df_selecionado = selecionar_rotas_que_cruzam()
-df_selecionado.to_excel(ARQUIVO_DESTINO, index=False)
\ No newline at end of file
+if __name__ == "__main__":
+    df_selecionado = selecionar_rotas_que_cruzam()
+    df_selecionado.to_excel(ARQUIVO_DESTINO, index=False)
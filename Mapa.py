@@ -2,6 +2,10 @@ import streamlit as st
 import pandas as pd
 import pydeck as pdk
 
+from leitura import ler_excel
+from mapas import camada_agrupamentos, camada_arestas
+from niveis_detalhe import ZOOM_DETALHE_COMPLETO, gerar_niveis, nivel_do_zoom
+
 # --- Configuração da Página ---
 st.set_page_config(layout="wide", page_title="Mapa das Localidades")
 st.title("🗺️ Mapa das Localidades")
@@ -11,7 +15,7 @@ st.markdown("Cada ponto representa uma cidade da malha. As linhas conectam na or
 @st.cache_data
 def carregar_dados():
     try:
-        df = pd.read_excel("teste.xlsx")
+        df = ler_excel("teste.xlsx")
         return df[["LOCALIDADE", "LAT", "LON"]].dropna()
     except Exception as e:
         st.error(f"Erro ao carregar arquivo: {e}")
@@ -26,36 +30,33 @@ if df.empty:
 # --- Ordena pela ordem do arquivo (mantida automaticamente)
 df.reset_index(drop=True, inplace=True)
 
-# --- Criar camada de pontos vermelhos ---
-pontos_layer = pdk.Layer(
-    "ScatterplotLayer",
-    data=df,
-    get_position='[LON, LAT]',
-    get_radius=7000,
-    get_fill_color='[255, 0, 0, 160]',
-    pickable=True,
+# --- Níveis de detalhe: uma rota só, na ordem das linhas da planilha ---
+@st.cache_data
+def carregar_niveis(df):
+    rota = df.assign(ROTA=0, ORDEM=range(len(df)))
+    return gerar_niveis(rota, "ROTA", col_seq="ORDEM", col_nome="LOCALIDADE")
+
+# O Streamlit não recebe o zoom feito no navegador: o zoom escolhido aqui
+# define o nível de detalhe e o zoom inicial do mapa
+zoom = st.select_slider(
+    "Zoom do mapa",
+    options=list(range(3, ZOOM_DETALHE_COMPLETO + 3)),
+    value=5,
+    help=f"Abaixo de {ZOOM_DETALHE_COMPLETO}, cidades próximas são agrupadas e a rota simplificada.",
 )
+pontos, conexoes = carregar_niveis(df)[nivel_do_zoom(zoom)]
 
-# --- Criar conexões entre pontos consecutivos ---
-conexoes = pd.DataFrame([
-    {"source": [df["LON"][i], df["LAT"][i]], "target": [df["LON"][i+1], df["LAT"][i+1]]}
-    for i in range(len(df) - 1)
-])
+# --- Criar camada de pontos vermelhos (uma cidade ou um grupo de cidades próximas) ---
+pontos_layer = camada_agrupamentos(pontos, [255, 0, 0, 160], 7000, pickable=True)
 
-linha_layer = pdk.Layer(
-    "LineLayer",
-    data=conexoes,
-    get_source_position="source",
-    get_target_position="target",
-    get_color=[0, 100, 200],
-    get_width=3,
-)
+# --- Criar conexões entre pontos consecutivos ---
+linha_layer = camada_arestas(conexoes, [0, 100, 200])
 
 # --- Visualização centralizada na rota ---
 view_state = pdk.ViewState(
     latitude=df["LAT"].mean(),
     longitude=df["LON"].mean(),
-    zoom=5,
+    zoom=zoom,
 )
 
 # --- Mostrar o mapa ---
@@ -63,7 +64,7 @@ st.pydeck_chart(pdk.Deck(
     map_style=None,
     initial_view_state=view_state,
     layers=[pontos_layer, linha_layer],
-    tooltip={"text": "{LOCALIDADE}"}
+    tooltip={"text": "{nome}"}
 ))
 
 # --- Mostrar a tabela abaixo ---
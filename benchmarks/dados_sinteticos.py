@@ -0,0 +1,189 @@
+"""Gera malhas, QTs e coordenadas sintéticas em múltiplos do tamanho real.
+
+O fator 1 reproduz as proporções dos arquivos do repositório
+(``18 06 2025 - Malha.xlsx``: ~7.100 linhas, 102 linhas de ônibus;
+``QT Guanabara``: ~18.700 seções em 450 rotas; ``Planejamento
+operacional``: 112 blocos). Os nomes e as colunas seguem os arquivos reais,
+então as mesmas funções de formatação rodam sobre os dados gerados.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+UFS = np.array(["BA", "PE", "CE", "SP", "RJ", "MG", "PB", "AL", "SE", "PI", "MA", "GO", "DF", "PR", "PA"])
+TIPOS_VEICULO = np.array([
+    "FROTA SEMI E CONV - DD", "SEMI E CONV - MISTO 30L", "FROTA SEMI E CONV - 46 LUGARES",
+    "SEMI E CONV - MISTO 16", "LEITO G8  INDIVIDUAL",
+])
+FREQUENCIAS = np.array([
+    "Segunda, Terça, Quarta, Quinta, Sexta, Sábado, Domingo", "Domingo", "Segunda",
+    "Quarta, Sexta", "Terça, Quinta, Sábado", "Sexta, Domingo", "Segunda, Quarta, Sexta",
+])
+DIAS_PARTIDA = np.array(["DIA ATUAL", "DIA +1", "DIA +2", "DIA +3"])
+DIAS_SEMANA = np.array(["QUA", "QUI", "SEX", "SÁB", "DOM", "SEG", "TER"])
+
+LINHAS_BASE = 102
+ROTAS_QT_BASE = 450
+VIAGENS_BASE = 37
+CIDADES_BASE = 311
+CIDADES_MAX = 5570  # municípios do Brasil
+
+
+def gerar_cidades(fator: float, rng: np.random.Generator) -> pd.DataFrame:
+    n = int(min(CIDADES_MAX, CIDADES_BASE * np.sqrt(fator)))
+    nomes = np.array([f"CIDADE {i:05d}" for i in range(n)], dtype=object)
+    uf = UFS[rng.integers(0, len(UFS), n)]
+    return pd.DataFrame({
+        "CIDADE": nomes,
+        "UF": uf,
+        "CIDADE (UF)": nomes + " (" + uf.astype(object) + ")",
+        "LAT": rng.uniform(-33.0, -2.0, n),
+        "LON": rng.uniform(-60.0, -35.0, n),
+    })
+
+
+def _paradas_por_rota(n_rotas: int, minimo: int, maximo: int, cidades: pd.DataFrame, rng):
+    """Sorteia as paradas de cada rota, ordenadas de norte a sul."""
+    k = rng.integers(minimo, maximo + 1, n_rotas)
+    rota = np.repeat(np.arange(n_rotas), k)
+    cidade = rng.integers(0, len(cidades), len(rota))
+    ordem = np.lexsort((-cidades["LAT"].to_numpy()[cidade], rota))
+    return k, rota[ordem], cidade[ordem]
+
+
+def gerar_malha(fator: float, cidades: pd.DataFrame, rng: np.random.Generator):
+    """Malha Itapemirim (aba 'Minha Planilha') e a lista de linhas ativas."""
+    n_linhas = max(1, int(LINHAS_BASE * fator))
+    k, rota_parada, cidade_parada = _paradas_por_rota(n_linhas, 4, 14, cidades, rng)
+    inicio_rota = np.cumsum(k) - k
+
+    nomes_cidade = cidades["CIDADE"].to_numpy(dtype=object)
+    uf_cidade = cidades["UF"].to_numpy(dtype=object)
+    primeira = cidade_parada[inicio_rota]
+    ultima = cidade_parada[inicio_rota + k - 1]
+    codigo = np.array([f"{uf_cidade[o]}{uf_cidade[d]}0213{i:07d}" for i, (o, d) in enumerate(zip(primeira, ultima))], dtype=object)
+    nome = nomes_cidade[primeira] + "(" + uf_cidade[primeira] + ") - " + nomes_cidade[ultima] + "(" + uf_cidade[ultima] + ")"
+
+    # Serviços: cada um percorre todas as paradas da linha, em um dos sentidos
+    n_serv = rng.integers(4, 12, n_linhas)
+    linha_serv = np.repeat(np.arange(n_linhas), n_serv)
+    volta = rng.random(len(linha_serv)) < 0.5
+    paradas_serv = k[linha_serv]
+    serv = np.repeat(np.arange(len(linha_serv)), paradas_serv)
+    j = np.arange(len(serv)) - np.repeat(np.cumsum(paradas_serv) - paradas_serv, paradas_serv)
+    j = np.where(volta[serv], paradas_serv[serv] - 1 - j, j)
+    cidade = cidade_parada[inicio_rota[linha_serv[serv]] + j]
+
+    # Horários: partida aleatória e 1h a 3h entre paradas
+    passo = rng.integers(60, 181, len(serv))
+    passo[np.r_[True, serv[1:] != serv[:-1]]] = 0
+    minutos = rng.integers(0, 1440, len(linha_serv))[serv] + (
+        np.cumsum(passo) - np.repeat(np.cumsum(passo)[np.cumsum(paradas_serv) - paradas_serv], paradas_serv)
+    )
+    dia = np.minimum(minutos // 1440, 3)
+    hora = (minutos % 1440) // 60 * 100 + minutos % 60
+
+    linha = linha_serv[serv]
+    malha = pd.DataFrame({
+        "CODIGO_LINHA": codigo[linha],
+        "NOME": "." + nome[linha],
+        "SERVICO": 10_000_000 + serv,
+        "LOCALIDADE": np.char.title(nomes_cidade[cidade].astype(str)),
+        "HORA_PARTIDA": hora,
+        "DIA_PARTIDA": DIAS_PARTIDA[dia],
+        "TIPO_VEICULO": TIPOS_VEICULO[rng.integers(0, len(TIPOS_VEICULO), len(linha_serv))][serv],
+        "FREQUENCIA": FREQUENCIAS[rng.integers(0, len(FREQUENCIAS), len(linha_serv))][serv],
+    })
+
+    ativas = rng.random(n_linhas) < 29 / LINHAS_BASE
+    linhas = pd.DataFrame({"PREFIXO SIGMA": codigo[ativas], "NOME DA LINHA": nome[ativas]})
+    return malha, linhas
+
+
+def gerar_qt(fator: float, cidades: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    """QT Guanabara: uma seção para cada par de paradas de cada rota."""
+    n_rotas = max(1, int(ROTAS_QT_BASE * fator))
+    k, rota_parada, cidade_parada = _paradas_por_rota(n_rotas, 5, 14, cidades, rng)
+    inicio_rota = np.cumsum(k) - k
+    nomes = cidades["CIDADE (UF)"].to_numpy(dtype=object)
+    compacto = cidades["CIDADE"].to_numpy(dtype=object) + "(" + cidades["UF"].to_numpy(dtype=object) + ")"
+
+    partes = []
+    for tamanho in np.unique(k):
+        rotas = np.flatnonzero(k == tamanho)
+        i, j = np.triu_indices(tamanho, 1)
+        base = inicio_rota[rotas][:, None]
+        partes.append((np.repeat(rotas, len(i)), (base + i).ravel(), (base + j).ravel()))
+    rota = np.concatenate([p[0] for p in partes])
+    orig = cidade_parada[np.concatenate([p[1] for p in partes])]
+    dest = cidade_parada[np.concatenate([p[2] for p in partes])]
+    ordem = np.argsort(rota, kind="stable")
+    rota, orig, dest = rota[ordem], orig[ordem], dest[ordem]
+
+    primeira = cidade_parada[inicio_rota]
+    ultima = cidade_parada[inicio_rota + k - 1]
+    prefixo = np.array([f"02-{i // 100:04d}-{i % 100:02d}" for i in range(n_rotas)], dtype=object)
+    descricao = compacto[primeira] + " - " + compacto[ultima]
+    return pd.DataFrame({
+        "PREFIXO": prefixo[rota],
+        "DESCRICAO DA LINHA": descricao[rota],
+        "SECOES DA LINHA": nomes[orig] + " - " + nomes[dest],
+        "ORIGEM": nomes[orig],
+        "DESTINO": nomes[dest],
+    })
+
+
+def gerar_planejamento(fator: float, rng: np.random.Generator) -> pd.DataFrame:
+    """Planejamento operacional: cada viagem tem um bloco Guanabara, um HUB
+    de 30 minutos e um bloco Itapemirim, como a planilha real."""
+    n = max(1, int(VIAGENS_BASE * fator))
+    dia = rng.integers(0, 7, n)
+    minuto = rng.integers(0, 1440, n)
+    quarta = pd.Timestamp("2025-08-13")
+    partida = quarta + pd.to_timedelta(dia * 1440 + minuto, unit="min")
+    dur_gua = pd.to_timedelta(rng.integers(3, 30, n) * 60, unit="min")
+    dur_ita = pd.to_timedelta(rng.integers(3, 30, n) * 60, unit="min")
+    hub = partida + dur_gua
+    saida_hub = hub + pd.Timedelta(minutes=30)
+    chegada = saida_hub + dur_ita
+
+    hora_viagem = [datetime.time(m // 60, m % 60) for m in minuto]
+    viagem = [
+        f"{i % 4 + 1} - CIDADE {i:05d} (BA) - CIDADE {i + 1:05d} (SP) - \"DESCE\" - {DIAS_SEMANA[d]} - {m // 60:02d}:{m % 60:02d}"
+        for i, (d, m) in enumerate(zip(dia, minuto))
+    ]
+    blocos = []
+    for empresa, ini, fim, orig, dest in (
+        ("GUANABARA", partida, hub, "ORG", "FSA"),
+        ("HUB", hub, saida_hub, None, None),
+        ("ITAPEMIRIM", saida_hub, chegada, "FSA", "DST"),
+    ):
+        blocos.append(pd.DataFrame({
+            "VIAGEM": viagem,
+            "N° LEGENDA": np.arange(n) % 4 + 1,
+            "DIA SEMANA": DIAS_SEMANA[dia],
+            "HORA VIAGEM": hora_viagem,
+            "EMPRESA": empresa,
+            "SENTIDO": np.where(np.arange(n) % 2 == 0, "IDA", "VOLTA"),
+            "ORIGEM": orig,
+            "DESTINO": dest,
+            "HORA PARTIDA": ini,
+            "HORA CHEGADA": fim,
+        }))
+    return pd.concat(blocos, ignore_index=True).sort_values(["VIAGEM", "HORA PARTIDA"], ignore_index=True)
+
+
+def gerar_conjunto(fator: float, semente: int = 0) -> dict:
+    """Todas as entradas sintéticas de um fator de escala."""
+    rng = np.random.default_rng(semente)
+    cidades = gerar_cidades(fator, rng)
+    malha, linhas = gerar_malha(fator, cidades, rng)
+    return {
+        "malha": malha,
+        "linhas": linhas,
+        "coordenadas": cidades[["CIDADE (UF)", "CIDADE", "UF", "LAT", "LON"]],
+        "qt": gerar_qt(fator, cidades, rng),
+        "coordenadas_gua": cidades[["CIDADE (UF)", "LAT", "LON"]],
+        "planejamento": gerar_planejamento(fator, rng),
+    }
@@ -0,0 +1,249 @@
+"""Mede tempo e pico de memória de cada etapa sobre dados sintéticos.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/executar.py                    # escalas 1, 10, 100 e 1000
+    python benchmarks/executar.py --escalas 1 10     # só algumas escalas
+    python benchmarks/executar.py --sem-memoria      # pula a medição de memória
+
+Cada medição vira uma linha JSON em ``benchmarks/resultados.jsonl``, com o
+commit, a escala, a etapa, o tamanho da entrada, os segundos e o pico de
+memória (tracemalloc, em MB). Comparar as linhas de commits diferentes
+mostra as regressões.
+"""
+import argparse
+import datetime
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import pandas as pd  # noqa: E402
+import pydeck as pdk  # noqa: E402
+
+from benchmarks.dados_sinteticos import gerar_conjunto  # noqa: E402
+from conexoes import IndiceConexoes  # noqa: E402
+from coordenadas import IndiceCoordenadas  # noqa: E402
+from Horarios_FSA import contar_partidas_por_faixa  # noqa: E402
+from Linhas_selecionadas_Gua import filtrar_rotas_que_cruzam  # noqa: E402
+from jornadas import GradeTrechos, trechos_da_malha, trechos_guanabara  # noqa: E402
+from linha_do_tempo import (  # noqa: E402
+    IndiceTimeline,
+    montar_figura,
+    montar_figura_webgl,
+    paginar_viagens,
+    preparar_blocos,
+    preparar_dados,
+)
+from malha import formatar_malha  # noqa: E402
+from mapas import DeckCompacto, camada_agrupamentos, camada_arestas, montar_arestas  # noqa: E402
+from niveis_detalhe import gerar_nivel, gerar_niveis, nivel_do_zoom  # noqa: E402
+from ocupacao import ocupacao_hub, picos  # noqa: E402
+from sequenciamento import sequenciar_rotas  # noqa: E402
+
+ARQUIVO_RESULTADOS = Path(__file__).resolve().parent / "resultados.jsonl"
+ESCALAS = [1, 10, 100, 1000]
+ZOOM_MAPA = 5  # zoom inicial do mapa1.py
+
+
+# === ETAPAS ===
+# Cada etapa recebe o conjunto de dados (e as saídas das anteriores) e
+# devolve (resultado, quantidade de linhas de entrada).
+def etapa_formatacao(dados):
+    return formatar_malha(dados["malha"], dados["linhas"], dados["coordenadas"]), len(dados["malha"])
+
+
+def etapa_sequenciamento(dados):
+    indice = IndiceCoordenadas.de_dataframe(dados["coordenadas_gua"], "CIDADE (UF)")
+    return sequenciar_rotas(dados["qt"], indice), len(dados["qt"])
+
+
+def etapa_sequenciamento_paralelo(dados):
+    # Todos os núcleos da máquina; compare com sequenciamento_gua para ver a escala
+    indice = IndiceCoordenadas.de_dataframe(dados["coordenadas_gua"], "CIDADE (UF)")
+    return sequenciar_rotas(dados["qt"], indice, processos=None), len(dados["qt"])
+
+
+def etapa_selecao(dados):
+    rotas = dados["resultados"]["sequenciamento_gua"]
+    return filtrar_rotas_que_cruzam(rotas), len(rotas)
+
+
+def etapa_horarios(dados):
+    malha = dados["resultados"]["formatacao_malha"]
+    # Na malha sintética a cidade "CIDADE 00000" faz o papel de Feira de Santana
+    return contar_partidas_por_faixa(malha, "CIDADE 00000"), len(malha)
+
+
+def etapa_figura_timeline(dados):
+    df, _ = preparar_dados(dados["planejamento"])
+    df, viagens = preparar_blocos(df)
+    fig = montar_figura(df, viagens)
+    return fig.to_json(), len(dados["planejamento"])
+
+
+def etapa_figura_timeline_webgl(dados):
+    df, _ = preparar_dados(dados["planejamento"])
+    df, viagens = preparar_blocos(df)
+    pagina, _ = paginar_viagens(viagens, 0)
+    fig = montar_figura_webgl(df, pagina)
+    return fig.to_json(), len(dados["planejamento"])
+
+
+def etapa_figura_mapa(dados):
+    malha = dados["resultados"]["formatacao_malha"]
+    arestas = montar_arestas(malha, ["PREFIXO SIGMA", "NOME DA LINHA", "SERVICO", "TIPO_VEICULO", "FREQUENCIA"])
+    deck = pdk.Deck(
+        map_style=None,
+        layers=[
+            pdk.Layer("ScatterplotLayer", data=malha[["LAT", "LON"]], get_position="[LON, LAT]"),
+            pdk.Layer("LineLayer", data=arestas, get_source_position="[LON_O, LAT_O]",
+                      get_target_position="[LON_D, LAT_D]", get_width="LARGURA"),
+        ],
+    )
+    return deck.to_json(), len(malha)
+
+
+def etapa_figura_mapa_compacta(dados):
+    # O deck que mapa1.mapa_itapemirim monta no zoom inicial do app
+    malha = dados["resultados"]["formatacao_malha"]
+    pontos, arestas = gerar_nivel(
+        malha, ["PREFIXO SIGMA", "NOME DA LINHA", "SERVICO", "TIPO_VEICULO", "FREQUENCIA"], nivel_do_zoom(ZOOM_MAPA)
+    )
+    deck = DeckCompacto(
+        map_style=None,
+        initial_view_state=pdk.ViewState(
+            latitude=float(malha["LAT"].mean()), longitude=float(malha["LON"].mean()), zoom=ZOOM_MAPA
+        ),
+        layers=[
+            camada_agrupamentos(pontos, [0, 0, 0, 160], 4, radius_units="pixels", radius_max_pixels=30),
+            camada_arestas(arestas, [254, 221, 49]),
+        ],
+    )
+    return deck.to_json(), len(malha)
+
+
+def etapa_niveis_detalhe(dados):
+    malha = dados["resultados"]["formatacao_malha"]
+    niveis = gerar_niveis(malha, ["PREFIXO SIGMA", "NOME DA LINHA", "SERVICO", "TIPO_VEICULO", "FREQUENCIA"])
+    return niveis, len(malha)
+
+
+def etapa_filtros_timeline(dados):
+    indice = IndiceTimeline.de_planilha(dados["planejamento"])
+    filtrado = indice.filtrar(empresas=["GUANABARA"], dias=["SEX", "SÁB"], obs=[1, 2], janela=(6, 12))
+    return filtrado, len(dados["planejamento"])
+
+
+def etapa_conexoes_hub(dados):
+    conexoes = IndiceConexoes.de_planilha(dados["planejamento"]).conexoes()
+    return conexoes, len(dados["planejamento"])
+
+
+def etapa_ocupacao_hub(dados):
+    indice = IndiceTimeline.de_planilha(dados["planejamento"])
+    ocupacao = ocupacao_hub(indice.blocos)
+    return picos(ocupacao), len(dados["planejamento"])
+
+
+def etapa_jornadas_hub(dados):
+    malha = dados["resultados"]["formatacao_malha"]
+    rotas = dados["resultados"]["sequenciamento_gua"]
+    trechos = pd.concat([trechos_da_malha(malha, rotas), trechos_guanabara(rotas)], ignore_index=True)
+    grade = GradeTrechos.de_trechos(trechos)
+    return grade.jornadas_via_hub("CIDADE 00000"), len(trechos)
+
+
+ETAPAS = {
+    "formatacao_malha": etapa_formatacao,
+    "sequenciamento_gua": etapa_sequenciamento,
+    "sequenciamento_gua_paralelo": etapa_sequenciamento_paralelo,
+    "selecao_latitude": etapa_selecao,
+    "horarios_faixas": etapa_horarios,
+    "figura_timeline": etapa_figura_timeline,
+    "figura_timeline_webgl": etapa_figura_timeline_webgl,
+    "filtros_timeline": etapa_filtros_timeline,
+    "conexoes_hub": etapa_conexoes_hub,
+    "ocupacao_hub": etapa_ocupacao_hub,
+    "jornadas_hub": etapa_jornadas_hub,
+    "figura_mapa": etapa_figura_mapa,
+    "figura_mapa_compacta": etapa_figura_mapa_compacta,
+    "niveis_detalhe": etapa_niveis_detalhe,
+}
+
+
+def medir(funcao, dados, memoria: bool):
+    """Executa a etapa uma vez para o tempo e, se pedido, outra vez sob
+    tracemalloc para o pico de memória (o rastreamento distorce o tempo)."""
+    inicio = time.perf_counter()
+    resultado, linhas = funcao(dados)
+    segundos = time.perf_counter() - inicio
+
+    pico = None
+    if memoria:
+        tracemalloc.start()
+        funcao(dados)
+        pico = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return resultado, linhas, segundos, pico
+
+
+def commit_atual() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def executar(escalas, etapas=None, memoria: bool = True, arquivo: Path = ARQUIVO_RESULTADOS, semente: int = 0):
+    etapas = etapas or list(ETAPAS)
+    comum = {
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit_atual(),
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+    }
+    with open(arquivo, "a", encoding="utf-8") as saida:
+        for escala in escalas:
+            inicio = time.perf_counter()
+            dados = gerar_conjunto(escala, semente)
+            print(f"escala {escala}x: dados gerados em {time.perf_counter() - inicio:.1f}s "
+                  f"({len(dados['malha'])} linhas de malha, {len(dados['qt'])} seções de QT)")
+            dados["resultados"] = {}
+            for nome in ETAPAS:
+                # Etapas não pedidas ainda rodam se outras dependem das saídas delas
+                necessaria = nome in etapas or nome in ("formatacao_malha", "sequenciamento_gua")
+                if not necessaria:
+                    continue
+                resultado, linhas, segundos, pico = medir(ETAPAS[nome], dados, memoria and nome in etapas)
+                dados["resultados"][nome] = resultado
+                if nome not in etapas:
+                    continue
+                registro = dict(comum, escala=escala, etapa=nome, linhas_entrada=linhas,
+                                segundos=round(segundos, 4),
+                                pico_memoria_mb=None if pico is None else round(pico, 2))
+                saida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                saida.flush()
+                memoria_txt = "" if pico is None else f", pico {pico:.1f} MB"
+                print(f"  {nome:<20} {segundos:8.3f}s{memoria_txt}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark das etapas sobre dados sintéticos.")
+    parser.add_argument("--escalas", type=float, nargs="+", default=ESCALAS,
+                        help="fatores de escala em relação aos arquivos reais")
+    parser.add_argument("--etapas", nargs="+", choices=list(ETAPAS), help="etapas a medir (padrão: todas)")
+    parser.add_argument("--sem-memoria", action="store_true", help="não mede o pico de memória")
+    parser.add_argument("--saida", type=Path, default=ARQUIVO_RESULTADOS, help="arquivo JSON Lines de resultados")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+    executar(
+        [int(e) if float(e).is_integer() else e for e in args.escalas],
+        args.etapas, not args.sem_memoria, args.saida, args.semente,
+    )
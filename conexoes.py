@@ -0,0 +1,157 @@
+"""Conexões entre chegadas e partidas de empresas diferentes nos HUBs.
+
+Cada chegada a uma localidade (DESTINO de um bloco) conecta com as
+partidas de outra empresa (ORIGEM de outro bloco) que saem da mesma
+localidade dentro da janela de espera. Os horários viram minutos da
+semana a partir de quarta 00:00, o mesmo início do eixo da timeline, e a
+grade é considerada semanal: uma chegada na terça à noite conecta com uma
+partida da quarta de madrugada.
+
+As partidas ficam ordenadas pela chave (localidade, minuto da semana),
+repetidas uma semana à frente para a virada. Cada chegada responde com
+dois ``searchsorted`` (início e fim da janela), sem produto cartesiano
+entre chegadas e partidas.
+"""
+import numpy as np
+import pandas as pd
+
+from linha_do_tempo import ORDEM_DIAS, preparar_dados
+
+MINUTOS_SEMANA = 7 * 24 * 60
+ESPERA_MINIMA_MIN = 30   # tempo mínimo de baldeação
+ESPERA_MAXIMA_MIN = 240  # acima disso não conta como conexão
+
+COLUNAS_CONEXAO = [
+    "HUB", "CHEGADA", "EMPRESA_CHEGADA", "VIAGEM_CHEGADA", "ORIGEM",
+    "PARTIDA", "EMPRESA_PARTIDA", "VIAGEM_PARTIDA", "DESTINO", "ESPERA_MIN",
+    "HORA_ABSOLUTA_CHEGADA", "HORA_ABSOLUTA_PARTIDA",
+]
+
+
+def rotulo_minuto(minutos) -> np.ndarray:
+    """Minuto da semana (a partir de quarta 00:00) como "SÁB 07:30".
+
+    Cada minuto distinto é formatado uma vez."""
+    minutos = np.asarray(minutos, dtype=np.int64) % MINUTOS_SEMANA
+    unicos, posicao = np.unique(minutos, return_inverse=True)
+    rotulos = np.array(
+        [f"{ORDEM_DIAS[m // 1440]} {m % 1440 // 60:02d}:{m % 60:02d}" for m in unicos], dtype=object
+    )
+    return rotulos[posicao.reshape(-1)]
+
+
+class IndiceConexoes:
+    """Chegadas e partidas da planilha prontas para a busca de conexões.
+
+    Construído uma vez por planilha; ``conexoes`` pode ser chamada com
+    qualquer janela de espera sem reprocessar a planilha.
+    """
+
+    def __init__(self, chegadas: pd.DataFrame, partidas: pd.DataFrame):
+        self.chegadas = chegadas.reset_index(drop=True)
+        self.partidas = partidas.reset_index(drop=True)
+
+        codigos, self.hubs = pd.factorize(
+            pd.concat([self.chegadas["LOCAL"], self.partidas["LOCAL"]], ignore_index=True), sort=True
+        )
+        self._hub_chegada = codigos[:len(self.chegadas)]
+        self._hub_partida = codigos[len(self.chegadas):]
+        self._empresa_chegada = self.chegadas["EMPRESA"].to_numpy(dtype=object)
+        self._empresa_partida = self.partidas["EMPRESA"].to_numpy(dtype=object)
+        self._minuto_chegada = self.chegadas["MINUTO"].to_numpy(dtype=np.int64)
+
+        # Cada localidade ocupa duas semanas na chave: a partida original e a
+        # cópia uma semana à frente, para janelas que viram a terça-feira
+        n = len(self.partidas)
+        minuto = self.partidas["MINUTO"].to_numpy(dtype=np.int64)
+        chave = np.concatenate([
+            self._hub_partida * 2 * MINUTOS_SEMANA + minuto,
+            self._hub_partida * 2 * MINUTOS_SEMANA + minuto + MINUTOS_SEMANA,
+        ])
+        ordem = np.argsort(chave, kind="stable")
+        self._chave_ordenada = chave[ordem]
+        self._partida_ordenada = ordem % max(n, 1)
+
+    @classmethod
+    def de_planilha(cls, df_planilha: pd.DataFrame) -> "IndiceConexoes":
+        """Chegadas (blocos com DESTINO) e partidas (blocos com ORIGEM) da
+        planilha; os blocos do HUB, sem origem nem destino, ficam de fora."""
+        df, _ = preparar_dados(df_planilha)
+        inicio = df["HORA_ABSOLUTA"].to_numpy(dtype=float)
+        fim = inicio + df["DURACAO_H"].to_numpy(dtype=float)
+        base = pd.DataFrame({
+            "VIAGEM": df["VIAGEM"].astype(object).to_numpy(),
+            "EMPRESA": df["EMPRESA"].astype(object).to_numpy(),
+            "ORIGEM": df["ORIGEM"].astype(object).to_numpy(),
+            "DESTINO": df["DESTINO"].astype(object).to_numpy(),
+        })
+
+        def pontos(local: str, horas: np.ndarray) -> pd.DataFrame:
+            pts = base.assign(
+                LOCAL=base[local].str.upper().str.strip(),
+                HORA_ABSOLUTA=horas,
+                MINUTO=np.round(horas * 60).astype(np.int64) % MINUTOS_SEMANA,
+            )
+            return pts[pts["LOCAL"].notna() & (pts["LOCAL"] != "")]
+
+        return cls(pontos("DESTINO", fim), pontos("ORIGEM", inicio))
+
+    def conexoes(
+        self,
+        espera_minima: int = ESPERA_MINIMA_MIN,
+        espera_maxima: int = ESPERA_MAXIMA_MIN,
+        hubs=None,
+        outra_empresa: bool = True,
+    ) -> pd.DataFrame:
+        """Tabela de conexões com espera entre ``espera_minima`` e
+        ``espera_maxima`` minutos (inclusive), uma linha por par chegada →
+        partida. ``hubs`` restringe as localidades (None = todas) e
+        ``outra_empresa=False`` aceita também partidas da mesma empresa.
+        """
+        if not 0 <= espera_minima <= espera_maxima < MINUTOS_SEMANA:
+            raise ValueError("A janela de espera precisa estar entre 0 e uma semana")
+
+        chegadas = np.arange(len(self.chegadas))
+        if hubs is not None:
+            codigos = self.hubs.get_indexer([str(h).upper().strip() for h in hubs])
+            chegadas = chegadas[np.isin(self._hub_chegada, codigos[codigos >= 0])]
+
+        referencia = self._hub_chegada[chegadas] * 2 * MINUTOS_SEMANA + self._minuto_chegada[chegadas]
+        ini = np.searchsorted(self._chave_ordenada, referencia + espera_minima, side="left")
+        fim = np.searchsorted(self._chave_ordenada, referencia + espera_maxima, side="right")
+
+        # Expande cada chegada nas posições [ini, fim) das partidas
+        quantos = fim - ini
+        chegada = np.repeat(chegadas, quantos)
+        deslocamento = np.arange(quantos.sum()) - np.repeat(np.cumsum(quantos) - quantos, quantos)
+        posicao = np.repeat(ini, quantos) + deslocamento
+        partida = self._partida_ordenada[posicao]
+        espera = self._chave_ordenada[posicao] - np.repeat(referencia, quantos)
+
+        if outra_empresa:
+            ok = self._empresa_chegada[chegada] != self._empresa_partida[partida]
+            chegada, partida, espera = chegada[ok], partida[ok], espera[ok]
+
+        c = self.chegadas.iloc[chegada]
+        p = self.partidas.iloc[partida]
+        minuto_chegada = c["MINUTO"].to_numpy(dtype=np.int64)
+        hora_chegada = c["HORA_ABSOLUTA"].to_numpy(dtype=float)
+        tabela = pd.DataFrame({
+            "HUB": c["LOCAL"].to_numpy(dtype=object),
+            "CHEGADA": rotulo_minuto(minuto_chegada),
+            "EMPRESA_CHEGADA": c["EMPRESA"].to_numpy(dtype=object),
+            "VIAGEM_CHEGADA": c["VIAGEM"].to_numpy(dtype=object),
+            "ORIGEM": c["ORIGEM"].to_numpy(dtype=object),
+            "PARTIDA": rotulo_minuto(minuto_chegada + espera),
+            "EMPRESA_PARTIDA": p["EMPRESA"].to_numpy(dtype=object),
+            "VIAGEM_PARTIDA": p["VIAGEM"].to_numpy(dtype=object),
+            "DESTINO": p["DESTINO"].to_numpy(dtype=object),
+            "ESPERA_MIN": espera,
+            # Posição no eixo da timeline; a partida fica depois da chegada
+            # mesmo quando a janela vira a semana
+            "HORA_ABSOLUTA_CHEGADA": hora_chegada,
+            "HORA_ABSOLUTA_PARTIDA": hora_chegada + espera / 60,
+        }, columns=COLUNAS_CONEXAO)
+        return tabela.sort_values(
+            ["HUB", "HORA_ABSOLUTA_CHEGADA", "ESPERA_MIN"], kind="stable", ignore_index=True
+        )
@@ -0,0 +1,213 @@
+"""Índice de coordenadas das cidades, compartilhado pelos formatadores.
+
+Substitui a varredura da tabela de coordenadas a cada consulta por um
+dicionário nome normalizado -> posição, montado uma única vez. Nomes sem
+correspondência exata podem ser resolvidos por similaridade de trigramas,
+com um índice invertido que só compara pares que compartilham trigramas
+pouco frequentes (sem comparar todos contra todos).
+"""
+import re
+import unicodedata
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def normalizar_nome(cidade) -> str:
+    """Chave de busca: maiúsculas, espaços simples e 'NOME (UF)'."""
+    if pd.isna(cidade):
+        return ""
+    cidade = re.sub(r"\s+", " ", str(cidade).upper().strip())
+    return re.sub(r"\s*\(\s*(\w{2})\s*\)", r" (\1)", cidade)
+
+
+def chave_cidade(cidade) -> str:
+    """Chave tolerante: sem acentos, sem pontuação e com espaços simples."""
+    if pd.isna(cidade):
+        return ""
+    texto = unicodedata.normalize("NFKD", str(cidade).upper())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r"[^A-Z0-9]+", " ", texto).strip()
+
+
+def trigramas(chave: str) -> set:
+    """Trigramas da chave, com bordas marcadas por espaço."""
+    texto = f"  {chave} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def _explodir_trigramas(chaves) -> pd.DataFrame:
+    """Tabela (id, trigrama) de uma lista de chaves."""
+    tri = pd.Series([sorted(trigramas(c)) for c in chaves], dtype=object).explode()
+    return pd.DataFrame({"id": tri.index.to_numpy(), "tri": tri.to_numpy()}).dropna()
+
+
+LIMIAR_SIMILARIDADE = 0.8
+# Trigramas presentes em mais que esta fração dos nomes (ex.: " SA", "AO "),
+# ou em mais de MAX_POSTAGENS nomes, não servem para gerar candidatos; ainda
+# contam no cálculo da similaridade
+FRACAO_TRIGRAMA_COMUM = 0.05
+MAX_POSTAGENS = 200
+# Candidatos por nome (os que mais compartilham trigramas raros) e nomes por
+# lote, para manter a memória limitada em tabelas grandes
+CANDIDATOS_POR_NOME = 10
+NOMES_POR_LOTE = 5000
+
+
+class IndiceCoordenadas:
+    """Mapeamento nome normalizado -> (lat, lon) com busca em lote."""
+
+    def __init__(self, nomes: Iterable, lat: Iterable, lon: Iterable, normalizar=normalizar_nome):
+        self.normalizar = normalizar
+        chaves = pd.Index([normalizar(n) for n in nomes])
+        # Em nomes repetidos vale a primeira ocorrência, como no filtro antigo;
+        # nomes vazios nunca entram no índice
+        unico = ~chaves.duplicated(keep="first") & (chaves != "")
+        self.chaves = chaves[unico]
+        self.nomes = np.asarray(list(nomes), dtype=object)[unico]
+        self.lat = np.asarray(lat, dtype=float)[unico]
+        self.lon = np.asarray(lon, dtype=float)[unico]
+        self._posicao = {chave: i for i, chave in enumerate(self.chaves)}
+        self._trigramas = None
+
+    @classmethod
+    def de_dataframe(
+        cls,
+        df: pd.DataFrame,
+        coluna_nome: str,
+        col_lat: str = "LAT",
+        col_lon: str = "LON",
+        normalizar=normalizar_nome,
+    ) -> "IndiceCoordenadas":
+        return cls(df[coluna_nome], df[col_lat], df[col_lon], normalizar)
+
+    def __len__(self) -> int:
+        return len(self.chaves)
+
+    def __contains__(self, cidade) -> bool:
+        return self.normalizar(cidade) in self._posicao
+
+    def get(self, cidade) -> Optional[Tuple[float, float]]:
+        """Coordenada de uma cidade, ou None se não estiver no índice."""
+        i = self._posicao.get(self.normalizar(cidade))
+        if i is None:
+            return None
+        return self.lat[i], self.lon[i]
+
+    def posicoes(self, cidades: Iterable, limiar: Optional[float] = None) -> np.ndarray:
+        """Posição de cada cidade no índice (-1 quando não encontrada).
+
+        Cada nome distinto é normalizado uma única vez. Com ``limiar``, os
+        nomes sem correspondência exata passam por ``resolver``."""
+        nomes = pd.Series(list(cidades), dtype=object)
+        codigos, unicos = pd.factorize(nomes, use_na_sentinel=False)
+        chaves = [self.normalizar(n) for n in unicos]
+        pos_unicos = self.chaves.get_indexer(chaves)
+        if limiar is not None and (pos_unicos < 0).any():
+            faltantes = np.flatnonzero(pos_unicos < 0)
+            resolvidos = self.resolver(unicos[faltantes], limiar)
+            pos_unicos[faltantes] = resolvidos["POSICAO"].to_numpy()
+        if len(codigos) == 0:
+            return np.empty(0, dtype=np.intp)
+        return pos_unicos[codigos]
+
+    def _indice_trigramas(self):
+        """Chaves tolerantes e tabela invertida trigrama -> posições (lazy)."""
+        if self._trigramas is None:
+            chaves = [chave_cidade(n) for n in self.nomes]
+            tabela = _explodir_trigramas(chaves)
+            tamanho = tabela.groupby("id").size().reindex(range(len(chaves)), fill_value=0).to_numpy()
+            frequencia = tabela["tri"].map(tabela["tri"].value_counts())
+            limite = min(MAX_POSTAGENS, max(2, int(FRACAO_TRIGRAMA_COMUM * len(chaves))))
+            exata = pd.Series(np.arange(len(chaves)), index=chaves)
+            exata = exata[~exata.index.duplicated(keep="first") & (exata.index != "")]
+            self._trigramas = {
+                "exata": exata,
+                "tabela": tabela,
+                "raros": tabela[frequencia.to_numpy() <= limite],
+                "tamanho": tamanho,
+            }
+        return self._trigramas
+
+    def _melhores_candidatos(self, chaves, limiar: float) -> pd.DataFrame:
+        """Melhor candidato (id_c, dice) de cada chave (id) acima do limiar."""
+        idx = self._indice_trigramas()
+        consulta = _explodir_trigramas(chaves)
+        tamanho_consulta = consulta.groupby("id").size()
+
+        # Bloqueio: pares que compartilham trigramas raros, os mais fortes primeiro
+        pares = (
+            consulta.merge(idx["raros"], on="tri", suffixes=("", "_c"))
+            .groupby(["id", "id_c"]).size().rename("raros").reset_index()
+            .sort_values(["id", "raros"], ascending=[True, False], kind="stable")
+        )
+        pares = pares[pares.groupby("id").cumcount() < CANDIDATOS_POR_NOME][["id", "id_c"]]
+        if pares.empty:
+            return pd.DataFrame(columns=["id", "id_c", "dice"], dtype=np.intp)
+
+        # Similaridade de Dice com todos os trigramas dos pares candidatos
+        comuns = (
+            pares.merge(consulta, on="id")
+            .merge(idx["tabela"].rename(columns={"id": "id_c"}), on=["id_c", "tri"])
+            .groupby(["id", "id_c"]).size().rename("comuns").reset_index()
+        )
+        comuns["dice"] = 2 * comuns["comuns"] / (
+            tamanho_consulta.reindex(comuns["id"]).to_numpy() + idx["tamanho"][comuns["id_c"].to_numpy()]
+        )
+        melhores = comuns.sort_values(["id", "dice", "id_c"], ascending=[True, False, True]).drop_duplicates("id")
+        return melhores[melhores["dice"] >= limiar]
+
+    def resolver(self, cidades: Iterable, limiar: float = LIMIAR_SIMILARIDADE) -> pd.DataFrame:
+        """Correspondência tolerante, em lote, de uma lista de nomes.
+
+        Primeiro compara as chaves sem acento/pontuação; os que sobram são
+        comparados por similaridade de Dice entre trigramas, apenas contra
+        candidatos que compartilham algum trigrama raro. Retorna NOME,
+        POSICAO (-1 se nada passar do limiar), CORRESPONDENCIA, SIMILARIDADE
+        e METODO ("exato", "aproximado" ou "").
+        """
+        idx = self._indice_trigramas()
+        nomes = np.asarray(list(cidades), dtype=object)
+        # Cada chave distinta é resolvida uma única vez
+        codigos, chaves = pd.factorize(pd.Series([chave_cidade(n) for n in nomes], dtype=object))
+        chaves = list(chaves)
+        posicao = idx["exata"].reindex(chaves).fillna(-1).to_numpy(dtype=np.intp)
+        similaridade = np.where(posicao >= 0, 1.0, 0.0)
+        metodo = np.where(posicao >= 0, "exato", "").astype(object)
+
+        pendentes = np.flatnonzero((posicao < 0) & np.array([c != "" for c in chaves], dtype=bool))
+        for inicio in range(0, len(pendentes), NOMES_POR_LOTE):
+            lote = pendentes[inicio:inicio + NOMES_POR_LOTE]
+            melhores = self._melhores_candidatos([chaves[i] for i in lote], limiar)
+            alvo = lote[melhores["id"].to_numpy()]
+            posicao[alvo] = melhores["id_c"].to_numpy()
+            similaridade[alvo] = melhores["dice"].to_numpy()
+            metodo[alvo] = "aproximado"
+
+        posicao, similaridade, metodo = posicao[codigos], similaridade[codigos], metodo[codigos]
+        correspondencia = np.full(len(nomes), None, dtype=object)
+        correspondencia[posicao >= 0] = self.nomes[posicao[posicao >= 0]]
+        return pd.DataFrame({
+            "NOME": nomes,
+            "POSICAO": posicao,
+            "CORRESPONDENCIA": correspondencia,
+            "SIMILARIDADE": similaridade,
+            "METODO": metodo,
+        })
+
+    def buscar(self, cidades: Iterable, limiar: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Latitudes e longitudes de um array de cidades (NaN se ausente).
+
+        ``limiar`` ativa a correspondência aproximada (ver ``resolver``)."""
+        pos = self.posicoes(cidades, limiar)
+        encontrado = pos >= 0
+        lat = np.full(len(pos), np.nan)
+        lon = np.full(len(pos), np.nan)
+        lat[encontrado] = self.lat[pos[encontrado]]
+        lon[encontrado] = self.lon[pos[encontrado]]
+        return lat, lon
+
+    def contem(self, cidades: Iterable) -> np.ndarray:
+        """Máscara booleana das cidades presentes no índice."""
+        return self.posicoes(cidades) >= 0
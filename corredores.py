@@ -0,0 +1,266 @@
+"""Seleção espacial de rotas (Linhas_selecionadas_Gua.py e mapa1.py).
+
+Todos os trechos entre paradas consecutivas ficam em uma grade uniforme de
+células em graus. Cada consulta (polilinha, ponto com raio ou polígono)
+visita só as células do próprio retângulo envolvente e testa os trechos
+candidatos de uma vez, com operações vetorizadas.
+"""
+import numpy as np
+import pandas as pd
+
+from mapas import trechos_consecutivos
+
+CHAVES_ROTA = ["PREFIXO", "DESCRICAO DA LINHA"]
+TAMANHO_CELULA_GRAUS = 0.5
+# Trechos que cobririam mais células que isso ficam fora da grade e são
+# sempre candidatos (evita que poucos trechos longos inflem o índice)
+MAX_CELULAS_POR_TRECHO = 64
+KM_POR_GRAU_LAT = 110.574
+KM_POR_GRAU_LON = 111.320  # no equador; multiplicado pelo cosseno da latitude
+
+
+def _orientacao(ax, ay, bx, by, cx, cy) -> np.ndarray:
+    return np.sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+
+
+def _entre(a, b, c) -> np.ndarray:
+    return (np.minimum(a, b) <= c) & (c <= np.maximum(a, b))
+
+
+def segmentos_se_cruzam(ax, ay, bx, by, cx, cy, dx, dy) -> np.ndarray:
+    """Se os segmentos AB e CD se tocam (par a par, vetorizado)."""
+    o1 = _orientacao(ax, ay, bx, by, cx, cy)
+    o2 = _orientacao(ax, ay, bx, by, dx, dy)
+    o3 = _orientacao(cx, cy, dx, dy, ax, ay)
+    o4 = _orientacao(cx, cy, dx, dy, bx, by)
+    cruzam = (o1 != o2) & (o3 != o4)
+    # Casos colineares: uma ponta sobre o outro segmento
+    cruzam |= (o1 == 0) & _entre(ax, bx, cx) & _entre(ay, by, cy)
+    cruzam |= (o2 == 0) & _entre(ax, bx, dx) & _entre(ay, by, dy)
+    cruzam |= (o3 == 0) & _entre(cx, dx, ax) & _entre(cy, dy, ay)
+    cruzam |= (o4 == 0) & _entre(cx, dx, bx) & _entre(cy, dy, by)
+    return cruzam
+
+
+def distancia_ponto_segmento(px, py, ax, ay, bx, by) -> np.ndarray:
+    """Distância do ponto P ao segmento AB, no mesmo plano das entradas."""
+    vx, vy = bx - ax, by - ay
+    comprimento2 = vx * vx + vy * vy
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(comprimento2 > 0, ((px - ax) * vx + (py - ay) * vy) / comprimento2, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.hypot(px - (ax + t * vx), py - (ay + t * vy))
+
+
+def distancia_entre_segmentos(ax, ay, bx, by, cx, cy, dx, dy) -> np.ndarray:
+    """Menor distância entre os segmentos AB e CD (0 quando se cruzam)."""
+    distancia = np.minimum.reduce([
+        distancia_ponto_segmento(ax, ay, cx, cy, dx, dy),
+        distancia_ponto_segmento(bx, by, cx, cy, dx, dy),
+        distancia_ponto_segmento(cx, cy, ax, ay, bx, by),
+        distancia_ponto_segmento(dx, dy, ax, ay, bx, by),
+    ])
+    return np.where(segmentos_se_cruzam(ax, ay, bx, by, cx, cy, dx, dy), 0.0, distancia)
+
+
+def pontos_no_poligono(x, y, px, py) -> np.ndarray:
+    """Teste do raio (par/ímpar) de vários pontos contra um polígono."""
+    x = np.asarray(x, dtype=float)[:, None]
+    y = np.asarray(y, dtype=float)[:, None]
+    x1, y1 = px[None, :], py[None, :]
+    x2, y2 = np.roll(px, -1)[None, :], np.roll(py, -1)[None, :]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cruza = ((y1 > y) != (y2 > y)) & (x < (x2 - x1) * (y - y1) / (y2 - y1) + x1)
+    return cruza.sum(axis=1) % 2 == 1
+
+
+def _em_arrays(pontos):
+    """Lista de (lat, lon) em arrays de longitude (x) e latitude (y)."""
+    pontos = np.asarray(pontos, dtype=float).reshape(-1, 2)
+    return pontos[:, 1], pontos[:, 0]
+
+
+class IndiceCorredores:
+    """Índice em grade dos trechos de todas as rotas.
+
+    As consultas recebem pontos como (lat, lon) e distâncias em km e
+    retornam os números das rotas (posições em ``rotas``) selecionadas;
+    ``linhas`` devolve as linhas do DataFrame original dessas rotas.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        chaves=CHAVES_ROTA,
+        col_seq: str = "SEQUENCIA",
+        col_lat: str = "LAT",
+        col_lon: str = "LON",
+        tamanho_celula: float = TAMANHO_CELULA_GRAUS,
+    ):
+        self.df = df
+        self.chaves = list(chaves)
+        grupos = df.groupby(self.chaves, sort=False)
+        self.rotas = grupos.size().index
+        self._rota_da_linha = grupos.ngroup().to_numpy()
+        self.tamanho_celula = tamanho_celula
+
+        # Uma parada sem coordenada não interrompe a rota: as vizinhas se ligam
+        trechos = trechos_consecutivos(df, self.chaves, col_seq, col_lat, col_lon, pular_ausentes=True)
+        # Rotas sem trecho (uma só parada válida) entram como trecho degenerado
+        pontos = pd.DataFrame({
+            "GRUPO": self._rota_da_linha,
+            "LON": df[col_lon].to_numpy(dtype=float),
+            "LAT": df[col_lat].to_numpy(dtype=float),
+        }).dropna()
+        pontos = pontos[(pontos["GRUPO"] >= 0) & ~pontos["GRUPO"].isin(trechos["GRUPO"])]
+        pontos = pontos.drop_duplicates("GRUPO")
+        trechos = pd.concat([trechos, pd.DataFrame({
+            "GRUPO": pontos["GRUPO"],
+            "LON_O": pontos["LON"], "LAT_O": pontos["LAT"],
+            "LON_D": pontos["LON"], "LAT_D": pontos["LAT"],
+        })], ignore_index=True)
+
+        self._rota = trechos["GRUPO"].to_numpy(dtype=np.int64)
+        self._x0 = trechos["LON_O"].to_numpy(dtype=float)
+        self._y0 = trechos["LAT_O"].to_numpy(dtype=float)
+        self._x1 = trechos["LON_D"].to_numpy(dtype=float)
+        self._y1 = trechos["LAT_D"].to_numpy(dtype=float)
+        self._montar_grade()
+
+    # === GRADE ===
+    def _celulas(self, x, y):
+        return (
+            np.floor(np.asarray(x) / self.tamanho_celula).astype(np.int64),
+            np.floor(np.asarray(y) / self.tamanho_celula).astype(np.int64),
+        )
+
+    def _chave_celula(self, cx, cy):
+        # Longitudes e latitudes cabem em ±2^20 células
+        return (cx + (1 << 20)) * (1 << 21) + (cy + (1 << 20))
+
+    def _montar_grade(self) -> None:
+        """Cada trecho é registrado em todas as células do seu retângulo."""
+        cx0, cy0 = self._celulas(np.minimum(self._x0, self._x1), np.minimum(self._y0, self._y1))
+        cx1, cy1 = self._celulas(np.maximum(self._x0, self._x1), np.maximum(self._y0, self._y1))
+        largura = cx1 - cx0 + 1
+        quantidade = largura * (cy1 - cy0 + 1)
+        longo = quantidade > MAX_CELULAS_POR_TRECHO
+        self._trechos_longos = np.flatnonzero(longo)
+        quantidade = np.where(longo, 0, quantidade)
+
+        trecho = np.repeat(np.arange(len(self._rota)), quantidade)
+        k = np.arange(len(trecho)) - np.repeat(np.cumsum(quantidade) - quantidade, quantidade)
+        cx = cx0[trecho] + k % largura[trecho]
+        cy = cy0[trecho] + k // largura[trecho]
+
+        chave = self._chave_celula(cx, cy)
+        ordem = np.argsort(chave, kind="stable")
+        self._grade_chaves = chave[ordem]
+        self._grade_trechos = trecho[ordem]
+
+    def _candidatos(self, xmin, ymin, xmax, ymax) -> np.ndarray:
+        """Trechos registrados nas células que cobrem o retângulo."""
+        cx0, cy0 = self._celulas(xmin, ymin)
+        cx1, cy1 = self._celulas(xmax, ymax)
+        cx, cy = np.meshgrid(np.arange(cx0, cx1 + 1), np.arange(cy0, cy1 + 1))
+        chaves = self._chave_celula(cx.ravel(), cy.ravel())
+        inicio = np.searchsorted(self._grade_chaves, chaves, side="left")
+        fim = np.searchsorted(self._grade_chaves, chaves, side="right")
+        tem = fim > inicio
+        inicio, fim = inicio[tem], fim[tem]
+        n = fim - inicio
+        pos = np.repeat(inicio - np.cumsum(n) + n, n) + np.arange(n.sum())
+        return np.unique(np.concatenate([self._grade_trechos[pos], self._trechos_longos]))
+
+    def _candidatos_por_segmentos(self, x0, y0, x1, y1, folga_x=0.0, folga_y=0.0):
+        """Pares (trecho da rota, segmento da consulta) com retângulos próximos."""
+        pares_trecho, pares_consulta = [], []
+        for i in range(len(x0)):
+            candidatos = self._candidatos(
+                min(x0[i], x1[i]) - folga_x, min(y0[i], y1[i]) - folga_y,
+                max(x0[i], x1[i]) + folga_x, max(y0[i], y1[i]) + folga_y,
+            )
+            pares_trecho.append(candidatos)
+            pares_consulta.append(np.full(len(candidatos), i))
+        if not pares_trecho:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(pares_trecho), np.concatenate(pares_consulta)
+
+    # === CONSULTAS ===
+    def rotas_que_cruzam(self, polilinha) -> np.ndarray:
+        """Rotas com algum trecho que toca a polilinha [(lat, lon), ...]."""
+        x, y = _em_arrays(polilinha)
+        x0, y0, x1, y1 = x[:-1], y[:-1], x[1:], y[1:]
+        trecho, seg = self._candidatos_por_segmentos(x0, y0, x1, y1)
+        cruzam = segmentos_se_cruzam(
+            self._x0[trecho], self._y0[trecho], self._x1[trecho], self._y1[trecho],
+            x0[seg], y0[seg], x1[seg], y1[seg],
+        )
+        return np.unique(self._rota[trecho[cruzam]])
+
+    def rotas_que_cruzam_latitude(self, latitude: float) -> np.ndarray:
+        """Rotas que passam de um lado ao outro da latitude, com paradas
+        estritamente ao sul e ao norte dela; uma rota que só encosta na
+        latitude e volta não conta. Paradas sem coordenada são puladas."""
+        trecho = self._candidatos(-180.0, latitude, 180.0, latitude)
+        y0, y1 = self._y0[trecho], self._y1[trecho]
+        # Toda rota que cruza tem trechos tocando a latitude com pontas dos dois lados
+        toca = (np.minimum(y0, y1) <= latitude) & (latitude <= np.maximum(y0, y1))
+        rota, y0, y1 = self._rota[trecho[toca]], y0[toca], y1[toca]
+        ao_sul = rota[(y0 < latitude) | (y1 < latitude)]
+        ao_norte = rota[(y0 > latitude) | (y1 > latitude)]
+        return np.intersect1d(ao_sul, ao_norte)
+
+    def rotas_perto_de(self, lat: float, lon: float, raio_km: float) -> np.ndarray:
+        """Rotas com algum trecho a até ``raio_km`` do ponto."""
+        escala_x = KM_POR_GRAU_LON * np.cos(np.radians(lat))
+        trecho = self._candidatos(
+            lon - raio_km / escala_x, lat - raio_km / KM_POR_GRAU_LAT,
+            lon + raio_km / escala_x, lat + raio_km / KM_POR_GRAU_LAT,
+        )
+        # Plano local em km centrado no ponto
+        distancia = distancia_ponto_segmento(
+            0.0, 0.0,
+            (self._x0[trecho] - lon) * escala_x, (self._y0[trecho] - lat) * KM_POR_GRAU_LAT,
+            (self._x1[trecho] - lon) * escala_x, (self._y1[trecho] - lat) * KM_POR_GRAU_LAT,
+        )
+        return np.unique(self._rota[trecho[distancia <= raio_km]])
+
+    def rotas_no_poligono(self, poligono, raio_km: float = 0.0) -> np.ndarray:
+        """Rotas que entram no polígono [(lat, lon), ...] ou passam a até
+        ``raio_km`` da borda dele."""
+        px, py = _em_arrays(poligono)
+        lat_ref = float(np.mean(py))
+        escala_x = KM_POR_GRAU_LON * np.cos(np.radians(lat_ref))
+
+        # Trechos com uma ponta dentro do polígono
+        trecho = self._candidatos(px.min(), py.min(), px.max(), py.max())
+        dentro = pontos_no_poligono(self._x0[trecho], self._y0[trecho], px, py)
+        dentro |= pontos_no_poligono(self._x1[trecho], self._y1[trecho], px, py)
+        selecionados = [trecho[dentro]]
+
+        # Trechos que tocam ou passam perto da borda
+        x0, y0, x1, y1 = px, py, np.roll(px, -1), np.roll(py, -1)
+        t, seg = self._candidatos_por_segmentos(
+            x0, y0, x1, y1, raio_km / escala_x, raio_km / KM_POR_GRAU_LAT
+        )
+        distancia = distancia_entre_segmentos(
+            (self._x0[t] - px[0]) * escala_x, (self._y0[t] - py[0]) * KM_POR_GRAU_LAT,
+            (self._x1[t] - px[0]) * escala_x, (self._y1[t] - py[0]) * KM_POR_GRAU_LAT,
+            (x0[seg] - px[0]) * escala_x, (y0[seg] - py[0]) * KM_POR_GRAU_LAT,
+            (x1[seg] - px[0]) * escala_x, (y1[seg] - py[0]) * KM_POR_GRAU_LAT,
+        )
+        selecionados.append(t[distancia <= raio_km])
+        return np.unique(self._rota[np.concatenate(selecionados)])
+
+    def linhas(self, rotas) -> pd.DataFrame:
+        """Linhas do DataFrame original das rotas, agrupadas como no
+        ``groupby`` (chaves em ordem) e na ordem original dentro de cada rota."""
+        selecionada = np.zeros(len(self.rotas), dtype=bool)
+        selecionada[np.asarray(rotas, dtype=np.int64)] = True
+        mascara = (self._rota_da_linha >= 0) & selecionada[np.maximum(self._rota_da_linha, 0)]
+        return (
+            self.df[mascara]
+            .sort_values(self.chaves, kind="stable")
+            .reset_index(drop=True)
+        )
@@ -0,0 +1,107 @@
+"""Esquema compacto das tabelas de malha, rotas e planejamento.
+
+As tabelas repetem poucas strings em milhares de linhas (prefixos, nomes
+de linha, localidades, dias...). Aqui elas viram categorias (códigos
+inteiros mais uma lista de valores distintos), as coordenadas viram
+float32, os horários "HH:MM" viram minutos do dia em int16 e os inteiros
+ficam com o menor tipo que os comporta.
+"""
+import re
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+FRACAO_MAXIMA_DISTINTOS = 0.5  # acima disso a coluna fica como texto
+COLUNAS_CATEGORICAS = [
+    # Malha (Itapemirim)
+    "CODIGO_LINHA", "PREFIXO SIGMA", "NOME DA LINHA", "LOCALIDADE", "TIPO_VEICULO",
+    "FREQUENCIA", "SENTIDO", "DIA_PARTIDA",
+    # Rotas (Guanabara) e coordenadas
+    "PREFIXO", "DESCRICAO DA LINHA", "CIDADES", "ORIGEM", "DESTINO",
+    "CIDADE", "CIDADE (UF)", "CIDADE(UF)", "UF",
+    # Planejamento operacional
+    "VIAGEM", "EMPRESA", "LINHA", "LEGENDA", "FLUXO",
+    "DIA SEMANA", "DIA SEMANA PARTIDA", "DIA SEMANA CHEGADA",
+]
+COLUNAS_COORDENADAS = ["LAT", "LON"]
+COLUNAS_HORARIO = ["HORARIO"]
+COLUNAS_INTEIRAS = ["SERVICO", "SEQUENCIA", "N° LEGENDA"]
+
+
+def _minuto(valor) -> int:
+    if hasattr(valor, "hour"):  # datetime.time / datetime lidos do Excel
+        return valor.hour * 60 + valor.minute
+    encontrado = re.match(r"\s*(\d{1,2}):(\d{2})", str(valor))
+    if encontrado and int(encontrado.group(1)) < 24 and int(encontrado.group(2)) < 60:
+        return int(encontrado.group(1)) * 60 + int(encontrado.group(2))
+    return -1
+
+
+def minutos(horarios) -> pd.Series:
+    """Minuto do dia (int16) de horários "HH:MM" ou ``datetime.time``; -1
+    quando ausente ou inválido. Cada valor distinto é convertido uma vez."""
+    serie = pd.Series(horarios)
+    codigos, unicos = pd.factorize(serie)
+    valores = np.array([_minuto(v) for v in unicos] + [-1], dtype=np.int16)
+    return pd.Series(valores[codigos], index=serie.index)
+
+
+def texto_dos_minutos(valores) -> pd.Series:
+    """Volta minutos do dia para "HH:MM" (para exibir); -1 vira vazio."""
+    serie = pd.Series(valores)
+    texto = (serie // 60).map("{:02d}".format) + ":" + (serie % 60).map("{:02d}".format)
+    return texto.where(serie >= 0)
+
+
+def memoria(df: pd.DataFrame) -> int:
+    """Bytes ocupados pela tabela, contando o conteúdo das strings."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def compactar(df: pd.DataFrame, coordenadas: bool = True, horarios: bool = True) -> pd.DataFrame:
+    """Cópia de ``df`` no esquema compacto; colunas fora do esquema ficam
+    como estão.
+
+    ``coordenadas=False`` mantém LAT/LON em float64, para as tabelas que
+    são gravadas de volta em arquivo. ``horarios=False`` mantém o texto
+    original de HORARIO. O tamanho original fica em
+    ``attrs["memoria_original"]`` para o relatório.
+    """
+    original = memoria(df)
+    df = df.copy()
+    for col in df.columns.intersection(COLUNAS_CATEGORICAS):
+        # Com valores quase todos distintos (ex.: a tabela de coordenadas),
+        # a categoria gasta mais do que economiza
+        if (
+            not isinstance(df[col].dtype, pd.CategoricalDtype)
+            and df[col].nunique() <= len(df) * FRACAO_MAXIMA_DISTINTOS
+        ):
+            df[col] = df[col].astype("category")
+    for col in df.columns.intersection(COLUNAS_INTEIRAS):
+        if pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+    if coordenadas:
+        for col in df.columns.intersection(COLUNAS_COORDENADAS):
+            df[col] = df[col].astype(np.float32)
+    if horarios:
+        for col in df.columns.intersection(COLUNAS_HORARIO):
+            df[col] = minutos(df[col])
+    df.attrs["memoria_original"] = df.attrs.get("memoria_original", original)
+    return df
+
+
+def relatorio_memoria(tabelas: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Linhas e memória (MB) de cada tabela antes e depois de ``compactar``."""
+    linhas = []
+    for nome, df in tabelas.items():
+        atual = memoria(df)
+        original = df.attrs.get("memoria_original", atual)
+        linhas.append({
+            "TABELA": nome,
+            "LINHAS": len(df),
+            "ORIGINAL_MB": round(original / 1e6, 3),
+            "COMPACTO_MB": round(atual / 1e6, 3),
+            "REDUCAO": round(original / atual, 1) if atual else None,
+        })
+    return pd.DataFrame(linhas)
@@ -0,0 +1,185 @@
+"""Partidas por faixa horária de todas as localidades (Horarios_FSA.py e mapa1.py).
+
+A malha inteira é contada de uma vez: cada partida vira um índice
+(localidade, faixa) calculado a partir do minuto do dia, e um único
+``np.bincount`` produz o histograma de todas as localidades. A tabela de
+qualquer cidade passa a ser uma consulta a esse histograma.
+"""
+import numpy as np
+import pandas as pd
+
+from leitura import TAMANHO_BLOCO_CSV, ler_csv_em_blocos
+
+LARGURA_FAIXA_MIN = 240  # faixas de quatro horas
+MINUTOS_DIA = 24 * 60
+DIAS_SEMANA = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+
+
+def minutos_do_dia(horarios) -> np.ndarray:
+    """Minuto do dia (0 a 1439) de horários "HH:MM"; -1 quando inválido.
+
+    Cada texto distinto é convertido uma única vez."""
+    codigos, unicos = pd.factorize(pd.Series(horarios, dtype=object))
+    if len(unicos) == 0:
+        return np.full(len(codigos), -1, dtype=np.int64)
+    horas = pd.to_datetime(pd.Series(unicos, dtype=object), format="%H:%M", errors="coerce")
+    minutos = (horas.dt.hour * 60 + horas.dt.minute).fillna(-1).to_numpy(dtype=np.int64)
+    return np.where(codigos >= 0, minutos[codigos], -1)
+
+
+def rotulos_faixas(largura_min: int = LARGURA_FAIXA_MIN) -> list:
+    """Rótulos 'HH:MM-HH:MM' das faixas (ex.: '04:00-07:59')."""
+    rotulos = []
+    for inicio in range(0, MINUTOS_DIA, largura_min):
+        fim = min(inicio + largura_min, MINUTOS_DIA) - 1
+        rotulos.append(f"{inicio // 60:02d}:{inicio % 60:02d}-{fim // 60:02d}:{fim % 60:02d}")
+    return rotulos
+
+
+def deslocamento_dias(dia_partida) -> np.ndarray:
+    """Dias após o início do serviço ("D+0", "D+1", ...); 0 se ausente."""
+    texto = pd.Series(dia_partida, dtype=object).astype(str)
+    dias = pd.to_numeric(texto.str.extract(r"D\+(\d+)", expand=False), errors="coerce")
+    return dias.fillna(0).to_numpy(dtype=np.int64)
+
+
+class HistogramaPartidas:
+    """Contagens de partidas por localidade e faixa horária.
+
+    ``contagens[l, f]`` conta as linhas da malha da localidade ``l`` na faixa
+    ``f``, como as tabelas originais. ``por_dia[l, d, f]`` abre cada linha
+    nos dias da semana em que a partida acontece (dias de ``FREQUENCIA``
+    deslocados por ``DIA_PARTIDA``), ou seja, partidas semanais reais.
+    """
+
+    def __init__(self, localidades, contagens: np.ndarray, por_dia: np.ndarray, largura_min: int):
+        self.localidades = pd.Index(localidades)
+        self.contagens = contagens
+        self.por_dia = por_dia
+        self.largura_min = largura_min
+        self.faixas = rotulos_faixas(largura_min)
+        self._maiusculas = self.localidades.astype(str).str.upper()
+
+    @classmethod
+    def de_malha(
+        cls,
+        df: pd.DataFrame,
+        largura_min: int = LARGURA_FAIXA_MIN,
+        col_localidade: str = "LOCALIDADE",
+        col_horario: str = "HORARIO",
+        col_dia: str = "DIA_PARTIDA",
+        col_frequencia: str = "FREQUENCIA",
+    ) -> "HistogramaPartidas":
+        n_faixas = -(-MINUTOS_DIA // largura_min)
+        codigo_loc, localidades = pd.factorize(df[col_localidade])
+        minutos = minutos_do_dia(df[col_horario])
+        valida = (codigo_loc >= 0) & (minutos >= 0)
+        faixa = minutos // largura_min
+
+        n_loc = len(localidades)
+        chave = codigo_loc[valida] * n_faixas + faixa[valida]
+        contagens = np.bincount(chave, minlength=n_loc * n_faixas).reshape(n_loc, n_faixas)
+
+        # Abre cada linha nos dias da frequência: (linha, dia de início)
+        por_dia = np.zeros((n_loc, 7, n_faixas), dtype=np.int64)
+        if col_frequencia in df.columns:
+            dias = df[col_frequencia].astype(str).str.split(",").explode().str.strip()
+            dia_inicio = dias.map({d: i for i, d in enumerate(DIAS_SEMANA)})
+            linha = dias.index.to_numpy()[dia_inicio.notna().to_numpy()]
+            dia_inicio = dia_inicio.dropna().to_numpy(dtype=np.int64)
+
+            posicao = df.index.get_indexer(linha)
+            deslocamento = np.zeros(len(df), dtype=np.int64)
+            if col_dia in df.columns:
+                deslocamento = deslocamento_dias(df[col_dia])
+            dia = (dia_inicio + deslocamento[posicao]) % 7
+            ok = valida[posicao]
+            chave = (codigo_loc[posicao] * 7 + dia) * n_faixas + faixa[posicao]
+            por_dia = np.bincount(chave[ok], minlength=n_loc * 7 * n_faixas).reshape(n_loc, 7, n_faixas)
+        return cls(localidades, contagens, por_dia, largura_min)
+
+    @classmethod
+    def de_csv(
+        cls,
+        caminho,
+        largura_min: int = LARGURA_FAIXA_MIN,
+        cidade: str = None,
+        tamanho_bloco: int = TAMANHO_BLOCO_CSV,
+        col_localidade: str = "LOCALIDADE",
+        col_horario: str = "HORARIO",
+        col_dia: str = "DIA_PARTIDA",
+        col_frequencia: str = "FREQUENCIA",
+    ) -> "HistogramaPartidas":
+        """Histograma de um CSV da malha lido em blocos.
+
+        Só as quatro colunas usadas são lidas. Com ``cidade``, cada bloco é
+        reduzido às localidades que a contêm antes da contagem. Os blocos são
+        somados conforme chegam, então a memória depende do número de
+        localidades, não do tamanho do arquivo.
+        """
+        colunas = [col_localidade, col_horario, col_dia, col_frequencia]
+        total = cls(pd.Index([], dtype=object), *cls._vazios(0, largura_min), largura_min)
+        for bloco in ler_csv_em_blocos(caminho, colunas, tamanho_bloco):
+            if cidade is not None:
+                nomes = bloco[col_localidade].str.upper()
+                bloco = bloco[nomes.str.contains(cidade, regex=False, na=False)]
+            parcial = cls.de_malha(
+                bloco.reset_index(drop=True), largura_min,
+                col_localidade, col_horario, col_dia, col_frequencia,
+            )
+            total = total.somar(parcial)
+        return total
+
+    @staticmethod
+    def _vazios(n_loc: int, largura_min: int):
+        n_faixas = -(-MINUTOS_DIA // largura_min)
+        return (
+            np.zeros((n_loc, n_faixas), dtype=np.int64),
+            np.zeros((n_loc, 7, n_faixas), dtype=np.int64),
+        )
+
+    def somar(self, outro: "HistogramaPartidas") -> "HistogramaPartidas":
+        """Soma de dois histogramas com a mesma largura de faixa; as
+        localidades novas de ``outro`` entram no fim, na ordem em que apareceram."""
+        if outro.largura_min != self.largura_min:
+            raise ValueError("Histogramas com larguras de faixa diferentes")
+        novas = outro.localidades[~outro.localidades.isin(self.localidades)]
+        localidades = self.localidades.append(novas)
+        contagens, por_dia = self._vazios(len(localidades), self.largura_min)
+        contagens[:len(self.localidades)] = self.contagens
+        por_dia[:len(self.localidades)] = self.por_dia
+        posicoes = localidades.get_indexer(outro.localidades)
+        contagens[posicoes] += outro.contagens
+        por_dia[posicoes] += outro.por_dia
+        return HistogramaPartidas(localidades, contagens, por_dia, self.largura_min)
+
+    def selecionar(self, cidade: str) -> np.ndarray:
+        """Posições das localidades cujo nome (em maiúsculas) contém ``cidade``,
+        como o antigo ``str.upper().str.contains``, mas sem regex (nomes como
+        'RIO DE JANEIRO (ROCINHA)' têm parênteses)."""
+        contem = self._maiusculas.str.contains(cidade, regex=False)
+        return np.flatnonzero(np.asarray(contem, dtype=bool))
+
+    def tabela(
+        self,
+        cidade: str,
+        coluna: str = "Quantidade de incidências",
+        por_dia: bool = False,
+    ) -> pd.DataFrame:
+        """Tabela de partidas da cidade por faixa, com a linha de total.
+
+        Com ``por_dia`` há uma coluna por dia da semana e a coluna de total.
+        """
+        posicoes = self.selecionar(cidade)
+        if por_dia:
+            valores = self.por_dia[posicoes].sum(axis=0).T
+            tabela = pd.DataFrame(valores, columns=DIAS_SEMANA)
+            tabela[coluna] = valores.sum(axis=1)
+        else:
+            tabela = pd.DataFrame({coluna: self.contagens[posicoes].sum(axis=0)})
+        tabela.insert(0, "Faixa de horário", self.faixas)
+
+        # Adiciona linha de totais
+        total = tabela.drop(columns="Faixa de horário").sum().to_frame().T
+        total.insert(0, "Faixa de horário", "Total")
+        return pd.concat([tabela, total], ignore_index=True)
@@ -0,0 +1,615 @@
+"""Planejador de jornadas sobre as grades da Itapemirim e da Guanabara.
+
+A grade é um vetor plano de trechos elementares (de uma parada até a
+seguinte, na mesma viagem) ordenado pelo horário de partida, como no
+Connection Scan Algorithm: a chegada mais cedo a todas as paradas sai de
+uma única varredura desse vetor, sem grafo nem fila de prioridade. Os
+horários são minutos a partir de quarta 00:00 (o eixo da timeline e de
+conexoes.py) e a grade semanal é repetida uma semana antes e uma depois,
+para as jornadas que atravessam a virada da semana.
+
+As jornadas via HUB de todos os pares origem–destino saem de duas
+varreduras com uma consulta para cada partida do HUB: a chegada mais cedo
+a cada destino saindo do HUB naquele horário e, na grade invertida no
+tempo, a partida mais tarde de cada origem que chega ao HUB a tempo da
+baldeação. A jornada mais rápida de cada par é o melhor desses horários.
+
+A malha Itapemirim tem horário em cada parada. As rotas da Guanabara só
+têm a sequência de cidades: os horários são estimados a partir de uma
+partida diária (``PARTIDA_PADRAO_GUA``) e da distância entre as paradas.
+"""
+import re
+from bisect import bisect_right
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from conexoes import ESPERA_MINIMA_MIN, MINUTOS_SEMANA, rotulo_minuto
+from coordenadas import chave_cidade
+from corredores import KM_POR_GRAU_LAT, KM_POR_GRAU_LON
+from horarios import DIAS_SEMANA, MINUTOS_DIA, deslocamento_dias, minutos_do_dia
+from malha import CHAVES_SERVICO, converter_coordenadas
+
+HUB_PADRAO = "FEIRA DE SANTANA (BA)"
+BALDEACAO_MINIMA_MIN = ESPERA_MINIMA_MIN
+DURACAO_MAXIMA_MIN = MINUTOS_SEMANA  # jornadas mais longas não são procuradas
+SEMANAS_GRADE = (-1, 0, 1)
+INALCANCAVEL = np.iinfo(np.int64).max // 4
+TAMANHO_BLOCO = 1 << 16  # trechos convertidos para listas de cada vez na varredura
+# Localidade da malha (sem UF) e cidade das rotas com o mesmo nome a até
+# essa distância são a mesma parada
+RAIO_MESMA_CIDADE_KM = 30
+
+# Estimativa de horários da Guanabara
+CHAVES_ROTA_GUA = ["PREFIXO", "DESCRICAO DA LINHA", "SENTIDO"]
+PARTIDA_PADRAO_GUA = 9 * 60  # 09:00, como as partidas da Guanabara no planejamento
+VELOCIDADE_MEDIA_KMH = 60
+PARADA_MIN = 10  # tempo parado em cada cidade intermediária
+
+COLUNAS_TRECHO = ["EMPRESA", "LINHA", "VIAGEM", "ORDEM", "DE", "PARA", "PARTIDA", "CHEGADA"]
+COLUNAS_JORNADA = ["EMPRESA", "LINHA", "VIAGEM", "DE", "PARA", "PARTIDA", "CHEGADA", "DURACAO_MIN"]
+
+# Dia da semana -> dias desde quarta
+DIA_DESDE_QUARTA = {dia: (i - DIAS_SEMANA.index("Quarta")) % 7 for i, dia in enumerate(DIAS_SEMANA)}
+ROTULO_DIA = {i: dia[:3].upper() for dia, i in DIA_DESDE_QUARTA.items()}
+
+
+def chave_parada(nome) -> str:
+    """Chave da localidade: nome sem acentos nem pontuação e a UF entre
+    parênteses, quando houver ("Feira de Santana(BA)" -> "FEIRA DE SANTANA (BA)")."""
+    if pd.isna(nome):
+        return ""
+    uf = re.search(r"\(\s*(\w{2})\s*\)", str(nome))
+    base = chave_cidade(re.sub(r"\(\s*\w{2}\s*\)", " ", str(nome)))
+    return f"{base} ({uf.group(1).upper()})" if uf else base
+
+
+def sem_uf(chave: str) -> str:
+    return re.sub(r" \(\w{2}\)$", "", chave)
+
+
+def _chaves_paradas(nomes) -> np.ndarray:
+    codigos, unicos = pd.factorize(pd.Series(nomes, dtype=object))
+    chaves = np.array([chave_parada(n) for n in unicos] + [""], dtype=object)
+    return chaves[codigos]
+
+
+def _distancia_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Distância em km no plano local (suficiente para paradas próximas e
+    para estimar o tempo entre paradas seguidas)."""
+    return np.hypot(
+        (lon2 - lon1) * KM_POR_GRAU_LON * np.cos(np.radians((lat1 + lat2) / 2)),
+        (lat2 - lat1) * KM_POR_GRAU_LAT,
+    )
+
+
+def _chaves_da_malha(df: pd.DataFrame, referencia: pd.DataFrame = None) -> np.ndarray:
+    """Chaves das localidades da malha, que não têm UF. Com ``referencia``
+    (rotas com CIDADES, LAT e LON), cada localidade recebe a chave da
+    cidade de mesmo nome mais próxima dentro de ``RAIO_MESMA_CIDADE_KM``:
+    assim MILAGRES (BA) da malha não vira MILAGRES (CE) das rotas."""
+    chaves = _chaves_paradas(df["LOCALIDADE"])
+    if referencia is None or not {"LAT", "LON"} <= set(df.columns):
+        return chaves
+    coords = converter_coordenadas(df[["LAT", "LON"]])
+    pontos = pd.DataFrame({"BASE": chaves, "LAT": coords["LAT"].to_numpy(), "LON": coords["LON"].to_numpy()})
+    ref = converter_coordenadas(referencia[["LAT", "LON"]]).assign(CHAVE=_chaves_paradas(referencia["CIDADES"]))
+    ref = ref.drop_duplicates("CHAVE").assign(BASE=lambda r: r["CHAVE"].map(sem_uf))
+
+    pares = pontos.drop_duplicates().merge(ref, on="BASE", suffixes=("", "_REF"))
+    pares["KM"] = _distancia_km(pares["LAT"], pares["LON"], pares["LAT_REF"], pares["LON_REF"])
+    pares = pares[pares["KM"] <= RAIO_MESMA_CIDADE_KM].sort_values("KM", kind="stable")
+    pares = pares.drop_duplicates(["BASE", "LAT", "LON"])
+    casadas = pontos.merge(pares[["BASE", "LAT", "LON", "CHAVE"]], on=["BASE", "LAT", "LON"], how="left")
+    return casadas["CHAVE"].fillna(casadas["BASE"]).to_numpy(dtype=object)
+
+
+def _minutos(horarios) -> np.ndarray:
+    """Minuto do dia de HORARIO em texto ou já em minutos (esquema.compactar)."""
+    if pd.api.types.is_integer_dtype(horarios):
+        return pd.Series(horarios).to_numpy(dtype=np.int64)
+    return minutos_do_dia(horarios)
+
+
+def _categoria(codigos, rotulos) -> pd.Categorical:
+    """``rotulos[codigos]`` como categoria (código -1 = ausente).
+
+    Rótulos iguais viram a mesma categoria e as categorias ficam em ordem
+    alfabética: ordenar pela coluna dá a mesma ordem que ordenar o texto.
+    As categorias são object, então voltar a texto só copia referências.
+    """
+    unicos, posicao = np.unique(np.asarray(rotulos, dtype=object), return_inverse=True)
+    codigos = np.asarray(codigos, dtype=np.int64)
+    return pd.Categorical.from_codes(
+        np.where(codigos >= 0, posicao.reshape(-1)[codigos], -1), pd.Index(unicos, dtype=object)
+    )
+
+
+def _texto_como_categoria(valores) -> pd.Categorical:
+    return _categoria(*pd.factorize(np.asarray(valores, dtype=object)))
+
+
+def _rotulos_como_categoria(minutos) -> pd.Categorical:
+    """``rotulo_minuto`` como categoria: cada minuto distinto é um rótulo."""
+    unicos, posicao = np.unique(np.asarray(minutos, dtype=np.int64) % MINUTOS_SEMANA, return_inverse=True)
+    return pd.Categorical.from_codes(posicao.reshape(-1), pd.Index(rotulo_minuto(unicos), dtype=object))
+
+
+def _pares_consecutivos(paradas: pd.DataFrame) -> pd.DataFrame:
+    """Um trecho para cada par de paradas seguidas da mesma viagem;
+    ``paradas`` já vem ordenada por VIAGEM e pela ordem das paradas, com as
+    colunas de texto como categoria (``_categoria``)."""
+    viagem = paradas["VIAGEM"].cat.codes.to_numpy()
+    segue = np.flatnonzero(viagem[1:] == viagem[:-1])
+    trechos = pd.DataFrame({
+        "EMPRESA": paradas["EMPRESA"].array.take(segue),
+        "LINHA": paradas["LINHA"].array.take(segue),
+        "VIAGEM": paradas["VIAGEM"].array.take(segue),
+        "ORDEM": np.arange(len(segue)),  # só desempata trechos da mesma viagem
+        "DE": paradas["PARADA"].array.take(segue),
+        "PARA": paradas["PARADA"].array.take(segue + 1),
+        "PARTIDA": paradas["SAIDA"].to_numpy(dtype=np.int64)[segue],
+        "CHEGADA": paradas["CHEGADA"].to_numpy(dtype=np.int64)[segue + 1],
+    }, columns=COLUNAS_TRECHO)
+    # Horários fora de ordem na planilha não viram trecho
+    return trechos[trechos["CHEGADA"] >= trechos["PARTIDA"]].reset_index(drop=True)
+
+
+def trechos_da_malha(
+    malha: pd.DataFrame, referencia: pd.DataFrame = None, empresa: str = "ITAPEMIRIM"
+) -> pd.DataFrame:
+    """Trechos da malha formatada (Malha_Formatada.csv).
+
+    Cada serviço roda nos dias de FREQUENCIA; o horário de cada parada é o
+    dia de início, mais o deslocamento de DIA_PARTIDA, mais HORARIO. Paradas
+    sem horário válido são puladas. ``referencia`` são as rotas da
+    Guanabara, usadas para dar UF às localidades (ver ``_chaves_da_malha``).
+    """
+    df = malha.dropna(subset=CHAVES_SERVICO + ["LOCALIDADE"]).reset_index(drop=True)
+    minuto = _minutos(df["HORARIO"])
+
+    # Abre cada serviço nos dias da frequência
+    dias = df["FREQUENCIA"].astype(str).str.split(",").explode().str.strip()
+    inicio = dias.map(DIA_DESDE_QUARTA)
+    linha = dias.index.to_numpy()[inicio.notna().to_numpy()]
+    inicio = inicio.dropna().to_numpy(dtype=np.int64)
+    ok = minuto[linha] >= 0
+    linha, inicio = linha[ok], inicio[ok]
+
+    servico, rotulo_servico = pd.factorize((
+        df["PREFIXO SIGMA"].astype(str) + "/" + df["SERVICO"].astype(str)
+        + "/" + df["TIPO_VEICULO"].astype(str) + "/" + df["FREQUENCIA"].astype(str)
+    ).to_numpy(dtype=object))
+    # Uma viagem por serviço e dia de início: "<serviço> QUA"
+    rotulo_viagem = [f"{r} {ROTULO_DIA[i]}" for r in rotulo_servico for i in range(7)]
+    if "SEQUENCIA" in df.columns:
+        sequencia = pd.to_numeric(df["SEQUENCIA"], errors="coerce").fillna(0).to_numpy(dtype=np.int64)
+    else:
+        sequencia = np.zeros(len(df), dtype=np.int64)
+    horario = (inicio + deslocamento_dias(df["DIA_PARTIDA"])[linha]) * MINUTOS_DIA + minuto[linha]
+
+    paradas = pd.DataFrame({
+        "EMPRESA": _categoria(np.zeros(len(linha), dtype=np.int64), [empresa]),
+        "LINHA": _texto_como_categoria(df["NOME DA LINHA"].astype(object).to_numpy()[linha]),
+        "VIAGEM": _categoria(servico[linha] * 7 + inicio, rotulo_viagem),
+        "SEQUENCIA": sequencia[linha],
+        "PARADA": _texto_como_categoria(_chaves_da_malha(df, referencia)[linha]),
+        "SAIDA": horario,
+        "CHEGADA": horario,
+    })
+    paradas = paradas.sort_values(["VIAGEM", "SEQUENCIA", "SAIDA"], kind="stable", ignore_index=True)
+    return _pares_consecutivos(paradas)
+
+
+def trechos_guanabara(
+    rotas: pd.DataFrame,
+    partida: int = PARTIDA_PADRAO_GUA,
+    velocidade_kmh: float = VELOCIDADE_MEDIA_KMH,
+    parada_min: int = PARADA_MIN,
+    ida_e_volta: bool = True,
+    empresa: str = "GUANABARA",
+) -> pd.DataFrame:
+    """Trechos estimados das rotas da Guanabara (Rotas_Guanabara_Formatadas.xlsx).
+
+    Cada rota sai todos os dias às ``partida`` (minuto do dia) da primeira
+    cidade; o tempo de cada trecho é a distância em linha reta dividida
+    pela velocidade média, mais ``parada_min`` em cada cidade intermediária.
+    Com ``ida_e_volta``, as linhas descritas só no sentido IDA também rodam
+    no sentido contrário, com os mesmos horários.
+    """
+    df = rotas.dropna(subset=["CIDADES", "LAT", "LON", "SEQUENCIA"]).copy()
+    df["SENTIDO"] = df["SENTIDO"].astype(object)
+    df["SEQUENCIA"] = pd.to_numeric(df["SEQUENCIA"], errors="coerce")
+    if ida_e_volta:
+        linha = ["PREFIXO", "DESCRICAO DA LINHA"]
+        tem_volta = df["SENTIDO"].eq("VOLTA").groupby([df[c].astype(object) for c in linha]).transform("any")
+        volta = df[~tem_volta.to_numpy()].assign(SENTIDO="VOLTA")
+        volta["SEQUENCIA"] = -volta["SEQUENCIA"]
+        df = pd.concat([df, volta], ignore_index=True)
+    df = df.sort_values(CHAVES_ROTA_GUA + ["SEQUENCIA"], kind="stable", ignore_index=True)
+
+    rota = df.groupby(CHAVES_ROTA_GUA, sort=False, observed=True).ngroup().to_numpy()
+    lat = df["LAT"].to_numpy(dtype=float)
+    lon = df["LON"].to_numpy(dtype=float)
+    # Distância de cada parada até a seguinte (plano local em km)
+    km = _distancia_km(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    mesma_rota = rota[1:] == rota[:-1]
+    passo = np.zeros(len(df), dtype=np.int64)
+    passo[:-1] = np.where(mesma_rota, np.round(km / velocidade_kmh * 60), 0)
+
+    # Minutos desde a saída da primeira cidade: chegada e saída de cada parada
+    inicio_rota = np.flatnonzero(np.r_[True, ~mesma_rota])[rota]
+    percorrido = np.concatenate([[0], np.cumsum(passo)[:-1]])
+    posicao = np.arange(len(df)) - inicio_rota
+    chegada = percorrido - percorrido[inicio_rota] + parada_min * np.maximum(posicao - 1, 0)
+    saida = chegada + parada_min * (posicao > 0)
+
+    descricao, rotulo_descricao = pd.factorize(df["DESCRICAO DA LINHA"].astype(object).to_numpy())
+    rotulo, rotulo_rota = pd.factorize((
+        df["PREFIXO"].astype(object).astype(str) + " " + df["SENTIDO"].astype(str)
+    ).to_numpy(dtype=object))
+    parada, rotulo_parada = pd.factorize(_chaves_paradas(df["CIDADES"]))
+
+    # Uma viagem por dia da semana: "<prefixo> <sentido> QUA"
+    n = len(df)
+    dia = np.repeat(np.arange(7), n)
+    linhas = np.tile(np.arange(n), 7)
+    rotulo_viagem = [f"{r} {ROTULO_DIA[i]}" for r in rotulo_rota for i in range(7)]
+    paradas = pd.DataFrame({
+        "EMPRESA": _categoria(np.zeros(len(linhas), dtype=np.int64), [empresa]),
+        "LINHA": _categoria(descricao[linhas], rotulo_descricao),
+        "VIAGEM": _categoria(rotulo[linhas] * 7 + dia, rotulo_viagem),
+        "PARADA": _categoria(parada[linhas], rotulo_parada),
+        "SAIDA": dia * MINUTOS_DIA + partida + saida[linhas],
+        "CHEGADA": dia * MINUTOS_DIA + partida + chegada[linhas],
+        "_ROTA": rota[linhas],
+    })
+    # Agrupa as paradas de cada viagem mantendo a sequência da rota
+    paradas = paradas.sort_values(["_ROTA", "VIAGEM"], kind="stable", ignore_index=True)
+    return _pares_consecutivos(paradas)
+
+
+class GradeTrechos:
+    """Trechos das duas empresas em vetores ordenados pela partida.
+
+    ``paradas`` são as chaves das localidades (``chave_parada``) e
+    ``viagens`` a tabela EMPRESA/LINHA/VIAGEM; os vetores ``de``, ``para``
+    e ``viagem`` guardam posições nelas. Cada viagem aparece uma vez em cada
+    semana de ``SEMANAS_GRADE``, com um código próprio por semana.
+    """
+
+    def __init__(self, paradas, viagens: pd.DataFrame, de, para, partida, chegada, viagem, ordem):
+        self.paradas = pd.Index(paradas)
+        self.viagens = viagens.reset_index(drop=True)
+        ordenacao = np.lexsort((ordem, chegada, partida))
+        # int32 basta para posições e minutos de três semanas e ocupa metade
+        self.de = np.asarray(de, dtype=np.int32)[ordenacao]
+        self.para = np.asarray(para, dtype=np.int32)[ordenacao]
+        self.partida = np.asarray(partida, dtype=np.int32)[ordenacao]
+        self.chegada = np.asarray(chegada, dtype=np.int32)[ordenacao]
+        self.viagem = np.asarray(viagem, dtype=np.int32)[ordenacao]
+        self.ordem = np.asarray(ordem, dtype=np.int32)[ordenacao]
+        self._listas = None
+        self._arestas = None
+        self._invertida = None
+
+    @classmethod
+    def de_trechos(cls, trechos: pd.DataFrame, semanas=SEMANAS_GRADE) -> "GradeTrechos":
+        """Grade a partir das tabelas de ``trechos_da_malha`` e
+        ``trechos_guanabara`` (concatenadas)."""
+        localidades = pd.concat([trechos["DE"], trechos["PARA"]], ignore_index=True).astype(object)
+        codigos, paradas = pd.factorize(localidades, sort=True)
+        paradas = paradas.astype(str)
+        codigo_viagem, _ = pd.factorize(trechos["VIAGEM"])
+        viagens = trechos.drop_duplicates("VIAGEM")[["EMPRESA", "LINHA", "VIAGEM"]]
+
+        # Cada viagem começa na semana 0
+        partida = trechos["PARTIDA"].to_numpy(dtype=np.int64)
+        primeira = pd.Series(partida).groupby(codigo_viagem).transform("min").to_numpy()
+        deslocamento = primeira // MINUTOS_SEMANA * MINUTOS_SEMANA
+        partida = (partida - deslocamento).astype(np.int32)
+        chegada = (trechos["CHEGADA"].to_numpy(dtype=np.int64) - deslocamento).astype(np.int32)
+
+        n, n_viagens = len(trechos), len(viagens)
+        semana = np.repeat(np.asarray(semanas, dtype=np.int32), n)
+        copia = np.repeat(np.arange(len(semanas), dtype=np.int32), n)
+        return cls(
+            paradas,
+            viagens,
+            np.tile(codigos[:n].astype(np.int32), len(semanas)),
+            np.tile(codigos[n:].astype(np.int32), len(semanas)),
+            np.tile(partida, len(semanas)) + semana * MINUTOS_SEMANA,
+            np.tile(chegada, len(semanas)) + semana * MINUTOS_SEMANA,
+            np.tile(codigo_viagem.astype(np.int32), len(semanas)) + copia * n_viagens,
+            np.tile(trechos["ORDEM"].to_numpy(dtype=np.int32), len(semanas)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.partida)
+
+    def invertida(self) -> "GradeTrechos":
+        """A mesma grade com o tempo invertido (cada trecho vai de ``para``
+        a ``de``, partindo em -chegada): a chegada mais cedo nela é a partida
+        mais tarde na original."""
+        if self._invertida is None:
+            self._invertida = GradeTrechos(
+                self.paradas, self.viagens, self.para, self.de,
+                -self.chegada, -self.partida, self.viagem, -self.ordem,
+            )
+        return self._invertida
+
+    def _posicao(self, localidade) -> int:
+        """Posição da localidade; sem UF, vale se só uma parada tem o nome."""
+        chave = chave_parada(localidade)
+        posicao = self.paradas.get_indexer([chave])[0]
+        if posicao >= 0:
+            return posicao
+        candidatas = np.flatnonzero(self.paradas.map(sem_uf) == chave)
+        if len(candidatas) != 1:
+            raise KeyError(f"Localidade fora da grade ou ambígua: {localidade}")
+        return int(candidatas[0])
+
+    def chegadas(self, origem, partida: int, baldeacao: int = BALDEACAO_MINIMA_MIN, destino=None):
+        """Chegada mais cedo a cada parada saindo de ``origem`` a partir do
+        minuto ``partida`` (uma varredura do Connection Scan).
+
+        Devolve a chegada por parada (``INALCANCAVEL`` quando não há como
+        chegar) e, para reconstruir a jornada, o par (trecho de desembarque,
+        trecho de embarque) usado em cada parada. Com ``destino``, a
+        varredura para assim que nenhum trecho pode melhorar a chegada nele.
+        """
+        if self._listas is None:
+            self._listas = tuple(
+                v.tolist() for v in (self.de, self.para, self.partida, self.chegada, self.viagem)
+            )
+        de, para, saida, chegada_trecho, viagem = self._listas
+        n = len(self.paradas)
+        o = self._posicao(origem)
+        alvo = None if destino is None else self._posicao(destino)
+
+        chegada = [INALCANCAVEL] * n
+        pronto = [INALCANCAVEL] * n  # a partir de quando dá para embarcar em cada parada
+        usado = [None] * n
+        chegada[o] = pronto[o] = partida
+        embarque = {}  # viagem -> trecho em que a jornada embarcou nela
+        for c in range(int(np.searchsorted(self.partida, partida)), len(saida)):
+            if alvo is not None and saida[c] >= chegada[alvo]:
+                break
+            v = viagem[c]
+            if v not in embarque:
+                if pronto[de[c]] > saida[c]:
+                    continue
+                embarque[v] = c
+            p = para[c]
+            if chegada_trecho[c] < chegada[p]:
+                chegada[p] = chegada_trecho[c]
+                pronto[p] = chegada_trecho[c] + baldeacao
+                usado[p] = (c, embarque[v])
+        return np.array(chegada, dtype=np.int64), usado
+
+    def jornada(self, origem, destino, partida: int, baldeacao: int = BALDEACAO_MINIMA_MIN, via=None) -> pd.DataFrame:
+        """Pernas da jornada que chega mais cedo a ``destino`` saindo de
+        ``origem`` a partir do minuto ``partida``, uma linha por viagem
+        usada. Com ``via`` (ex.: o HUB), a jornada passa obrigatoriamente
+        por essa localidade, com a baldeação mínima antes de seguir.
+        Tabela vazia quando não há jornada.
+        """
+        if via is not None:
+            ida = self.jornada(origem, via, partida, baldeacao)
+            if ida.empty:
+                return ida
+            resto = self.jornada(via, destino, int(ida.attrs["chegada"]) + baldeacao, baldeacao)
+            if resto.empty:
+                return resto
+            tabela = pd.concat([ida, resto], ignore_index=True)
+            tabela.attrs = {"partida": ida.attrs["partida"], "chegada": resto.attrs["chegada"]}
+            return tabela
+
+        chegada, usado = self.chegadas(origem, partida, baldeacao, destino)
+        p = self._posicao(destino)
+        pernas = []
+        while usado[p] is not None:
+            desembarque, embarque = usado[p]
+            pernas.append((embarque, desembarque))
+            p = self.de[embarque]
+        if not pernas:
+            return pd.DataFrame(columns=COLUNAS_JORNADA)
+
+        embarque, desembarque = np.array(pernas[::-1]).T
+        viagem = self.viagens.iloc[self.viagem[embarque] % len(self.viagens)]
+        inicio = self.partida[embarque]
+        fim = self.chegada[desembarque]
+        tabela = pd.DataFrame({
+            "EMPRESA": viagem["EMPRESA"].to_numpy(dtype=object),
+            "LINHA": viagem["LINHA"].to_numpy(dtype=object),
+            "VIAGEM": viagem["VIAGEM"].to_numpy(dtype=object),
+            "DE": self.paradas[self.de[embarque]],
+            "PARA": self.paradas[self.para[desembarque]],
+            "PARTIDA": rotulo_minuto(inicio),
+            "CHEGADA": rotulo_minuto(fim),
+            "DURACAO_MIN": fim - inicio,
+        }, columns=COLUNAS_JORNADA)
+        tabela.attrs = {"partida": int(inicio[0]), "chegada": int(fim[-1])}
+        return tabela
+
+    def _alcancaveis(self, origem: int) -> np.ndarray:
+        """Paradas ligadas a ``origem`` por alguma sequência de trechos, sem
+        olhar os horários (as únicas que uma varredura pode alcançar)."""
+        n = len(self.paradas)
+        if self._arestas is None:
+            # Pares distintos (de, para), bloco a bloco para não copiar a grade inteira
+            pares = np.zeros(0, dtype=np.int64)
+            for a in range(0, len(self), TAMANHO_BLOCO):
+                bloco = slice(a, a + TAMANHO_BLOCO)
+                pares = pd.unique(np.concatenate([pares, self.de[bloco].astype(np.int64) * n + self.para[bloco]]))
+            self._arestas = (pares // n, pares % n)
+        de, para = self._arestas
+        alcancavel = np.zeros(n, dtype=bool)
+        alcancavel[origem] = True
+        fronteira = alcancavel.copy()
+        while fronteira.any():
+            novas = np.zeros(n, dtype=bool)
+            novas[para[fronteira[de]]] = True
+            fronteira = novas & ~alcancavel
+            alcancavel |= fronteira
+        return alcancavel
+
+    def _varredura(
+        self, origem: int, inicios: np.ndarray, baldeacao: int, duracao_maxima: int, alvos: np.ndarray = None
+    ) -> np.ndarray:
+        """Minuto a partir do qual dá para embarcar em cada parada, para
+        várias consultas de uma vez (todas saindo de ``origem``, uma por
+        minuto de ``inicios``). Matriz (paradas, consultas).
+
+        É a varredura de ``chegadas`` com uma lista por parada no lugar de um
+        número. Com as consultas em ordem de início, quem sai antes chega a
+        qualquer parada no máximo junto com quem sai depois: as listas ficam
+        ordenadas e as consultas dentro de uma viagem são sempre as primeiras.
+        Basta guardar quantas são e atualizar as listas com ``bisect``.
+
+        A varredura para quando todas as consultas chegaram a todas as
+        paradas de ``alvos`` (máscara; None = todas as alcançáveis) e os
+        trechos seguintes já partem depois da última dessas chegadas: nenhum
+        deles melhora os alvos. Só as linhas dos alvos são definitivas.
+        """
+        n, k = len(self.paradas), len(inicios)
+        ordem = np.argsort(inicios, kind="stable")
+        pronto = [None] * n  # lista (não decrescente) por parada; None se nenhuma consulta chega
+        pronto[origem] = inicios[ordem].tolist()
+        embarcadas = [0] * (int(self.viagem.max()) + 1)  # por viagem: quantas consultas (as primeiras) estão nela
+
+        alcancaveis = self._alcancaveis(origem)
+        alvo = (alcancaveis if alvos is None else alcancaveis & alvos).tolist()
+        faltam = sum(alvo) - alvo[origem]  # alvos em que alguma consulta ainda não chegou
+        maior = int(inicios.max())  # última chegada já registrada num alvo
+
+        ini = int(np.searchsorted(self.partida, inicios.min()))
+        fim = int(np.searchsorted(self.partida, inicios.max() + duracao_maxima, side="right"))
+        # Convertidos para listas aos poucos: a memória não cresce com a janela
+        vetores = (self.de, self.para, self.partida, self.chegada, self.viagem)
+        blocos = (
+            zip(*(v[a:min(a + TAMANHO_BLOCO, fim)].tolist() for v in vetores))
+            for a in range(ini, fim, TAMANHO_BLOCO)
+        )
+        for d, p, dep, arr, v in chain.from_iterable(blocos):
+            if not faltam and dep >= maior:
+                break
+            nela = embarcadas[v]
+            lista = pronto[d]
+            # Comparações com a próxima consulta evitam o bisect quando nada muda
+            if lista is not None and nela < k and lista[nela] <= dep:
+                embarcadas[v] = nela = bisect_right(lista, dep, nela)
+            if not nela:
+                continue
+            valor = arr + baldeacao
+            lista = pronto[p]
+            if lista is None:
+                pronto[p] = [valor] * nela + [INALCANCAVEL] * (k - nela)
+                completou = nela == k
+            else:
+                if lista[nela - 1] <= valor:
+                    continue
+                q = bisect_right(lista, valor, 0, nela)
+                completou = nela == k and lista[-1] == INALCANCAVEL
+                lista[q:nela] = [valor] * (nela - q)
+            if alvo[p]:
+                maior = max(maior, valor)
+                faltam -= completou
+
+        matriz = np.full((n, k), INALCANCAVEL, dtype=np.int64)
+        for parada, lista in enumerate(pronto):
+            if lista is not None:
+                matriz[parada, ordem] = lista
+        return matriz
+
+    def jornadas_via_hub(
+        self,
+        hub=HUB_PADRAO,
+        baldeacao: int = BALDEACAO_MINIMA_MIN,
+        duracao_maxima: int = DURACAO_MAXIMA_MIN,
+        origens=None,
+        destinos=None,
+        janela=None,
+    ) -> pd.DataFrame:
+        """Jornada mais rápida via ``hub`` para os pares origem–destino.
+
+        Há uma consulta para cada horário de partida do HUB na semana (ou só
+        os de ``janela``, um par (início, fim) em minutos desde quarta 00:00):
+        quem chega ao HUB até ``baldeacao`` minutos antes pode seguir nela.
+        Quem passa pelo HUB sem trocar de ônibus também conta a baldeação.
+        ``origens`` e ``destinos`` restringem os pares (None = todas as
+        localidades) e encurtam as varreduras. Uma linha por par com
+        jornada: horário de partida, saída do HUB, chegada e duração em
+        minutos.
+        """
+        h = self._posicao(hub)
+        da_semana = (self.de == h) & (self.partida >= 0) & (self.partida < MINUTOS_SEMANA)
+        if janela is not None:
+            da_semana &= (self.partida >= janela[0]) & (self.partida <= janela[1])
+        saidas = np.unique(self.partida[da_semana])
+        colunas = ["ORIGEM", "DESTINO", "PARTIDA", "SAIDA_HUB", "CHEGADA", "DURACAO_MIN"]
+        if len(saidas) == 0:
+            return pd.DataFrame(columns=colunas)
+
+        def mascara(localidades) -> np.ndarray:
+            if localidades is None:
+                return np.ones(len(self.paradas), dtype=bool)
+            selecionadas = np.zeros(len(self.paradas), dtype=bool)
+            selecionadas[[self._posicao(local) for local in localidades]] = True
+            return selecionadas
+
+        # Chegada a cada destino saindo do HUB em cada horário
+        alvos = mascara(destinos)
+        pronto = self._varredura(h, saidas, baldeacao, duracao_maxima, alvos)
+        alcanca = (pronto < INALCANCAVEL) & alvos[:, None]
+        chegada = pronto - baldeacao
+        # Partida mais tarde de cada origem para estar no HUB a tempo
+        alvos = mascara(origens)
+        pronto_inv = self.invertida()._varredura(h, -(saidas - baldeacao), baldeacao, duracao_maxima, alvos)
+        sai = (pronto_inv < INALCANCAVEL) & alvos[:, None]
+        partida = baldeacao - pronto_inv
+
+        alcanca[h] = sai[h] = False
+        destinos = np.flatnonzero(alcanca.any(axis=1))
+        origens = np.flatnonzero(sai.any(axis=1))
+        # Consultas sem jornada ficam com duração de pelo menos INALCANCAVEL
+        chegada_j = np.where(alcanca, chegada, INALCANCAVEL)[destinos].T.copy()
+        partida_o = np.where(sai, partida, -INALCANCAVEL)[origens]
+
+        # Partida e chegada crescem com a saída do HUB. Entre as consultas com
+        # a mesma partida de uma origem, a primeira chega antes a qualquer
+        # destino: só essas são comparadas. Em empate fica a saída mais tarde
+        # do HUB (é a que a jornada usa): a última do grupo com a mesma
+        # chegada.
+        k, colunas_d = len(saidas), np.arange(len(destinos))
+        ultima = np.where(
+            np.r_[chegada_j[1:] != chegada_j[:-1], np.ones((1, len(destinos)), dtype=bool)],
+            np.arange(k)[:, None],
+            k,
+        )
+        ultima_mesma_chegada = np.minimum.accumulate(ultima[::-1], axis=0)[::-1]
+        melhor = np.empty((len(origens), len(destinos)), dtype=np.int64)
+        qual = np.empty(melhor.shape, dtype=np.int64)
+        for i, p in enumerate(partida_o):
+            primeira = np.flatnonzero(np.r_[True, p[1:] != p[:-1]])
+            ultima_do_grupo = np.r_[primeira[1:], k] - 1
+            duracao = chegada_j[primeira] - p[primeira][:, None]
+            g = len(primeira) - 1 - np.argmin(duracao[::-1], axis=0)
+            melhor[i] = duracao[g, colunas_d]
+            qual[i] = np.minimum(ultima_mesma_chegada[primeira[g], colunas_d], ultima_do_grupo[g])
+
+        # Origens e destinos crescentes: a tabela já sai ordenada pelos nomes.
+        # Com um par por linha, as colunas de texto ficam como categoria
+        o, d = np.nonzero((melhor < INALCANCAVEL) & (origens[:, None] != destinos[None, :]))
+        j = qual[o, d]
+        origem, destino = origens[o], destinos[d]
+        localidades = pd.Index(self.paradas, dtype=object)
+        return pd.DataFrame({
+            "ORIGEM": pd.Categorical.from_codes(origem, localidades),
+            "DESTINO": pd.Categorical.from_codes(destino, localidades),
+            "PARTIDA": _rotulos_como_categoria(partida[origem, j]),
+            "SAIDA_HUB": _rotulos_como_categoria(saidas[j]),
+            "CHEGADA": _rotulos_como_categoria(chegada[destino, j]),
+            "DURACAO_MIN": melhor[o, d],
+        }, columns=colunas)
@@ -0,0 +1,363 @@
+"""Leitura de planilhas com cache colunar em Parquet.
+
+O openpyxl é a etapa mais lenta de todos os scripts. Cada aba lida é salva
+em Parquet na pasta ``.cache_planilhas``, identificada pelo hash do arquivo
+de origem; a planilha só volta a ser lida quando o arquivo muda.
+"""
+import ast
+import hashlib
+import json
+import os
+import zipfile
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Set
+
+import pandas as pd
+
+PASTA_CACHE = Path(".cache_planilhas")
+TAMANHO_BLOCO = 1 << 20  # 1 MB por leitura ao calcular o hash
+EXTENSOES_XLSX = frozenset([".xlsx", ".xlsm"])
+PARTES_VOLATEIS = frozenset(["docProps/core.xml"])  # datas de criação e modificação
+
+
+def hash_arquivo(caminho) -> str:
+    """Calcula o SHA-256 do conteúdo do arquivo.
+
+    Num .xlsx o hash é o das partes descompactadas, menos
+    ``PARTES_VOLATEIS``: o ``to_excel`` grava nelas a data de criação, e
+    a mesma tabela salva duas vezes daria dois hashes diferentes."""
+    h = hashlib.sha256()
+    if Path(caminho).suffix.lower() in EXTENSOES_XLSX and zipfile.is_zipfile(caminho):
+        with zipfile.ZipFile(caminho) as pacote:
+            for nome in sorted(pacote.namelist()):
+                if nome in PARTES_VOLATEIS:
+                    continue
+                h.update(nome.encode("utf-8") + b"\0")
+                with pacote.open(nome) as f:
+                    for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b""):
+                        h.update(bloco)
+        return h.hexdigest()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def modulos_locais(script: str) -> Set[str]:
+    """Arquivos .py da pasta do ``script`` importados por ele, direta ou
+    indiretamente (imports de outros módulos locais também contam)."""
+    pasta = Path(script).parent
+    encontrados: Set[str] = set()
+    pendentes = [Path(script)]
+    while pendentes:
+        arvore = ast.parse(pendentes.pop().read_text(encoding="utf-8"))
+        for no in ast.walk(arvore):
+            if isinstance(no, ast.Import):
+                nomes = [alias.name for alias in no.names]
+            elif isinstance(no, ast.ImportFrom) and no.module and not no.level:
+                nomes = [no.module]
+            else:
+                continue
+            for nome in nomes:
+                arquivo = pasta / (nome.split(".")[0] + ".py")
+                if arquivo.exists() and str(arquivo) not in encontrados and arquivo != Path(script):
+                    encontrados.add(str(arquivo))
+                    pendentes.append(arquivo)
+    return encontrados
+
+
+def hash_codigo(script) -> str:
+    """Hash do ``script`` junto com o dos módulos locais que ele importa:
+    muda quando qualquer um deles muda."""
+    h = hashlib.sha256()
+    for arquivo in [str(script), *sorted(modulos_locais(script))]:
+        h.update(hash_arquivo(arquivo).encode("ascii"))
+    return h.hexdigest()
+
+
+def _chave(texto: str) -> str:
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()[:16]
+
+
+def _gravar_atomico(caminho: Path, conteudo: str) -> None:
+    tmp = caminho.with_name(f"{caminho.name}.{os.getpid()}.tmp")
+    tmp.write_text(conteudo, encoding="utf-8")
+    os.replace(tmp, caminho)
+
+
+def hash_com_manifesto(caminho, pasta_cache: Path = PASTA_CACHE) -> str:
+    """Retorna o hash do arquivo, reaproveitando o manifesto quando o mtime
+    e o tamanho não mudaram (evita reler o arquivo inteiro a cada chamada)."""
+    caminho = Path(caminho)
+    pasta_cache.mkdir(parents=True, exist_ok=True)
+    info = caminho.stat()
+    manifesto = pasta_cache / f"{_chave(str(caminho.resolve()))}.json"
+
+    anterior = {}
+    if manifesto.exists():
+        try:
+            anterior = json.loads(manifesto.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            anterior = {}
+
+    if (
+        anterior.get("mtime") == info.st_mtime_ns
+        and anterior.get("tamanho") == info.st_size
+    ):
+        return anterior["hash"]
+
+    novo_hash = hash_arquivo(caminho)
+    if anterior.get("hash") and anterior["hash"] != novo_hash:
+        # Arquivo de origem mudou: descarta as abas do conteúdo antigo
+        for antigo in pasta_cache.glob(f"{anterior['hash']}_*"):
+            antigo.unlink(missing_ok=True)
+
+    _gravar_atomico(manifesto, json.dumps({
+        "arquivo": str(caminho),
+        "mtime": info.st_mtime_ns,
+        "tamanho": info.st_size,
+        "hash": novo_hash,
+    }))
+    return novo_hash
+
+
+def _salvar_aba(df: pd.DataFrame, base: Path) -> None:
+    """Salva a aba em Parquet; colunas com tipos mistos (que o Arrow não
+    aceita) caem para pickle, que preserva qualquer objeto Python."""
+    tmp = base.with_name(f"{base.name}.{os.getpid()}.tmp")
+    try:
+        df.to_parquet(tmp)
+        os.replace(tmp, base.with_suffix(".parquet"))
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        df.to_pickle(tmp)
+        os.replace(tmp, base.with_suffix(".pkl"))
+
+
+def _ler_aba(base: Path) -> Optional[pd.DataFrame]:
+    parquet = base.with_suffix(".parquet")
+    if parquet.exists():
+        return pd.read_parquet(parquet)
+    pkl = base.with_suffix(".pkl")
+    if pkl.exists():
+        return pd.read_pickle(pkl)
+    return None
+
+
+def ler_excel(
+    caminho,
+    sheet_name=0,
+    pasta_cache: Path = PASTA_CACHE,
+    colunas=None,
+    ignorar_ausentes: bool = False,
+    **kwargs,
+):
+    """Substituto de ``pd.read_excel`` com cache persistente por aba.
+
+    Aceita os mesmos argumentos de ``pd.read_excel``; os argumentos extras
+    fazem parte da chave do cache. Com ``sheet_name=None`` retorna um
+    dicionário com todas as abas, como o pandas.
+
+    Com ``colunas``, a aba é lida em fluxo (ver ``ler_xlsx``) e só essas
+    colunas são materializadas, o que evita carregar a planilha inteira na
+    primeira leitura. Nesse modo os argumentos extras do pandas não valem.
+    """
+    pasta_cache = Path(pasta_cache)
+    hash_origem = hash_com_manifesto(caminho, pasta_cache)
+    if colunas is not None:
+        if kwargs or sheet_name is None:
+            raise TypeError("'colunas' só vale para uma aba e sem argumentos do pd.read_excel")
+        kwargs = {"colunas": list(colunas), "ignorar_ausentes": ignorar_ausentes}
+    opcoes = _chave(repr(sorted(kwargs.items())))
+
+    def base_da_aba(aba) -> Path:
+        return pasta_cache / f"{hash_origem}_{_chave(repr(aba))}_{opcoes}"
+
+    if sheet_name is None:
+        indice = pasta_cache / f"{hash_origem}_abas.json"
+        if indice.exists():
+            abas = json.loads(indice.read_text(encoding="utf-8"))
+            dfs = {aba: _ler_aba(base_da_aba(aba)) for aba in abas}
+            if all(df is not None for df in dfs.values()):
+                return dfs
+        dfs = pd.read_excel(caminho, sheet_name=None, **kwargs)
+        for aba, df in dfs.items():
+            _salvar_aba(df, base_da_aba(aba))
+        _gravar_atomico(indice, json.dumps(list(dfs)))
+        return dfs
+
+    base = base_da_aba(sheet_name)
+    df = _ler_aba(base)
+    if df is None:
+        if colunas is not None:
+            df = ler_xlsx(caminho, colunas, sheet_name, ignorar_ausentes)
+        else:
+            df = pd.read_excel(caminho, sheet_name=sheet_name, **kwargs)
+        _salvar_aba(df, base)
+    return df
+
+
+def cache_derivado(
+    caminho,
+    etiqueta: str,
+    opcoes: dict,
+    gerar: Callable[[], str],
+    pasta_cache: Path = PASTA_CACHE,
+) -> str:
+    """Texto derivado de ``caminho`` (ex.: uma figura serializada) guardado
+    na pasta de cache junto com as abas.
+
+    A chave é o hash do arquivo de origem mais ``etiqueta`` e ``opcoes``
+    (que precisa ser serializável em JSON); ``gerar`` só é chamada quando
+    não há cópia salva. Como as abas, é descartado quando a origem muda.
+    """
+    pasta_cache = Path(pasta_cache)
+    hash_origem = hash_com_manifesto(caminho, pasta_cache)
+    chave = _chave(json.dumps(opcoes, sort_keys=True, default=str))
+    arquivo = pasta_cache / f"{hash_origem}_{etiqueta}_{chave}.json"
+    if arquivo.exists():
+        return arquivo.read_text(encoding="utf-8")
+    texto = gerar()
+    _gravar_atomico(arquivo, texto)
+    return texto
+
+
+TAMANHO_BLOCO_CSV = 100_000  # linhas por bloco na leitura em fluxo
+
+
+def ler_csv_em_blocos(
+    caminho,
+    colunas=None,
+    tamanho_bloco: int = TAMANHO_BLOCO_CSV,
+    sep: str = ";",
+    encoding: str = "utf-8-sig",
+    **kwargs,
+) -> Iterator[pd.DataFrame]:
+    """Lê um CSV grande em blocos de ``tamanho_bloco`` linhas.
+
+    Só as ``colunas`` pedidas são lidas, todas como texto, a menos que
+    ``dtype`` seja passado. O consumidor agrega bloco a bloco, então a
+    memória não cresce com o tamanho do arquivo.
+    """
+    kwargs.setdefault("dtype", str)
+    yield from pd.read_csv(
+        caminho, sep=sep, encoding=encoding, usecols=colunas, chunksize=tamanho_bloco, **kwargs
+    )
+
+
+TAMANHO_BLOCO_XLSX = 50_000  # linhas por bloco na leitura em fluxo do xlsx
+ERROS_EXCEL = frozenset(["#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#N/A"])
+
+
+def _valor_celula(valor):
+    """Mesma conversão do leitor openpyxl do pandas: célula vazia vira "",
+    erro de fórmula (#N/A, #NAME?...) vira NaN e número inteiro guardado
+    como float vira int."""
+    if valor is None:
+        return ""
+    if isinstance(valor, str) and valor in ERROS_EXCEL:
+        return float("nan")
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def _linhas_xlsx(caminho, colunas, sheet_name, ignorar_ausentes):
+    """Cabeçalho e, em seguida, as linhas da aba só com as colunas pedidas.
+
+    Usa o modo somente leitura do openpyxl, que percorre o XML da aba sem
+    montar a planilha na memória. Linhas em branco são puladas, como no
+    ``pd.read_excel``."""
+    from openpyxl import load_workbook
+
+    livro = load_workbook(caminho, read_only=True, data_only=True, keep_links=False)
+    try:
+        aba = livro.worksheets[sheet_name] if isinstance(sheet_name, int) else livro[sheet_name]
+        aba.reset_dimensions()  # dimensões gravadas por alguns exportadores vêm erradas
+        linhas = (
+            linha for linha in aba.iter_rows(values_only=True)
+            if any(v is not None and v != "" for v in linha)
+        )
+        cabecalho = [_valor_celula(v) for v in next(linhas, ())]
+        while cabecalho and cabecalho[-1] == "":
+            cabecalho.pop()
+
+        if colunas is None:
+            posicoes = list(range(len(cabecalho)))
+        else:
+            ausentes = [c for c in colunas if c not in cabecalho]
+            if ausentes and not ignorar_ausentes:
+                raise ValueError(f"Colunas ausentes em {caminho}: {ausentes}")
+            # Mantém a ordem da planilha, como o usecols do pandas
+            pedidas = set(colunas)
+            posicoes = [i for i, c in enumerate(cabecalho) if c in pedidas]
+
+        yield [cabecalho[i] for i in posicoes]
+        for linha in linhas:
+            yield [_valor_celula(linha[i]) if i < len(linha) else "" for i in posicoes]
+    finally:
+        livro.close()
+
+
+def _montar_quadro(cabecalho: list, linhas: List[list]) -> pd.DataFrame:
+    # O TextParser é o mesmo que o pd.read_excel usa para inferir os tipos
+    from pandas.io.parsers import TextParser
+
+    return TextParser([cabecalho, *linhas], header=0).read()
+
+
+def ler_xlsx_em_blocos(
+    caminho,
+    colunas=None,
+    sheet_name=0,
+    tamanho_bloco: int = TAMANHO_BLOCO_XLSX,
+    ignorar_ausentes: bool = False,
+) -> Iterator[pd.DataFrame]:
+    """Lê uma aba de xlsx em blocos de ``tamanho_bloco`` linhas.
+
+    Só as ``colunas`` pedidas são materializadas (todas, se None); colunas
+    que não existem geram ``ValueError``, a menos que ``ignorar_ausentes``.
+    Os tipos são inferidos bloco a bloco, então uma coluna vazia num bloco
+    pode vir com tipo diferente no seguinte. Uma aba sem linhas gera um
+    único bloco vazio, com as colunas.
+    """
+    linhas = _linhas_xlsx(caminho, colunas, sheet_name, ignorar_ausentes)
+    cabecalho = next(linhas)
+    bloco, gerados = [], 0
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) >= tamanho_bloco:
+            yield _montar_quadro(cabecalho, bloco)
+            bloco, gerados = [], gerados + 1
+    if bloco or not gerados:
+        yield _montar_quadro(cabecalho, bloco)
+
+
+def _juntar_blocos(blocos: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatena os blocos de ``ler_xlsx_em_blocos`` com os tipos que a aba
+    inteira teria: as colunas em que os blocos discordam (vazia num bloco e
+    com datas no outro, por exemplo) passam de novo pela inferência."""
+    quadro = pd.concat(blocos, ignore_index=True)
+    divergentes = [c for c in quadro.columns if len({b[c].dtype for b in blocos}) > 1]
+    if divergentes:
+        refeitas = _montar_quadro(divergentes, quadro[divergentes].astype(object).to_numpy().tolist())
+        for coluna in divergentes:
+            quadro[coluna] = refeitas[coluna]
+    return quadro
+
+
+def ler_xlsx(
+    caminho,
+    colunas=None,
+    sheet_name=0,
+    ignorar_ausentes: bool = False,
+    tamanho_bloco: int = TAMANHO_BLOCO_XLSX,
+) -> pd.DataFrame:
+    """Aba inteira lida em fluxo, só com ``colunas``.
+
+    O resultado é o mesmo de ``pd.read_excel(..., usecols=colunas)``, mas as
+    demais colunas nunca chegam a ser carregadas, e as linhas em texto só
+    existem um bloco de ``tamanho_bloco`` por vez: o quadro é a concatenação
+    dos blocos já tipados."""
+    blocos = list(ler_xlsx_em_blocos(caminho, colunas, sheet_name, tamanho_bloco, ignorar_ausentes))
+    return _juntar_blocos(blocos)
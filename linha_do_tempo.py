@@ -0,0 +1,826 @@
+"""Etapas vetorizadas da timeline operacional (streamlit_app.py)."""
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from esquema import compactar
+from leitura import PASTA_CACHE, cache_derivado, hash_codigo, ler_excel
+
+# === CONSTANTES ===
+CORES = {"GUANABARA": "royalblue", "ITAPEMIRIM": "gold", "HUB": "firebrick"}
+ORDEM_DIAS = ["QUA", "QUI", "SEX", "SÁB", "DOM", "SEG", "TER"]
+LIMITE_SEMANA = 168  # 7 dias * 24 horas
+OPERACAO_HUB = (7, 22)  # horas do dia em que o HUB - FSA opera
+
+# Colunas da planilha usadas pela timeline; só uma das colunas de dia
+# precisa existir (ver ``coluna_dia``)
+COLUNAS_PLANILHA = [
+    "VIAGEM", "N° LEGENDA", "DIA SEMANA", "DIA SEMANA PARTIDA", "HORA VIAGEM",
+    "EMPRESA", "SENTIDO", "ORIGEM", "DESTINO", "HORA PARTIDA", "HORA CHEGADA",
+]
+
+LEGENDA_OBS = {
+    1: "1 - INTEGRADO - FREQ. MÍNIMA",
+    2: "2 - INTEGRADO + HUB GUANABARA",
+    3: "3 - INTERCONEXÕES + HUB GUANABARA",
+    4: "4 - FREQ. MÍNIMA"
+}
+
+
+def coluna_dia(df: pd.DataFrame) -> str:
+    """Define qual coluna de dia da semana usar."""
+    return "DIA SEMANA" if "DIA SEMANA" in df.columns else "DIA SEMANA PARTIDA"
+
+
+def preparar_dados(df: pd.DataFrame):
+    """Prepara as colunas utilizadas no gráfico a partir da planilha."""
+    df = df.copy()
+    df["HORA PARTIDA"] = pd.to_datetime(df["HORA PARTIDA"])
+    df["HORA CHEGADA"] = pd.to_datetime(df["HORA CHEGADA"])
+    df["DURACAO_H"] = (
+        df["HORA CHEGADA"] - df["HORA PARTIDA"]
+    ).dt.total_seconds() / 3600
+    df = df[df["DURACAO_H"] > 0].copy()
+
+    # Calcula a diferença, em horas, entre a primeira quarta-feira e cada
+    # horário de partida para manter a continuidade mesmo após a troca de semana
+    primeira_data = df["HORA PARTIDA"].min().normalize()
+    dias_ate_quarta = (primeira_data.weekday() - 2) % 7
+    quarta_inicial = primeira_data - pd.Timedelta(days=dias_ate_quarta)
+    df["HORA_ABSOLUTA"] = (
+        (df["HORA PARTIDA"] - quarta_inicial).dt.total_seconds() / 3600
+    )
+    df["COR"] = df["EMPRESA"].map(CORES).fillna("gray")
+
+    dia_col = coluna_dia(df)
+    viagem_dia = df.groupby("VIAGEM")[dia_col].first().str.upper()
+    viagens_ordenadas = sorted(
+        viagem_dia.index, key=lambda v: ORDEM_DIAS.index(viagem_dia.loc[v])
+    )
+    df["VIAGEM"] = pd.Categorical(
+        df["VIAGEM"], categories=viagens_ordenadas, ordered=True
+    )
+    df.sort_values("VIAGEM", inplace=True)
+    return df, viagens_ordenadas
+
+
+def quebrar_blocos(
+    df: pd.DataFrame,
+    horizonte: float = LIMITE_SEMANA,
+    col_inicio: str = "HORA_ABSOLUTA",
+    col_duracao: str = "DURACAO_H",
+) -> pd.DataFrame:
+    """Divide os blocos que ultrapassam o horizonte do gráfico.
+
+    Cada bloco vira uma parte por janela de ``horizonte`` horas que ele
+    ocupa, com o início reposicionado dentro da janela. A coluna
+    ``BLOCO_QUEBRADO`` recebe:
+
+    - "completo": bloco inteiro dentro de uma janela;
+    - "final": primeira parte, que vai até o fim da janela;
+    - "inicio": última parte, que recomeça do zero;
+    - "meio": partes intermediárias que ocupam a janela inteira
+      (só aparecem em blocos mais longos que o horizonte).
+
+    Tudo é feito sobre os arrays das colunas, sem percorrer as linhas.
+    """
+    ini = df[col_inicio].to_numpy(dtype=float)
+    dur = df[col_duracao].to_numpy(dtype=float)
+    fim = ini + dur
+
+    # Janela onde o bloco começa e última janela que ele alcança
+    # (um fim exatamente na fronteira não gera parte vazia)
+    janela_ini = np.floor(ini / horizonte)
+    janela_fim = np.maximum(np.ceil(fim / horizonte) - 1, janela_ini)
+    partes = (janela_fim - janela_ini + 1).astype(np.int64)
+
+    pos = np.repeat(np.arange(len(df)), partes)
+    ordem = np.arange(len(pos)) - np.repeat(np.cumsum(partes) - partes, partes)
+    base = (janela_ini[pos] + ordem) * horizonte
+
+    inicio = np.maximum(ini[pos], base)
+    termino = np.minimum(fim[pos], base + horizonte)
+
+    total = partes[pos]
+    resultado = df.iloc[pos].copy()
+    resultado[col_inicio] = inicio - base
+    # Blocos inteiros mantêm a duração original, sem erro de arredondamento
+    resultado[col_duracao] = np.where(total == 1, dur[pos], termino - inicio)
+
+    tipo = np.full(len(pos), "completo", dtype=object)
+    tipo[(total > 1) & (ordem > 0) & (ordem < total - 1)] = "meio"
+    tipo[(total > 1) & (ordem == 0)] = "final"
+    tipo[(total > 1) & (ordem == total - 1)] = "inicio"
+    resultado["BLOCO_QUEBRADO"] = tipo
+    return resultado
+
+
+# === TEXTOS DOS BLOCOS ===
+LIMIAR_TEXTO = 9  # horas
+
+# Regras avaliadas em ordem; vale a primeira cujas condições forem todas
+# verdadeiras. "curto" compara a duração com o limiar; as demais chaves de
+# condição comparam o valor normalizado da coluna. "esquerda"/"direita"
+# indicam a coluna exibida em cada ponta do bloco (None = sem texto).
+REGRAS_TEXTO = [
+    {"curto": True, "SENTIDO": "IDA", "esquerda": None, "direita": "DESTINO"},
+    {"curto": True, "SENTIDO": "VOLTA", "esquerda": "ORIGEM", "direita": None},
+    {"curto": True, "esquerda": None, "direita": None},
+    {"curto": False, "BLOCO_QUEBRADO": "inicio", "esquerda": None, "direita": "DESTINO"},
+    {"curto": False, "BLOCO_QUEBRADO": "final", "esquerda": "ORIGEM", "direita": None},
+    {"curto": False, "BLOCO_QUEBRADO": "meio", "esquerda": None, "direita": None},
+    {"curto": False, "esquerda": "ORIGEM", "direita": "DESTINO"},
+]
+
+_PADRAO_COLUNA = {"BLOCO_QUEBRADO": "completo"}
+
+
+def _coluna_normalizada(df: pd.DataFrame, coluna: str) -> np.ndarray:
+    padrao = _PADRAO_COLUNA.get(coluna, "")
+    if coluna not in df.columns:
+        return np.full(len(df), padrao, dtype=object)
+    valores = df[coluna].astype(object).where(df[coluna].notna(), padrao)
+    return valores.astype(str).str.upper().str.strip().to_numpy(dtype=object)
+
+
+def calcular_textos(
+    df: pd.DataFrame,
+    limiar: float = LIMIAR_TEXTO,
+    regras=REGRAS_TEXTO,
+    col_duracao: str = "DURACAO_H",
+):
+    """Calcula os textos da esquerda e da direita de cada bloco.
+
+    As regras são aplicadas com máscaras sobre as colunas inteiras; o
+    retorno são dois arrays de texto alinhados com as linhas de ``df``.
+    """
+    curto = df[col_duracao].to_numpy(dtype=float) < limiar
+    colunas = {}
+    condicoes = []
+    for regra in regras:
+        mascara = curto if regra["curto"] else ~curto
+        for chave, valor in regra.items():
+            if chave in ("curto", "esquerda", "direita"):
+                continue
+            if chave not in colunas:
+                colunas[chave] = _coluna_normalizada(df, chave)
+            mascara = mascara & (colunas[chave] == valor.upper())
+        condicoes.append(mascara)
+
+    vazio = np.full(len(df), "", dtype=object)
+    valores = {}
+
+    def textos(lado: str) -> np.ndarray:
+        escolhas = []
+        for regra in regras:
+            campo = regra[lado]
+            if campo is None or campo not in df.columns:
+                escolhas.append(vazio)
+                continue
+            if campo not in valores:
+                valores[campo] = df[campo].astype(object).fillna("").astype(str).to_numpy(dtype=object)
+            escolhas.append(valores[campo])
+        return np.select(condicoes, escolhas, default="")
+
+    return textos("esquerda"), textos("direita")
+
+
+# === BLOCOS E FIGURA ===
+def quebrar_viagem(texto):
+    texto = re.sub(r"\s&\s", "<br>& ", texto, count=1)   # quebra no primeiro "&"
+    texto = texto.replace(' - "', '<br>"')               # quebra antes da hora
+    return texto
+
+
+def preparar_blocos(df: pd.DataFrame, horizonte: float = LIMITE_SEMANA):
+    """Quebra os blocos no horizonte e ordena as viagens por dia e hora.
+
+    Retorna o DataFrame dos blocos e a lista de viagens na ordem do eixo y.
+    """
+    # Divide os blocos que ultrapassam o final da terça-feira (168h): a parte
+    # que cruza terça é quebrada e o que começa depois é realocado na esquerda
+    df = quebrar_blocos(df, horizonte)
+
+    # Todos os blocos são tratados de maneira única
+    df["PARTE"] = 0
+
+    dia_col = coluna_dia(df)
+    df["VIAGEM"] = df["VIAGEM"].astype(str).apply(quebrar_viagem)
+
+    # Agrupar por viagem para obter o dia da semana e o horário de partida
+    # Converte a hora para valor decimal (ex: 13:30 → 13.5)
+    df["HORA_VIAGEM_DECIMAL"] = df["HORA VIAGEM"].apply(
+        lambda x: x.hour + x.minute / 60 if pd.notnull(x) else None
+    )
+
+    # Agrupa por VIAGEM e extrai o dia e hora decimal
+    viagem_info = df.groupby("VIAGEM").agg({
+        dia_col: lambda x: x.iloc[0].upper(),
+        "HORA_VIAGEM_DECIMAL": "first"
+    })
+
+    # Ordena por dia e hora (como texto: numa coluna categórica o apply
+    # devolveria categorias na ordem alfabética dos dias)
+    viagem_info["ORD_DIA"] = viagem_info[dia_col].astype(object).apply(lambda d: ORDEM_DIAS.index(d))
+    viagem_info = viagem_info.sort_values(["ORD_DIA", "HORA_VIAGEM_DECIMAL"])
+
+    # Gera a nova ordenação
+    viagens_ordenadas = viagem_info.index.tolist()
+
+    df["VIAGEM"] = pd.Categorical(df["VIAGEM"], categories=viagens_ordenadas, ordered=True)
+    return df, viagens_ordenadas
+
+
+def montar_figura(
+    df: pd.DataFrame, viagens_ordenadas, limiar: float = LIMIAR_TEXTO, horizonte: float = LIMITE_SEMANA
+) -> go.Figure:
+    """Monta a figura Plotly da timeline a partir dos blocos preparados
+    (quebrados no mesmo ``horizonte``, que define o eixo x)."""
+    fig = go.Figure()
+
+    # 0. Camada de fundo levemente opaca para bloquear a grade atrás dos blocos
+    for empresa, grupo in df.groupby("EMPRESA"):
+        fig.add_trace(
+            go.Bar(
+                x=grupo["DURACAO_H"],
+                y=grupo["VIAGEM"],
+                base=grupo["HORA_ABSOLUTA"],
+                orientation="h",
+                marker=dict(
+                    color="rgba(0,0,0,0.4)",  # tom escuro translúcido — pode ajustar
+                    line=dict(width=0)
+                ),
+                width=0.50,  # levemente maior que os blocos reais
+                showlegend=False,
+                hoverinfo="skip",
+                xaxis="x2"
+            )
+        )
+
+    # 1. Desenha os retângulos
+    for empresa, grupo in df.groupby("EMPRESA"):
+        fig.add_trace(
+            go.Bar(
+                x=grupo["DURACAO_H"],
+                y=grupo["VIAGEM"],
+                base=grupo["HORA_ABSOLUTA"],
+                orientation="h",
+                marker=dict(
+                    color=CORES.get(empresa, "gray"),
+                    line=dict(
+                        color="black" if empresa != "HUB" else "rgba(0,0,0,0)",
+                        width=1 if empresa != "HUB" else 0
+                    )
+                ),
+                name=empresa,
+                legendgroup=empresa,
+                width=0.35 if empresa != "HUB" else 1,
+                customdata=grupo[["ORIGEM", "DESTINO", "HORA PARTIDA", "HORA CHEGADA"]],
+                hovertemplate=(
+                    "<b>%{y}</b><br>" +
+                    "Origem: %{customdata[0]} → %{customdata[1]}<br>" +
+                    "Início: %{customdata[2]|%d/%m %H:%M}<br>" +
+                    "Fim: %{customdata[3]|%d/%m %H:%M}<br>" +
+                    "Duração: %{x:.1f}h"
+            ),
+                xaxis="x2",
+            )
+        )
+
+    # 2. Textos para dentro dos blocos — com exceção "SPO" para blocos curtos
+    textos_esquerda, textos_direita = calcular_textos(df, limiar)
+
+    # ORIGEM (esquerda) – só aparece se for >= 8h
+    fig.add_trace(
+        go.Bar(
+            x=df["DURACAO_H"],
+            y=df["VIAGEM"],
+            base=df["HORA_ABSOLUTA"],
+            orientation="h",
+            marker=dict(color="rgba(0,0,0,0)"),
+            text=textos_esquerda,
+            textposition="inside",
+            insidetextanchor="start",
+            textangle=0,  # mantém na horizontal
+            textfont=dict(size=12, color="black", family="Arial Black"),
+            showlegend=False,
+            hoverinfo="skip",
+            xaxis="x2",
+        )
+    )
+
+    # DESTINO (direita) – sempre "SPO" em blocos curtos
+    fig.add_trace(
+        go.Bar(
+            x=df["DURACAO_H"],
+            y=df["VIAGEM"],
+            base=df["HORA_ABSOLUTA"],
+            orientation="h",
+            marker=dict(color="rgba(0,0,0,0)"),
+            text=textos_direita,
+            textposition="inside",
+            insidetextanchor="end",
+            textangle=0,
+            textfont=dict(size=12, color="black", family="Arial Black"),
+            showlegend=False,
+            hoverinfo="skip",
+            xaxis="x2",
+        )
+    )
+
+    _adicionar_grade_e_legenda(fig, horizonte)
+    _aplicar_layout(
+        fig,
+        yaxis=dict(
+            title="VIAGEM",
+            autorange="reversed",
+            tickfont=dict(size=9),
+            categoryorder="array",
+            categoryarray=viagens_ordenadas
+        ),
+        n_viagens=len(viagens_ordenadas),
+        horizonte=horizonte,
+    )
+    return fig
+
+
+# === MODO WEBGL (MUITAS VIAGENS) ===
+# A partir de LIMIAR_WEBGL viagens a figura em barras SVG trava o navegador;
+# o modo WebGL desenha os blocos como segmentos de linha grossos e envia ao
+# navegador só uma página de VIAGENS_POR_PAGINA viagens por vez.
+LIMIAR_WEBGL = 300
+VIAGENS_POR_PAGINA = 100
+ALTURA_LINHA_PX = 30  # mesma altura por viagem do modo SVG
+
+
+def paginar_viagens(viagens_ordenadas, pagina: int, por_pagina: int = VIAGENS_POR_PAGINA):
+    """Viagens da página ``pagina`` (começando em 0) e o total de páginas."""
+    total = max(1, -(-len(viagens_ordenadas) // por_pagina))
+    pagina = min(max(pagina, 0), total - 1)
+    return list(viagens_ordenadas[pagina * por_pagina:(pagina + 1) * por_pagina]), total
+
+
+def _segmentos(inicio: np.ndarray, fim: np.ndarray, y: np.ndarray):
+    """Coordenadas de vários segmentos horizontais em um único trace,
+    separados por NaN (o WebGL interrompe a linha nos NaN)."""
+    separador = np.full(len(inicio), np.nan)
+    x = np.column_stack([inicio, fim, separador]).ravel()
+    y = np.column_stack([y, y, separador]).ravel()
+    return x, y
+
+
+def montar_figura_webgl(
+    df: pd.DataFrame, viagens, limiar: float = LIMIAR_TEXTO, horizonte: float = LIMITE_SEMANA
+) -> go.Figure:
+    """Versão WebGL (``Scattergl``) da timeline, restrita às ``viagens``.
+
+    Cada empresa vira um único trace de segmentos; o hover fica em marcadores
+    invisíveis no meio de cada bloco, com os mesmos campos do modo SVG. O eixo
+    y é numérico (posição da viagem na página), com os nomes nos ticks.
+    """
+    df = df[df["VIAGEM"].isin(viagens)]
+    posicao = pd.Index(viagens).get_indexer(df["VIAGEM"].astype(object))
+    inicio = df["HORA_ABSOLUTA"].to_numpy(dtype=float)
+    fim = inicio + df["DURACAO_H"].to_numpy(dtype=float)
+
+    fig = go.Figure()
+
+    # 0. Fundo translúcido e 1. blocos de cada empresa
+    for espessura, fundo in ((0.50, True), (0.35, False)):
+        for empresa, idx in df.groupby("EMPRESA", observed=True).indices.items():
+            x, y = _segmentos(inicio[idx], fim[idx], posicao[idx])
+            largura = 1 if empresa == "HUB" and not fundo else espessura
+            fig.add_trace(
+                go.Scattergl(
+                    x=x,
+                    y=y,
+                    mode="lines",
+                    line=dict(
+                        color="rgba(0,0,0,0.4)" if fundo else CORES.get(empresa, "gray"),
+                        width=largura * ALTURA_LINHA_PX * 0.85,
+                    ),
+                    name=empresa,
+                    legendgroup=empresa,
+                    showlegend=not fundo,
+                    hoverinfo="skip",
+                    xaxis="x2",
+                )
+            )
+
+    # Hover: um marcador transparente no meio de cada bloco
+    for empresa, idx in df.groupby("EMPRESA", observed=True).indices.items():
+        grupo = df.iloc[idx]
+        fig.add_trace(
+            go.Scattergl(
+                x=(inicio[idx] + fim[idx]) / 2,
+                y=posicao[idx],
+                mode="markers",
+                marker=dict(size=ALTURA_LINHA_PX * 0.5, color="rgba(0,0,0,0)"),
+                legendgroup=empresa,
+                showlegend=False,
+                text=grupo["VIAGEM"].astype(str),
+                customdata=np.column_stack([
+                    grupo[["ORIGEM", "DESTINO", "HORA PARTIDA", "HORA CHEGADA"]].to_numpy(dtype=object),
+                    grupo["DURACAO_H"].to_numpy(dtype=float),
+                ]),
+                hovertemplate=(
+                    "<b>%{text}</b><br>" +
+                    "Origem: %{customdata[0]} → %{customdata[1]}<br>" +
+                    "Início: %{customdata[2]|%d/%m %H:%M}<br>" +
+                    "Fim: %{customdata[3]|%d/%m %H:%M}<br>" +
+                    "Duração: %{customdata[4]:.1f}h<extra>" + empresa + "</extra>"
+                ),
+                xaxis="x2",
+            )
+        )
+
+    # 2. Textos nas pontas dos blocos, pelas mesmas regras do modo SVG
+    textos_esquerda, textos_direita = calcular_textos(df, limiar)
+    for x, texto, posicao_texto in (
+        (inicio, textos_esquerda, "middle right"),
+        (fim, textos_direita, "middle left"),
+    ):
+        com_texto = texto != ""
+        fig.add_trace(
+            go.Scattergl(
+                x=x[com_texto],
+                y=posicao[com_texto],
+                mode="text",
+                text=texto[com_texto],
+                textposition=posicao_texto,
+                textfont=dict(size=12, color="black", family="Arial Black"),
+                showlegend=False,
+                hoverinfo="skip",
+                xaxis="x2",
+            )
+        )
+
+    _adicionar_grade_e_legenda(fig, horizonte)
+    _aplicar_layout(
+        fig,
+        yaxis=dict(
+            title="VIAGEM",
+            range=[len(viagens) - 0.5, -0.5],
+            tickmode="array",
+            tickvals=list(range(len(viagens))),
+            ticktext=[str(v) for v in viagens],
+            tickfont=dict(size=9),
+            showgrid=False,
+            zeroline=False,
+        ),
+        n_viagens=len(viagens),
+        horizonte=horizonte,
+    )
+    fig.update_layout(hovermode="closest")
+    return fig
+
+
+# === FILTROS ===
+FILTROS = ("empresas", "dias", "obs", "janela")
+
+
+class IndiceTimeline:
+    """Blocos preparados e índices para filtrar a timeline sem pandas.
+
+    Construído uma vez por planilha e horizonte. Cada filtro é respondido
+    com listas de posições por categoria (empresa, dia da semana, código de
+    OBS) e com as horas de partida das viagens já ordenadas (a janela de
+    horário vira dois ``searchsorted``).
+    """
+
+    def __init__(self, blocos: pd.DataFrame, viagens_ordenadas, horizonte: float = LIMITE_SEMANA):
+        self.blocos = blocos.reset_index(drop=True)
+        self.viagens = list(viagens_ordenadas)
+        self.horizonte = horizonte
+
+        # Posição, no eixo y, da viagem de cada bloco
+        self._viagem_do_bloco = pd.Index(self.viagens).get_indexer(self.blocos["VIAGEM"].astype(object))
+        self._blocos_por_empresa = self.blocos.groupby("EMPRESA", observed=True).indices
+
+        # Atributos da viagem, tirados do primeiro bloco de cada uma
+        presentes, primeiro = np.unique(self._viagem_do_bloco, return_index=True)
+        n = len(self.viagens)
+        dia = np.full(n, "", dtype=object)
+        dia[presentes] = _coluna_normalizada(self.blocos, coluna_dia(self.blocos))[primeiro]
+        obs = np.full(n, -1, dtype=np.int64)
+        if "N° LEGENDA" in self.blocos.columns:
+            codigos = pd.to_numeric(self.blocos["N° LEGENDA"], errors="coerce").fillna(-1)
+            obs[presentes] = codigos.to_numpy(dtype=np.int64)[primeiro]
+        hora = np.full(n, np.nan)
+        hora[presentes] = self.blocos["HORA_VIAGEM_DECIMAL"].to_numpy(dtype=float)[primeiro]
+
+        self._viagens_por_dia = pd.Series(np.arange(n)).groupby(dia).indices
+        self._viagens_por_obs = pd.Series(np.arange(n)).groupby(obs).indices
+        self._ordem_hora = np.argsort(hora, kind="stable")
+        self._hora_ordenada = hora[self._ordem_hora]
+
+    @classmethod
+    def de_planilha(cls, df_planilha: pd.DataFrame, horizonte: float = LIMITE_SEMANA) -> "IndiceTimeline":
+        df, _ = preparar_dados(df_planilha)
+        return cls(*preparar_blocos(df, horizonte), horizonte)
+
+    @staticmethod
+    def _marcar(tamanho: int, grupos: dict, chaves) -> np.ndarray:
+        mascara = np.zeros(tamanho, dtype=bool)
+        for chave in chaves:
+            posicoes = grupos.get(chave)
+            if posicoes is not None:
+                mascara[posicoes] = True
+        return mascara
+
+    def _viagens_na_janela(self, inicio: float, fim: float) -> np.ndarray:
+        mascara = np.zeros(len(self.viagens), dtype=bool)
+        # Janela que vira a meia-noite (ex.: 22h às 4h) são dois intervalos
+        intervalos = [(inicio, fim)] if inicio <= fim else [(inicio, 24.0), (0.0, fim)]
+        for a, b in intervalos:
+            ini = np.searchsorted(self._hora_ordenada, a, side="left")
+            fim_ = np.searchsorted(self._hora_ordenada, b, side="right")
+            mascara[self._ordem_hora[ini:fim_]] = True
+        return mascara
+
+    def filtrar(self, empresas=None, dias=None, obs=None, janela=None):
+        """Blocos e viagens (na ordem do eixo y) que passam nos filtros.
+
+        ``empresas`` filtra blocos; ``dias`` (ex.: "QUA"), ``obs`` (códigos
+        de ``LEGENDA_OBS``) e ``janela`` (horas do dia da partida, início e
+        fim) filtram viagens. None em um filtro não restringe nada. Viagens
+        sem nenhum bloco restante somem do eixo.
+        """
+        n = len(self.viagens)
+        viagem_ok = np.ones(n, dtype=bool)
+        if dias is not None:
+            viagem_ok &= self._marcar(n, self._viagens_por_dia, [str(d).upper() for d in dias])
+        if obs is not None:
+            viagem_ok &= self._marcar(n, self._viagens_por_obs, [int(c) for c in obs])
+        if janela is not None:
+            viagem_ok &= self._viagens_na_janela(*janela)
+
+        bloco_ok = viagem_ok[self._viagem_do_bloco]
+        if empresas is not None:
+            bloco_ok &= self._marcar(len(self.blocos), self._blocos_por_empresa, empresas)
+
+        posicoes = np.flatnonzero(bloco_ok)
+        com_bloco = np.zeros(n, dtype=bool)
+        com_bloco[self._viagem_do_bloco[posicoes]] = True
+        viagens = [self.viagens[i] for i in np.flatnonzero(com_bloco)]
+        return self.blocos.iloc[posicoes], viagens
+
+
+def normalizar_filtros(filtros=None) -> dict:
+    """Filtros em forma canônica (listas ordenadas), para chaves de cache."""
+    filtros = filtros or {}
+    desconhecidos = set(filtros) - set(FILTROS)
+    if desconhecidos:
+        raise KeyError(f"Filtros desconhecidos: {sorted(desconhecidos)}")
+    normalizados = {}
+    for nome in FILTROS:
+        valor = filtros.get(nome)
+        if valor is None:
+            continue
+        normalizados[nome] = [float(v) for v in valor] if nome == "janela" else sorted(valor)
+    return normalizados
+
+
+# === CONEXÕES ===
+def adicionar_conexoes(
+    fig: go.Figure,
+    conexoes: pd.DataFrame,
+    viagens,
+    horizonte: float = LIMITE_SEMANA,
+    webgl: bool = False,
+) -> go.Figure:
+    """Desenha sobre a timeline as conexões de ``IndiceConexoes.conexoes``.
+
+    Cada conexão é um traço pontilhado do fim do bloco que chega ao início
+    do bloco que parte. Só entram as conexões com as duas viagens em
+    ``viagens`` (as do eixo y); no modo WebGL o eixo y é a posição da
+    viagem na página.
+    """
+    eixo = pd.Index(viagens)
+    y0 = eixo.get_indexer(conexoes["VIAGEM_CHEGADA"].astype(str).map(quebrar_viagem))
+    y1 = eixo.get_indexer(conexoes["VIAGEM_PARTIDA"].astype(str).map(quebrar_viagem))
+    visiveis = (y0 >= 0) & (y1 >= 0)
+    conexoes = conexoes[visiveis]
+    y0, y1 = y0[visiveis], y1[visiveis]
+
+    x0 = conexoes["HORA_ABSOLUTA_CHEGADA"].to_numpy(dtype=float) % horizonte
+    x1 = x0 + conexoes["ESPERA_MIN"].to_numpy(dtype=float) / 60
+    if not webgl:
+        rotulos = np.asarray(eixo, dtype=object)
+        y0, y1 = rotulos[y0], rotulos[y1]
+    texto = (
+        conexoes["HUB"].astype(str) + ": " + conexoes["CHEGADA"].astype(str) + " → "
+        + conexoes["PARTIDA"].astype(str) + " (" + conexoes["ESPERA_MIN"].astype(str) + " min)"
+    ).to_numpy(dtype=object)
+
+    separador = np.full(len(conexoes), None, dtype=object)
+    traco = go.Scattergl if webgl else go.Scatter
+    fig.add_trace(
+        traco(
+            x=np.column_stack([x0, x1, np.full(len(conexoes), np.nan)]).ravel(),
+            y=np.column_stack([np.asarray(y0, dtype=object), np.asarray(y1, dtype=object), separador]).ravel(),
+            mode="lines+markers",
+            line=dict(color="crimson", width=2, dash="dot"),
+            marker=dict(size=7, color="crimson"),
+            name="Conexões",
+            text=np.column_stack([texto, texto, separador]).ravel(),
+            hovertemplate="%{text}<extra>Conexão</extra>",
+            xaxis="x2",
+        )
+    )
+    return fig
+
+
+# === FIGURA EM CACHE ===
+# Mudanças neste arquivo ou nos módulos locais que ele usa (esquema.compactar,
+# leitura.ler_excel) alteram a figura, então entram na chave do cache
+_VERSAO_CODIGO = hash_codigo(__file__)
+
+
+def montar_figura_timeline(
+    indice: IndiceTimeline,
+    filtros=None,
+    limiar: float = LIMIAR_TEXTO,
+    pagina=None,
+    por_pagina: int = VIAGENS_POR_PAGINA,
+) -> go.Figure:
+    """Figura das viagens que passam nos ``filtros`` (ver ``IndiceTimeline.filtrar``).
+
+    Com ``pagina`` (começando em 0) usa o modo WebGL só com as viagens
+    dessa página.
+    """
+    df, viagens_ordenadas = indice.filtrar(**normalizar_filtros(filtros))
+    if pagina is None:
+        return montar_figura(df, viagens_ordenadas, limiar, indice.horizonte)
+    viagens, _ = paginar_viagens(viagens_ordenadas, pagina, por_pagina)
+    return montar_figura_webgl(df, viagens, limiar, indice.horizonte)
+
+
+def figura_serializada(
+    caminho,
+    horizonte: float = LIMITE_SEMANA,
+    filtros=None,
+    limiar: float = LIMIAR_TEXTO,
+    pagina=None,
+    por_pagina: int = VIAGENS_POR_PAGINA,
+    pasta_cache: Path = PASTA_CACHE,
+    indice: IndiceTimeline = None,
+) -> str:
+    """JSON da figura de ``caminho``, reaproveitado do cache em disco.
+
+    A chave é o hash da planilha, as opções e a versão deste módulo; só a
+    primeira visualização de cada combinação monta e serializa a figura.
+    ``indice`` (do mesmo arquivo e horizonte) evita reprocessar a planilha.
+    """
+    opcoes = {
+        "horizonte": horizonte,
+        "filtros": normalizar_filtros(filtros),
+        "limiar": limiar,
+        "pagina": pagina,
+        "por_pagina": por_pagina if pagina is not None else None,
+        "codigo": _VERSAO_CODIGO,
+    }
+
+    def gerar() -> str:
+        indice_ = indice
+        if indice_ is None:
+            df_planilha = compactar(ler_excel(
+                caminho, pasta_cache=pasta_cache, colunas=COLUNAS_PLANILHA, ignorar_ausentes=True
+            ))
+            indice_ = IndiceTimeline.de_planilha(df_planilha, horizonte)
+        return montar_figura_timeline(indice_, filtros, limiar, pagina, por_pagina).to_json()
+
+    return cache_derivado(caminho, "figura", opcoes, gerar, pasta_cache)
+
+
+def _dias_do_horizonte(horizonte: float) -> int:
+    """Dias (completos ou não) cobertos pelo eixo de ``horizonte`` horas."""
+    return int(np.ceil(horizonte / 24))
+
+
+def _adicionar_grade_e_legenda(fig: go.Figure, horizonte: float = LIMITE_SEMANA) -> None:
+    """Grade de horas e dias, faixa de operação do HUB e legendas fixas."""
+    # === GRADE DE HORAS E DIAS ===
+    # O eixo começa na quarta; horizontes de mais de uma semana repetem os dias
+    ticks_dias = [i * 24 for i in range(_dias_do_horizonte(horizonte))]
+
+    # Delimitações entre os dias
+    for x in ticks_dias:
+        fig.add_shape(
+            type="line",
+            x0=x,
+            x1=x,
+            y0=0,
+            y1=1,
+            xref="x2",
+            yref="paper",
+            line=dict(color="white", width=3),
+            layer="below",
+        )
+
+    # Fundo verde claro de 07:00 às 22:00 para cada dia do horizonte
+    for dia in range(_dias_do_horizonte(horizonte)):
+        fig.add_shape(
+            type="rect",
+            x0=dia * 24 + OPERACAO_HUB[0],
+            x1=dia * 24 + OPERACAO_HUB[1],
+            y0=0,
+            y1=1,
+            xref="x2",
+            yref="paper",
+            fillcolor="rgba(144,238,144,0.2)",
+            line=dict(width=0),
+            layer="below"
+        )
+
+    # Anotações dos dias da semana
+    anotacoes = []
+    for i, x in enumerate(ticks_dias):
+        anotacoes.append(dict(
+            x=x + 12,
+            y=1.015,
+            xref="x2",
+            yref="paper",
+            text=f"<b>{ORDEM_DIAS[i % 7]}</b>",
+            showarrow=False,
+            font=dict(size=14, color="white"),
+            align="center"
+        ))
+
+    # Legenda para o período de operação do HUB
+    fig.add_trace(
+        go.Scatter(
+            x=[None],
+            y=[None],
+            mode="markers",
+            marker=dict(size=10, color="rgba(144,238,144,0.2)", symbol="square"),
+            showlegend=True,
+            name=f"HUB - FSA<br>({OPERACAO_HUB[0]:02d}:00 às {OPERACAO_HUB[1]:02d}:00)",
+            hoverinfo="skip",
+            legendgroup="CATEGORIAS",
+            xaxis="x2"
+        )
+    )
+
+    # Legenda visual para os códigos de OBS (1 a 4)
+    for cod in sorted(LEGENDA_OBS.keys(), reverse=True):
+        texto = LEGENDA_OBS[cod]
+        fig.add_trace(
+            go.Scatter(
+                x=[None],
+                y=[None],
+                mode="markers",
+                marker=dict(size=10, color="white", symbol="circle"),  # cor neutra
+                showlegend=True,
+                name=texto,
+                hoverinfo="skip",
+                legendgroup="CATEGORIAS",
+                xaxis="x2"
+            )
+        )
+    fig.update_layout(annotations=anotacoes)
+
+
+def _aplicar_layout(fig: go.Figure, yaxis: dict, n_viagens: int, horizonte: float = LIMITE_SEMANA) -> None:
+    """Layout final: eixo de horas do horizonte, legenda e altura por viagem."""
+    x_ticks = list(range(0, int(horizonte) + 1))
+    x_labels = [str(h % 24) if h % 24 != 0 else "" for h in x_ticks]
+
+    fig.update_layout(
+        barmode="stack",
+        bargap=0.15,
+        dragmode="pan",
+        xaxis=dict(visible=False),
+        xaxis2=dict(
+            domain=[0.0, 1.0],
+            anchor="y",
+            tickmode="array",
+            tickvals=x_ticks,
+            ticktext=x_labels,
+            showgrid=True,
+            gridcolor="lightgray",
+            griddash="dot",
+            ticklen=3,
+            tickfont=dict(size=9),
+            ticks="outside",
+            title="Horário do Dia",
+            range=[0, horizonte],
+        ),
+        yaxis=yaxis,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",   # ancora a parte inferior da legenda
+            y=1.018,              # ligeiramente acima dos dias da semana
+            xanchor="center",
+            x=0.5,               # centralizado horizontalmente
+            font=dict(size=13),
+            traceorder="normal"
+        ),
+        margin=dict(l=0, r=0, t=120, b=60),  # mantém folga no topo
+
+        height=500 + 30 * n_viagens,
+        hoverlabel=dict(font_size=11)
+    )
@@ -0,0 +1,148 @@
+"""Etapas vetorizadas da formatação da malha Itapemirim (Formatacao.py)."""
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from coordenadas import IndiceCoordenadas
+
+# Colunas que identificam um serviço (um bloco de paradas) na malha
+CHAVES_SERVICO = ["PREFIXO SIGMA", "NOME DA LINHA", "SERVICO", "TIPO_VEICULO", "FREQUENCIA"]
+ORDEM_PARADAS = ["DIA_PARTIDA", "HORARIO"]
+
+# Tradução dos dias
+TRADUZIR_DIA = {
+    "DIA ATUAL": "D+0",
+    "DIA +1": "D+1",
+    "DIA +2": "D+2",
+    "DIA +3": "D+3"
+}
+
+
+def formatar_hora(valor):
+    if pd.notna(valor) and str(valor).replace(":", "").isdigit():
+        valor = str(int(valor)).zfill(4)
+        return f"{valor[:2]}:{valor[2:]}"
+    return valor
+
+
+def converter_coordenadas(df_coords: pd.DataFrame) -> pd.DataFrame:
+    """Converte LAT/LON para float, aceitando vírgula como separador decimal."""
+    df_coords = df_coords.copy()
+    for col in ["LAT", "LON"]:
+        try:
+            df_coords[col] = pd.to_numeric(df_coords[col], errors="raise")
+        except (TypeError, ValueError):
+            df_coords[col] = df_coords[col].astype(str).str.replace(",", ".").astype(float)
+    return df_coords
+
+
+def extrair_origem_destino(nome_linha):
+    partes = nome_linha.split(" - ")
+    if len(partes) >= 2:
+        origem = partes[0].strip().split("(")[0].strip()
+        destino = partes[1].strip().split("(")[0].strip()
+        return origem.upper(), destino.upper()
+    return None, None
+
+
+def atribuir_sentido_e_sequencia(df: pd.DataFrame) -> pd.DataFrame:
+    """Ordena as paradas de cada serviço e calcula SENTIDO e SEQUENCIA.
+
+    Uma única ordenação global (serviço, dia, horário) substitui o laço por
+    grupo; a sequência vem do ``cumcount`` e a primeira/última localidade de
+    ``transform``. O nome da linha é interpretado uma vez por nome distinto.
+    O sentido é IDA quando o serviço começa na origem ou termina no destino
+    da linha, VOLTA quando começa no destino, e "erro" nos demais casos.
+    """
+    df = df.dropna(subset=CHAVES_SERVICO)
+    df = df.sort_values(CHAVES_SERVICO + ORDEM_PARADAS).reset_index(drop=True)
+
+    grupos = df.groupby(CHAVES_SERVICO, sort=False)
+    primeira = grupos["LOCALIDADE"].transform("first").str.upper().str.strip()
+    ultima = grupos["LOCALIDADE"].transform("last").str.upper().str.strip()
+
+    nomes = df["NOME DA LINHA"].drop_duplicates()
+    extremos = {nome: extrair_origem_destino(nome) for nome in nomes}
+    origem = df["NOME DA LINHA"].map({n: o for n, (o, _) in extremos.items()})
+    destino = df["NOME DA LINHA"].map({n: d for n, (_, d) in extremos.items()})
+    tem_origem = origem.fillna("").astype(str) != ""
+    tem_destino = destino.fillna("").astype(str) != ""
+
+    ida = (tem_origem & (primeira == origem)) | (tem_destino & (ultima == destino))
+    volta = tem_destino & (primeira == destino)
+
+    df["SENTIDO"] = np.select([ida.to_numpy(bool), volta.to_numpy(bool)], ["IDA", "VOLTA"], default="erro")
+    df["SEQUENCIA"] = grupos.cumcount().to_numpy() + 1
+    return df
+
+
+def formatar_malha(
+    df_malha: pd.DataFrame,
+    df_linhas: pd.DataFrame,
+    df_coords: pd.DataFrame,
+    limiar_aproximado: Optional[float] = None,
+) -> pd.DataFrame:
+    """Monta a malha formatada (Malha_Formatada.csv) a partir das planilhas.
+
+    Mantém só as linhas ativas de ``df_linhas`` e as localidades presentes em
+    ``df_coords``, padroniza horário e dia e calcula SENTIDO e SEQUENCIA.
+    Com ``limiar_aproximado``, localidades sem correspondência exata são
+    buscadas por similaridade (ver ``IndiceCoordenadas.resolver``). As que
+    continuam sem coordenada ficam listadas em
+    ``attrs["localidades_sem_coordenada"]``.
+    """
+    df_malha = df_malha.copy()
+    df_linhas = df_linhas.copy()
+
+    # Garante que as colunas de comparação sejam do mesmo tipo (texto)
+    df_malha["CODIGO_LINHA"] = df_malha["CODIGO_LINHA"].astype(str).str.strip()
+    df_linhas["PREFIXO SIGMA"] = df_linhas["PREFIXO SIGMA"].astype(str).str.strip()
+    df_linhas["NOME DA LINHA"] = df_linhas["NOME DA LINHA"].astype(str).str.strip()
+
+    # Remove duplicatas
+    df_linhas_unico = df_linhas.drop_duplicates(subset=["PREFIXO SIGMA"])
+
+    # Merge somente com os dados de linhas ativas (filtro com inner join)
+    df_completo = df_malha.merge(
+        df_linhas_unico[["PREFIXO SIGMA", "NOME DA LINHA"]],
+        how="inner",
+        left_on="CODIGO_LINHA",
+        right_on="PREFIXO SIGMA"
+    )
+
+    # Remove a coluna de chave duplicada
+    df_completo.drop(columns=["PREFIXO SIGMA"], inplace=True)
+
+    # Reorganiza para que "NOME DA LINHA" fique à direita de "CODIGO_LINHA"
+    colunas = df_completo.columns.tolist()
+    colunas.remove("NOME DA LINHA")
+    idx = colunas.index("CODIGO_LINHA")
+    colunas.insert(idx + 1, "NOME DA LINHA")
+    df_completo = df_completo[colunas]
+
+    # Renomeia colunas e remove a indesejada
+    df_completo = df_completo.rename(columns={"CODIGO_LINHA": "PREFIXO SIGMA", "HORA_PARTIDA": "HORARIO"})
+    if "NOME" in df_completo.columns:
+        df_completo = df_completo.drop(columns=["NOME"])
+
+    df_completo["HORARIO"] = df_completo["HORARIO"].apply(formatar_hora)
+    df_completo["LOCALIDADE"] = df_completo["LOCALIDADE"].str.upper().str.strip()
+    # Como texto: numa coluna categórica o map manteria a ordem das categorias
+    # originais ("DIA +1" antes de "DIA ATUAL") e a ordenação dos dias quebraria
+    df_completo["DIA_PARTIDA"] = df_completo["DIA_PARTIDA"].astype(object).map(TRADUZIR_DIA)
+
+    # --- Adiciona LAT e LON com base na correspondência LOCALIDADE ↔ CIDADE ---
+    indice_coords = IndiceCoordenadas.de_dataframe(converter_coordenadas(df_coords), "CIDADE")
+    lat, lon = indice_coords.buscar(df_completo["LOCALIDADE"], limiar_aproximado)
+    df_completo["LAT"] = lat
+    df_completo["LON"] = lon
+
+    # --- Filtra apenas localidades que existem na base de coordenadas ---
+    sem_coordenada = sorted(df_completo.loc[df_completo["LAT"].isna(), "LOCALIDADE"].dropna().unique())
+    df_completo = df_completo[df_completo["LAT"].notna()].reset_index(drop=True)
+
+    # Ordenação, sentido e sequência de cada serviço
+    df_completo = atribuir_sentido_e_sequencia(df_completo)
+    df_completo.attrs["localidades_sem_coordenada"] = sem_coordenada
+    return df_completo
@@ -2,6 +2,16 @@ import streamlit as st
 import pandas as pd
 import pydeck as pdk
 
+from corredores import IndiceCorredores
+from esquema import compactar, relatorio_memoria, texto_dos_minutos
+from horarios import HistogramaPartidas
+from leitura import ler_excel
+from mapas import DeckCompacto, camada_agrupamentos, camada_arestas
+from niveis_detalhe import ZOOM_DETALHE_COMPLETO, gerar_nivel, gerar_niveis, nivel_do_zoom
+
+# Colunas usadas das rotas da Guanabara; as demais nem são carregadas
+COLUNAS_GUA = ["PREFIXO", "DESCRICAO DA LINHA", "CIDADES", "LAT", "LON", "SEQUENCIA"]
+
 # --- Configuração da Página ---
 st.set_page_config(layout="wide", page_title="Mapa do projeto")
 st.title("🗺️ Projeto Operação integrada - Nova Itapemirim & Guanabara")
@@ -10,60 +20,34 @@ st.title("🗺️ Projeto Operação integrada - Nova Itapemirim & Guanabara")
 @st.cache_data
 def carregar_dados():
     try:
-        df = pd.read_excel("esqueleto.xlsx")
+        df = ler_excel("esqueleto.xlsx")
         df = df.dropna(subset=["LAT", "LON", "SEQUENCIA"])
         df["SEQUENCIA"] = pd.to_numeric(df["SEQUENCIA"], errors="coerce")
         df["LAT"] = df["LAT"].astype(float)
         df["LON"] = df["LON"].astype(float)
-        return df
+        # Categorias, coordenadas float32 e horários em minutos (ver esquema.py)
+        return compactar(df)
     except Exception as e:
         st.error(f"Erro ao carregar arquivo: {e}")
         return pd.DataFrame()
 
 @st.cache_data
-def gerar_tabela_horarios():
-    """Gera contagem de partidas de Feira de Santana por faixa horária."""
+def carregar_histograma_partidas():
+    """Histograma de partidas de todas as localidades da malha formatada."""
     try:
-        df_malha = pd.read_csv("Malha_Formatada.csv", sep=";", encoding="utf-8-sig")
-        feira = df_malha[df_malha["LOCALIDADE"].str.upper().str.contains("FEIRA DE SANTANA")].copy()
-        feira["HORARIO"] = pd.to_datetime(feira["HORARIO"], format="%H:%M", errors="coerce")
-
-        time_bins = [0, 4, 8, 12, 16, 20, 24]
-        faixas = [
-            "00:00-03:59",
-            "04:00-07:59",
-            "08:00-11:59",
-            "12:00-15:59",
-            "16:00-19:59",
-            "20:00-23:59",
-        ]
-
-        feira["Faixa"] = pd.cut(
-            feira["HORARIO"].dt.hour,
-            bins=time_bins,
-            labels=faixas,
-            right=False,
-            include_lowest=True,
-        )
-
-        contagem = feira["Faixa"].value_counts().sort_index()
-        resultado = contagem.reset_index()
-        resultado.columns = ["Faixa de horário", "Quantidade de incidências semanais"]
-
-        # Adiciona linha de totais
-        total = resultado["Quantidade de incidências semanais"].sum()
-        total_row = pd.DataFrame(
-            {
-                "Faixa de horário": ["Total"],
-                "Quantidade de incidências semanais": [total],
-            }
-        )
-        resultado = pd.concat([resultado, total_row], ignore_index=True)
-        
-        return resultado
+        # Lido em blocos: a memória não cresce com o tamanho da malha
+        return HistogramaPartidas.de_csv("Malha_Formatada.csv")
     except Exception as e:
         st.error(f"Erro ao gerar tabela de horários: {e}")
+        return None
+
+
+def gerar_tabela_horarios(cidade: str = "FEIRA DE SANTANA", por_dia: bool = False):
+    """Contagem de partidas da cidade por faixa horária (consulta ao histograma)."""
+    histograma = carregar_histograma_partidas()
+    if histograma is None:
         return pd.DataFrame()
+    return histograma.tabela(cidade, "Quantidade de incidências semanais", por_dia)
 
 df = carregar_dados()
 
@@ -74,75 +58,66 @@ if df.empty:
 # --- Ordenar os dados pela sequência das cidades dentro de cada linha ---
 df = df.sort_values(by=["PREFIXO SIGMA", "NOME DA LINHA", "SERVICO", "TIPO_VEICULO", "FREQUENCIA", "SEQUENCIA"])
 
-# --- Criar DataFrame seguro apenas com coordenadas ---
-df_pontos = df[["LAT", "LON"]].copy()
-df_pontos = df_pontos.dropna()
-df_pontos["lat"] = df_pontos["LAT"].astype(float)
-df_pontos["lon"] = df_pontos["LON"].astype(float)
-
-# --- Verificar se há valores inválidos ---
-if df_pontos["lat"].isnull().any() or df_pontos["lon"].isnull().any():
-    st.error("Erro: coordenadas inválidas nos pontos.")
-    st.stop()
-
-# --- Criar camada de pontos vermelhos ---
-pontos_layer = pdk.Layer(
-    "ScatterplotLayer",
-    data=df_pontos[["lat", "lon"]],
-    get_position='[lon, lat]',
-    get_fill_color='[0, 0, 0, 160]',
-    pickable=False,
-    radius_min_pixels=4,
-    radius_max_pixels=30
-)
+# --- Níveis de detalhe da Itapemirim: paradas agrupadas e rotas simplificadas por zoom ---
+@st.cache_resource(show_spinner=False)
+def niveis_itapemirim():
+    # Trechos repetidos entre serviços viram uma linha só, mais grossa
+    return gerar_niveis(
+        carregar_dados(), ['PREFIXO SIGMA', 'NOME DA LINHA', 'SERVICO', 'TIPO_VEICULO', 'FREQUENCIA']
+    )
 
-# --- Gerar conexões entre localidades da mesma linha ---
-conexoes = []
-grupos = df.groupby(['PREFIXO SIGMA', 'NOME DA LINHA', 'SERVICO', 'TIPO_VEICULO', 'FREQUENCIA'])
-
-for chave, grupo in grupos:
-    grupo_ordenado = grupo.sort_values(by="SEQUENCIA")
-    for i in range(len(grupo_ordenado) - 1):
-        origem = grupo_ordenado.iloc[i]
-        destino = grupo_ordenado.iloc[i + 1]
-        conexoes.append({
-            "source": [float(origem["LON"]), float(origem["LAT"])],
-            "target": [float(destino["LON"]), float(destino["LAT"])]
-        })
-
-# --- Criar camada de linhas de conexão ---
-linha_layer = pdk.Layer(
-    "LineLayer",
-    data=pd.DataFrame(conexoes),
-    get_source_position="source",
-    get_target_position="target",
-    get_color=[254, 221, 49],
-    get_width=3,
-)
+# --- Mapa da Itapemirim: montado e serializado uma vez por zoom para todas as sessões ---
+@st.cache_resource(show_spinner=False)
+def mapa_itapemirim(zoom):
+    df_mapa = carregar_dados()
+    pontos, conexoes = niveis_itapemirim()[nivel_do_zoom(zoom)]
 
-linha_horizontal = pdk.Layer(
+    linha_horizontal = pdk.Layer(
         "PathLayer",
-    data=pd.DataFrame({
-        "path": [[[ -180, -12.2292842525 ], [ 180, -12.2292842525 ]]]
-    }),
-    get_path="path",
-    # A cor branca não fica visível com o tema claro do Streamlit.
-    # Usamos preto para destacar a linha horizontal no modo Light.
-    get_color=[0, 0, 0],
-    get_width=20,         # <--- aumente aqui para engrossar
-    width_scale=1,
-    width_min_pixels=2,
-    width_max_pixels=10,
-    opacity=0.6,
-    dash_size=4,
-    gap_size=2,
-)
+        data=pd.DataFrame({
+            "path": [[[ -180, -12.2292842525 ], [ 180, -12.2292842525 ]]]
+        }),
+        get_path="path",
+        # A cor branca não fica visível com o tema claro do Streamlit.
+        # Usamos preto para destacar a linha horizontal no modo Light.
+        get_color=[0, 0, 0],
+        get_width=20,         # <--- aumente aqui para engrossar
+        width_scale=1,
+        width_min_pixels=2,
+        width_max_pixels=10,
+        opacity=0.6,
+        dash_size=4,
+        gap_size=2,
+    )
+
+    # --- View inicial centralizada ---
+    view_state = pdk.ViewState(
+        latitude=float(df_mapa["LAT"].mean()),
+        longitude=float(df_mapa["LON"].mean()),
+        zoom=zoom,
+    )
+    return DeckCompacto(
+        map_style=None,
+        initial_view_state=view_state,
+        layers=[
+            # Pontos pretos, um por parada distinta (ou grupo de paradas próximas)
+            camada_agrupamentos(
+                pontos, [0, 0, 0, 160], 4,
+                pickable=False, radius_units="pixels", radius_max_pixels=30,
+            ),
+            camada_arestas(conexoes, [254, 221, 49]),
+            linha_horizontal,
+        ],
+    )
 
-# --- View inicial centralizada ---
-view_state = pdk.ViewState(
-    latitude=df["LAT"].mean(),
-    longitude=df["LON"].mean(),
-    zoom=5,
+# --- Zoom dos mapas: escolhe o nível de detalhe e o zoom inicial ---
+# O Streamlit não recebe o zoom feito no navegador; abaixo de
+# ZOOM_DETALHE_COMPLETO as paradas próximas aparecem agrupadas
+zoom_mapas = st.select_slider(
+    "Zoom dos mapas",
+    options=list(range(3, ZOOM_DETALHE_COMPLETO + 3)),
+    value=5,
+    help=f"Abaixo de {ZOOM_DETALHE_COMPLETO}, paradas próximas são agrupadas e as rotas simplificadas.",
 )
 
 st.subheader("Itapemirim")
@@ -150,19 +125,7 @@ st.subheader("Itapemirim")
 col_mapa_itap, col_tabela_itap = st.columns([3, 1])
 
 with col_mapa_itap:
-    st.pydeck_chart(
-        pdk.Deck(
-            map_style=None,
-            initial_view_state=view_state,
-            layers=[
-                pontos_layer,
-                linha_layer,
-                linha_horizontal
-            ]
-        ),
-        use_container_width=True,
-        height=800,
-    )
+    st.pydeck_chart(mapa_itapemirim(zoom_mapas), use_container_width=True, height=800)
 
 with col_tabela_itap:
     linhas_itap = (
@@ -172,40 +135,79 @@ with col_tabela_itap:
     linhas_itap_df = pd.DataFrame(sorted(linhas_itap.unique()), columns=["LINHA"])
     st.dataframe(linhas_itap_df, hide_index=True, height=800)
 
-# --- Tabela de horários de Feira de Santana ---
-horarios_df = gerar_tabela_horarios()
+# --- Tabela de horários por faixa (Feira de Santana ou outro HUB) ---
+histograma = carregar_histograma_partidas()
+localidades_malha = sorted(histograma.localidades) if histograma is not None else []
+col_hub, col_dia = st.columns([3, 1])
+with col_hub:
+    hub = st.selectbox(
+        "Localidade",
+        localidades_malha,
+        index=localidades_malha.index("FEIRA DE SANTANA") if "FEIRA DE SANTANA" in localidades_malha else 0,
+    )
+with col_dia:
+    abrir_por_dia = st.checkbox("Abrir por dia da semana")
+horarios_df = gerar_tabela_horarios(hub, abrir_por_dia) if hub else pd.DataFrame()
 if not horarios_df.empty:
     st.dataframe(horarios_df, hide_index=True)
 
 # --- Mostrar os dados ---
 with st.expander("🔍 Ver dados utilizados"):
-    st.dataframe(df)
+    st.dataframe(df.assign(HORARIO=texto_dos_minutos(df["HORARIO"])) if "HORARIO" in df.columns else df)
 
 # --- Carregar dados da Guanabara ---
-@st.cache_data
-def carregar_dados_gua():
+@st.cache_resource
+def carregar_indice_gua():
+    """Todas as rotas da Guanabara com o índice espacial dos trechos."""
     try:
-        df_g = pd.read_excel("Linhas_selecionadas_Gua.xlsx")
+        df_g = ler_excel("Rotas_Guanabara_Formatadas.xlsx", colunas=COLUNAS_GUA)
         df_g = df_g.dropna(subset=["LAT", "LON", "SEQUENCIA"])
         df_g["SEQUENCIA"] = pd.to_numeric(df_g["SEQUENCIA"], errors="coerce")
         df_g["LAT"] = df_g["LAT"].astype(float)
         df_g["LON"] = df_g["LON"].astype(float)
-        return df_g
+        return IndiceCorredores(compactar(df_g))
     except Exception as e:
         st.error(f"Erro ao carregar arquivo da Guanabara: {e}")
-        return pd.DataFrame()
+        return None
 
-df_gua = carregar_dados_gua()
+indice_gua = carregar_indice_gua()
 
-if df_gua.empty:
+if indice_gua is None or indice_gua.df.empty:
     st.warning("Nenhum dado válido para exibir para a Guanabara.")
     st.stop()
 
+st.subheader("Guanabara")
+
+# --- Seleção espacial das rotas em torno de um HUB ---
+CRUZA_LATITUDE = "Cruzam a latitude do HUB"
+PASSA_PERTO = "Passam perto do HUB"
+cidades_gua = indice_gua.df.groupby("CIDADES")[["LAT", "LON"]].first()
+col_criterio, col_hub, col_raio = st.columns(3)
+with col_criterio:
+    criterio = st.radio("Rotas exibidas", [CRUZA_LATITUDE, PASSA_PERTO])
+with col_hub:
+    hub_gua = st.selectbox(
+        "HUB",
+        cidades_gua.index,
+        index=cidades_gua.index.get_loc("FEIRA DE SANTANA (BA)") if "FEIRA DE SANTANA (BA)" in cidades_gua.index else 0,
+    )
+with col_raio:
+    raio_km = st.slider("Raio (km)", 0, 500, 50, disabled=criterio != PASSA_PERTO)
+
+lat_hub, lon_hub = cidades_gua.loc[hub_gua, ["LAT", "LON"]]
+if criterio == CRUZA_LATITUDE:
+    rotas_gua = indice_gua.rotas_que_cruzam_latitude(lat_hub)
+else:
+    rotas_gua = indice_gua.rotas_perto_de(lat_hub, lon_hub, raio_km)
+df_gua = indice_gua.linhas(rotas_gua)
+
+if df_gua.empty:
+    st.warning("Nenhuma rota da Guanabara atende à seleção.")
+    st.stop()
+
 # --- Ordenar os dados pela sequência das cidades dentro de cada linha ---
 df_gua = df_gua.sort_values(by=["PREFIXO", "DESCRICAO DA LINHA", "SEQUENCIA"])
 
-st.subheader("Guanabara")
-
 # --- Filtro de linhas ---
 linhas_unicas = sorted(df_gua["DESCRICAO DA LINHA"].unique())
 selecionadas = st.multiselect(
@@ -220,75 +222,67 @@ if not selecionadas:
 
 df_gua_filtrado = df_gua[df_gua["DESCRICAO DA LINHA"].isin(selecionadas)]
 
-# --- Criar DataFrame seguro apenas com coordenadas ---
-df_gua_pontos = df_gua_filtrado[["LAT", "LON"]].copy()
-df_gua_pontos = df_gua_pontos.dropna()
-df_gua_pontos["lat"] = df_gua_pontos["LAT"].astype(float)
-df_gua_pontos["lon"] = df_gua_pontos["LON"].astype(float)
+# --- Mapa da Guanabara: um Deck serializado por seleção, reaproveitado nos reruns ---
+@st.cache_resource(max_entries=16, show_spinner=False)
+def mapa_guanabara(hub, criterio, raio_km, linhas, zoom, _df_gua_filtrado):
+    """``_df_gua_filtrado`` fica fora da chave do cache: ele é determinado
+    pelo HUB, pelo critério, pelo raio e pelas linhas selecionadas."""
+    lat_hub, lon_hub = cidades_gua.loc[hub, ["LAT", "LON"]]
 
-# --- Verificar se há valores inválidos ---
-if df_gua_pontos["lat"].isnull().any() or df_gua_pontos["lon"].isnull().any():
-    st.error("Erro: coordenadas inválidas nos pontos da Guanabara.")
-    st.stop()
+    # --- Paradas e conexões entre localidades da mesma linha, no nível do zoom ---
+    pontos_gua, conexoes_gua = gerar_nivel(
+        _df_gua_filtrado, ["PREFIXO", "DESCRICAO DA LINHA"], nivel_do_zoom(zoom)
+    )
 
-# --- Criar camada de pontos pretos ---
-pontos_gua_layer = pdk.Layer(
-    "ScatterplotLayer",
-    data=df_gua_pontos[["lat", "lon"]],
-    get_position='[lon, lat]',
-    get_fill_color='[0, 0, 0, 160]',
-    pickable=False,
-    radius_min_pixels=4,
-    radius_max_pixels=30
-)
+    # --- Referência da seleção: latitude do HUB ou círculo do raio ---
+    linha_horizontal_gua = pdk.Layer(
+        "PathLayer",
+        data=pd.DataFrame({
+            "path": [[[-180, float(lat_hub)], [180, float(lat_hub)]]]
+        }),
+        get_path="path",
+        get_color=[0, 0, 0],
+        get_width=20,
+        width_scale=1,
+        width_min_pixels=2,
+        width_max_pixels=10,
+        opacity=0.6,
+        dash_size=4,
+        gap_size=2,
+    )
 
-# --- Gerar conexões entre localidades da mesma linha ---
-conexoes_gua = []
-grupos_gua = df_gua_filtrado.groupby(["PREFIXO", "DESCRICAO DA LINHA"])
-
-for _, grupo in grupos_gua:
-    grupo_ordenado = grupo.sort_values(by="SEQUENCIA")
-    grupo_ordenado["NEXT_LAT"] = grupo_ordenado["LAT"].shift(-1)
-    grupo_ordenado["NEXT_LON"] = grupo_ordenado["LON"].shift(-1)
-    for _, row in grupo_ordenado[:-1].iterrows():
-        if pd.notna(row["NEXT_LAT"]) and pd.notna(row["NEXT_LON"]):
-            conexoes_gua.append({
-                "source": [float(row["LON"]), float(row["LAT"])],
-                "target": [float(row["NEXT_LON"]), float(row["NEXT_LAT"])]
-            })
-
-# --- Criar camada de linhas de conexão ---
-linha_gua_layer = pdk.Layer(
-    "LineLayer",
-    data=pd.DataFrame(conexoes_gua),
-    get_source_position="source",
-    get_target_position="target",
-    get_color=[0, 0, 139],
-    get_width=3,
-)
+    if criterio == PASSA_PERTO:
+        linha_horizontal_gua = pdk.Layer(
+            "ScatterplotLayer",
+            data=pd.DataFrame({"lat": [float(lat_hub)], "lon": [float(lon_hub)]}),
+            get_position="[lon, lat]",
+            get_radius=raio_km * 1000,
+            get_fill_color=[0, 0, 0, 30],
+            get_line_color=[0, 0, 0, 160],
+            stroked=True,
+            line_width_min_pixels=2,
+        )
 
-linha_horizontal_gua = pdk.Layer(
-    "PathLayer",
-    data=pd.DataFrame({
-        "path": [[[-180, -12.2292842525], [180, -12.2292842525]]]
-    }),
-    get_path="path",
-    get_color=[0, 0, 0],
-    get_width=20,
-    width_scale=1,
-    width_min_pixels=2,
-    width_max_pixels=10,
-    opacity=0.6,
-    dash_size=4,
-    gap_size=2,
-)
+    # --- View inicial centralizada ---
+    view_state_gua = pdk.ViewState(
+        latitude=float(_df_gua_filtrado["LAT"].mean()),
+        longitude=float(_df_gua_filtrado["LON"].mean()),
+        zoom=zoom,
+    )
+    return DeckCompacto(
+        map_style=None,
+        initial_view_state=view_state_gua,
+        layers=[
+            # Pontos pretos, um por parada distinta (ou grupo de paradas próximas)
+            camada_agrupamentos(
+                pontos_gua, [0, 0, 0, 160], 4,
+                pickable=False, radius_units="pixels", radius_max_pixels=30,
+            ),
+            camada_arestas(conexoes_gua, [0, 0, 139]),
+            linha_horizontal_gua,
+        ],
+    )
 
-# --- View inicial centralizada ---
-view_state_gua = pdk.ViewState(
-    latitude=df_gua_filtrado["LAT"].mean(),
-    longitude=df_gua_filtrado["LON"].mean(),
-    zoom=5,
-)
 # --- Mostrar o mapa da Guanabara ---
 
 # --- Mostrar mapa e lista de linhas da Guanabara lado a lado ---
@@ -296,15 +290,7 @@ col_mapa_gua, col_tabela_gua = st.columns([3, 1])
 
 with col_mapa_gua:
     st.pydeck_chart(
-        pdk.Deck(
-            map_style=None,
-            initial_view_state=view_state_gua,
-            layers=[
-                pontos_gua_layer,
-                linha_gua_layer,
-                linha_horizontal_gua
-            ]
-        ),
+        mapa_guanabara(hub_gua, criterio, raio_km if criterio == PASSA_PERTO else None, tuple(selecionadas), zoom_mapas, df_gua_filtrado),
         use_container_width=True,
         height=800,
     )
@@ -319,3 +305,9 @@ with col_tabela_gua:
 # --- Mostrar os dados da Guanabara ---
 with st.expander("🔍 Ver dados utilizados - Guanabara"):
     st.dataframe(df_gua_filtrado)
+
+with st.expander("📦 Memória das tabelas"):
+    st.dataframe(
+        relatorio_memoria({"Itapemirim": df, "Guanabara": indice_gua.df}),
+        hide_index=True,
+    )
@@ -0,0 +1,137 @@
+"""Preparação dos dados das camadas pydeck (mapa1.py e Mapa.py).
+
+O JSON do pydeck repete o nome de cada coluna em cada linha e sai
+indentado. As camadas daqui mandam só o necessário: uma posição por parada
+distinta, coordenadas com ``CASAS_COORDENADAS`` casas, chaves de uma letra
+e cores constantes por camada (e não uma expressão avaliada em cada
+linha). ``DeckCompacto`` gera o JSON sem indentação uma única vez.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+from pydeck.bindings.json_tools import default_serialize
+
+LARGURA_BASE = 3  # largura de um trecho atendido por um único serviço
+CASAS_COORDENADAS = 5  # ~1 m; mais casas só aumentam o JSON
+
+
+def trechos_consecutivos(
+    df: pd.DataFrame,
+    chaves,
+    col_seq: str = "SEQUENCIA",
+    col_lat: str = "LAT",
+    col_lon: str = "LON",
+    pular_ausentes: bool = False,
+) -> pd.DataFrame:
+    """Trechos entre paradas consecutivas de todos os grupos de uma vez.
+
+    Colunas de saída: GRUPO (número do grupo em ``chaves``, na ordem do
+    ``groupby``), LON_O, LAT_O, LON_D e LAT_D. Trechos com coordenada
+    ausente são descartados; com ``pular_ausentes``, a parada sem
+    coordenada é que sai, e as vizinhas dela se ligam direto.
+    """
+    grupo = df.groupby(chaves, sort=False).ngroup().to_numpy()
+    seq = df[col_seq].to_numpy(dtype=float)
+    ordem = np.lexsort((seq, grupo))
+    if pular_ausentes:
+        ordem = ordem[df[[col_lat, col_lon]].notna().all(axis=1).to_numpy()[ordem]]
+
+    grupo = grupo[ordem]
+    lat = df[col_lat].to_numpy(dtype=float)[ordem]
+    lon = df[col_lon].to_numpy(dtype=float)[ordem]
+
+    # Cada parada se liga à seguinte quando as duas são do mesmo grupo
+    mesmo_grupo = (grupo[:-1] == grupo[1:]) & (grupo[:-1] >= 0)
+    return pd.DataFrame({
+        "GRUPO": grupo[:-1],
+        "LON_O": lon[:-1], "LAT_O": lat[:-1],
+        "LON_D": lon[1:], "LAT_D": lat[1:],
+    })[mesmo_grupo].dropna()
+
+
+def montar_arestas(
+    df: pd.DataFrame,
+    chaves,
+    col_seq: str = "SEQUENCIA",
+    col_lat: str = "LAT",
+    col_lon: str = "LON",
+) -> pd.DataFrame:
+    """Arestas do mapa: os trechos de ``trechos_consecutivos`` sem repetição.
+
+    Os trechos repetidos (mesmo par de pontos, em qualquer sentido) viram uma
+    única linha com a quantidade de serviços em ``SERVICOS`` e uma
+    ``LARGURA`` proporcional ao log dessa quantidade. Colunas de saída:
+    LON_O, LAT_O, LON_D, LAT_D, SERVICOS e LARGURA.
+    """
+    trechos = trechos_consecutivos(df, chaves, col_seq, col_lat, col_lon).drop(columns="GRUPO")
+
+    # Sentido canônico: IDA e VOLTA do mesmo trecho desenham a mesma linha
+    inverter = (trechos["LON_O"] > trechos["LON_D"]) | (
+        (trechos["LON_O"] == trechos["LON_D"]) & (trechos["LAT_O"] > trechos["LAT_D"])
+    )
+    trechos.loc[inverter, ["LON_O", "LAT_O", "LON_D", "LAT_D"]] = (
+        trechos.loc[inverter, ["LON_D", "LAT_D", "LON_O", "LAT_O"]].to_numpy()
+    )
+
+    arestas = (
+        trechos.groupby(["LON_O", "LAT_O", "LON_D", "LAT_D"], sort=False)
+        .size()
+        .rename("SERVICOS")
+        .reset_index()
+    )
+    arestas["LARGURA"] = LARGURA_BASE + np.log2(arestas["SERVICOS"])
+    return arestas
+
+
+def camada_agrupamentos(pontos: pd.DataFrame, cor, raio_base: float, casas: int = CASAS_COORDENADAS, **estilo) -> pdk.Layer:
+    """ScatterplotLayer dos pontos de ``niveis_detalhe.gerar_nivel``: o raio
+    cresce com o log da quantidade de paradas agrupadas (``raio_base`` para
+    uma parada só) e NOME, quando existe, vai em "nome" para o tooltip (o
+    "t" das camadas é a ponta de destino de ``camada_arestas``)."""
+    posicoes = pontos[["LON", "LAT"]].to_numpy(dtype=float).round(casas).tolist()
+    raios = (raio_base * (1 + np.log2(pontos["PARADAS"].to_numpy(dtype=float)) / 2)).round(1).tolist()
+    dados = [{"p": p, "r": r} for p, r in zip(posicoes, raios)]
+    if "NOME" in pontos.columns:
+        for dado, nome in zip(dados, pontos["NOME"].tolist()):
+            dado["nome"] = nome
+    return pdk.Layer(
+        "ScatterplotLayer",
+        data=dados,
+        get_position="p",
+        get_radius="r",
+        get_fill_color=cor,
+        **estilo,
+    )
+
+
+def camada_arestas(arestas: pd.DataFrame, cor, casas: int = CASAS_COORDENADAS, **estilo) -> pdk.Layer:
+    """LineLayer das arestas de ``montar_arestas`` (largura por aresta)."""
+    origem = arestas[["LON_O", "LAT_O"]].to_numpy(dtype=float).round(casas).tolist()
+    destino = arestas[["LON_D", "LAT_D"]].to_numpy(dtype=float).round(casas).tolist()
+    largura = arestas["LARGURA"].to_numpy(dtype=float).round(2).tolist()
+    return pdk.Layer(
+        "LineLayer",
+        data=[{"s": o, "t": d, "w": w} for o, d, w in zip(origem, destino, largura)],
+        get_source_position="s",
+        get_target_position="t",
+        get_width="w",
+        get_color=cor,
+        **estilo,
+    )
+
+
+class DeckCompacto(pdk.Deck):
+    """``pdk.Deck`` com JSON sem indentação, gerado na primeira chamada de
+    ``to_json`` e reaproveitado depois. Guardado em ``st.cache_resource``,
+    os reruns mandam o texto pronto ao navegador."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._json = None  # None fica fora da própria serialização
+
+    def to_json(self):
+        if self._json is None:
+            self._json = json.dumps(self, sort_keys=True, default=default_serialize, separators=(",", ":"))
+        return self._json
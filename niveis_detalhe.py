@@ -0,0 +1,164 @@
+"""Níveis de detalhe dos mapas de rede (mapa1.py e Mapa.py).
+
+Na escala do país uma parada ocupa menos de um pixel e dezenas de trechos
+se sobrepõem. Para cada zoom de ``ZOOMS_GENERALIZADOS``, as paradas são
+agrupadas numa grade com células de ``PIXELS_CELULA`` pixels (cada grupo
+vira um ponto no centroide, com a quantidade de paradas) e as rotas passam
+a ligar os centroides, simplificadas por Douglas–Peucker com tolerância de
+``PIXELS_TOLERANCIA`` pixels. Trechos que coincidem depois disso viram uma
+aresta só (``montar_arestas``). De ``ZOOM_DETALHE_COMPLETO`` em diante o
+mapa usa as paradas e os trechos originais.
+
+As distâncias são medidas no plano (lon, lat / cos(lat média)), em que um
+pixel do Web Mercator tem o mesmo tamanho nos dois eixos.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from corredores import distancia_ponto_segmento
+from mapas import CASAS_COORDENADAS, montar_arestas
+
+ZOOMS_GENERALIZADOS = (3, 5, 7)
+ZOOM_DETALHE_COMPLETO = 9
+PIXELS_CELULA = 20
+PIXELS_TOLERANCIA = 1.5
+PIXELS_TILE = 256
+
+
+def graus_por_pixel(zoom: float) -> float:
+    """Graus de longitude cobertos por um pixel no ``zoom`` do Web Mercator."""
+    return 360.0 / (PIXELS_TILE * 2.0 ** zoom)
+
+
+def nivel_do_zoom(zoom: float, zooms=ZOOMS_GENERALIZADOS) -> Optional[float]:
+    """Nível usado no ``zoom``: o maior de ``zooms`` que não passa dele
+    (o menor, se o zoom for ainda mais afastado), ou None para o detalhe
+    completo."""
+    if zoom >= ZOOM_DETALHE_COMPLETO:
+        return None
+    abaixo = [z for z in zooms if z <= zoom]
+    return max(abaixo) if abaixo else min(zooms)
+
+
+def douglas_peucker(x, y, grupo, tolerancia: float) -> np.ndarray:
+    """Pontos mantidos pela simplificação de Douglas–Peucker de todas as
+    polilinhas de uma vez. ``grupo`` identifica a polilinha de cada ponto
+    e os pontos de cada uma vêm juntos, na ordem do percurso.
+
+    Cada rodada trata todos os intervalos pendentes: calcula a distância
+    dos pontos internos ao segmento entre as pontas, divide no ponto mais
+    distante quando ele passa da ``tolerancia`` e descarta o resto.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    grupo = np.asarray(grupo)
+    n = len(x)
+    manter = np.zeros(n, dtype=bool)
+    if n == 0:
+        return manter
+    inicio = np.flatnonzero(np.r_[True, grupo[1:] != grupo[:-1]])
+    fim = np.r_[inicio[1:] - 1, n - 1]
+    manter[inicio] = manter[fim] = True
+
+    a, b = inicio, fim
+    while len(a):
+        internos = b - a - 1
+        a, b, internos = a[internos > 0], b[internos > 0], internos[internos > 0]
+        if not len(a):
+            break
+        intervalo = np.repeat(np.arange(len(a)), internos)
+        comeco = np.cumsum(internos) - internos
+        ponto = a[intervalo] + 1 + np.arange(internos.sum()) - comeco[intervalo]
+        distancia = distancia_ponto_segmento(
+            x[ponto], y[ponto], x[a][intervalo], y[a][intervalo], x[b][intervalo], y[b][intervalo]
+        )
+        maior = np.maximum.reduceat(distancia, comeco)
+        # Primeiro ponto com a maior distância de cada intervalo
+        e_maior = distancia == maior[intervalo]
+        primeiro = np.unique(intervalo[e_maior], return_index=True)[1]
+        corte = ponto[e_maior][primeiro]
+
+        dividir = maior > tolerancia
+        manter[corte[dividir]] = True
+        a, b = np.r_[a[dividir], corte[dividir]], np.r_[corte[dividir], b[dividir]]
+    return manter
+
+
+def _nome_do_grupo(nomes: pd.Series) -> str:
+    """Rótulo de um agrupamento de paradas: 'SALVADOR' ou 'SALVADOR e mais 3'."""
+    nomes = nomes.dropna().astype(str).unique()
+    if len(nomes) <= 1:
+        return nomes[0] if len(nomes) else ""
+    return f"{sorted(nomes)[0]} e mais {len(nomes) - 1}"
+
+
+def gerar_nivel(
+    df: pd.DataFrame,
+    chaves,
+    zoom: Optional[float],
+    col_seq: str = "SEQUENCIA",
+    col_lat: str = "LAT",
+    col_lon: str = "LON",
+    col_nome: str = None,
+):
+    """Pontos e arestas do mapa para um nível (``zoom`` None = detalhe completo).
+
+    ``pontos`` tem LON, LAT e PARADAS (paradas distintas no agrupamento),
+    mais NOME quando ``col_nome`` é dado; ``arestas`` segue o formato de
+    ``montar_arestas``, com SERVICOS contando os grupos de ``chaves`` que
+    passam por cada aresta.
+    """
+    df = df.dropna(subset=[col_lat, col_lon])
+    lon = df[col_lon].to_numpy(dtype=float)
+    lat = df[col_lat].to_numpy(dtype=float)
+    posicoes = np.column_stack([lon, lat]).round(CASAS_COORDENADAS)
+    unicas, parada = np.unique(posicoes, axis=0, return_inverse=True)
+    parada = parada.reshape(-1)
+
+    if zoom is None:
+        agrupamento = np.arange(len(unicas))
+    else:
+        escala = 1.0 / np.cos(np.radians(lat.mean())) if len(lat) else 1.0
+        celula = graus_por_pixel(zoom) * PIXELS_CELULA
+        cx = np.floor(unicas[:, 0] / celula)
+        cy = np.floor(unicas[:, 1] * escala / celula)
+        agrupamento = np.unique(np.column_stack([cx, cy]), axis=0, return_inverse=True)[1].reshape(-1)
+
+    quantidade = np.bincount(agrupamento)
+    centro_lon = np.bincount(agrupamento, unicas[:, 0]) / quantidade
+    centro_lat = np.bincount(agrupamento, unicas[:, 1]) / quantidade
+    pontos = pd.DataFrame({
+        "LON": centro_lon.round(CASAS_COORDENADAS),
+        "LAT": centro_lat.round(CASAS_COORDENADAS),
+        "PARADAS": quantidade,
+    })
+    if col_nome is not None:
+        nomes = df[col_nome].astype(object).groupby(agrupamento[parada]).agg(_nome_do_grupo)
+        pontos["NOME"] = nomes.reindex(pontos.index, fill_value="").to_numpy()
+
+    if zoom is None:
+        return pontos, montar_arestas(df, chaves, col_seq, col_lat, col_lon)
+
+    # Rotas pelos centroides, sem repetir o mesmo agrupamento em sequência
+    grupo = df.groupby(chaves, sort=False).ngroup().to_numpy()
+    ordem = np.lexsort((df[col_seq].to_numpy(dtype=float), grupo))
+    grupo, no_ponto = grupo[ordem], agrupamento[parada[ordem]]
+    novo = np.r_[True, (grupo[1:] != grupo[:-1]) | (no_ponto[1:] != no_ponto[:-1])]
+    grupo, no_ponto = grupo[novo], no_ponto[novo]
+    manter = douglas_peucker(
+        centro_lon[no_ponto], centro_lat[no_ponto] * escala, grupo, graus_por_pixel(zoom) * PIXELS_TOLERANCIA
+    )
+    rotas = pd.DataFrame({
+        "GRUPO": grupo[manter],
+        "SEQUENCIA": np.arange(int(manter.sum())),
+        "LAT": pontos["LAT"].to_numpy()[no_ponto[manter]],
+        "LON": pontos["LON"].to_numpy()[no_ponto[manter]],
+    })
+    return pontos, montar_arestas(rotas, "GRUPO")
+
+
+def gerar_niveis(df: pd.DataFrame, chaves, zooms=ZOOMS_GENERALIZADOS, **kwargs) -> Dict[Optional[float], tuple]:
+    """``gerar_nivel`` para cada zoom de ``zooms`` e para o detalhe completo (None)."""
+    return {zoom: gerar_nivel(df, chaves, zoom, **kwargs) for zoom in (*zooms, None)}
@@ -0,0 +1,168 @@
+"""Ocupação do HUB minuto a minuto ao longo da semana (streamlit_app.py).
+
+Cada bloco "HUB" da timeline é uma viagem parada no HUB; os veículos
+parados são os das pernas que chegam e saem nessa parada. O perfil é uma
+varredura única: +peso no minuto de início de cada intervalo, -peso no
+minuto de fim e uma soma acumulada sobre a semana.
+"""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from linha_do_tempo import LIMITE_SEMANA, OPERACAO_HUB, ORDEM_DIAS
+
+EMPRESA_HUB = "HUB"
+
+
+def perfil(inicio_h, duracao_h, pesos=None, horizonte: float = LIMITE_SEMANA) -> np.ndarray:
+    """Soma dos ``pesos`` dos intervalos ativos em cada minuto de
+    [0, ``horizonte``). Intervalos que passam do horizonte continuam no
+    começo, como na timeline."""
+    n_minutos = int(round(horizonte * 60))
+    inicio = np.round(np.asarray(inicio_h, dtype=float) * 60).astype(np.int64)
+    duracao = np.round(np.asarray(duracao_h, dtype=float) * 60).astype(np.int64)
+    pesos = np.ones(len(inicio)) if pesos is None else np.asarray(pesos, dtype=float)
+
+    # Intervalos mais longos que o horizonte ocupam a janela inteira a cada volta
+    voltas, resto = np.divmod(duracao, n_minutos)
+    inicio = inicio % n_minutos
+    fim = inicio + resto
+
+    eventos = np.zeros(n_minutos + 1)
+    np.add.at(eventos, inicio, pesos)
+    dentro = fim <= n_minutos
+    np.add.at(eventos, fim[dentro], -pesos[dentro])
+    # Os que viram o horizonte recomeçam no minuto 0
+    eventos[0] += pesos[~dentro].sum()
+    np.add.at(eventos, fim[~dentro] - n_minutos, -pesos[~dentro])
+    return np.cumsum(eventos[:-1]) + (pesos * voltas).sum()
+
+
+def na_operacao(horas) -> np.ndarray:
+    """Se cada hora da semana está dentro do horário de operação do HUB."""
+    hora_do_dia = np.asarray(horas, dtype=float) % 24
+    return (hora_do_dia >= OPERACAO_HUB[0]) & (hora_do_dia < OPERACAO_HUB[1])
+
+
+def veiculos_por_parada(blocos: pd.DataFrame, empresa_hub: str = EMPRESA_HUB) -> np.ndarray:
+    """Veículos envolvidos em cada bloco do HUB: a perna da mesma viagem que
+    chega quando a parada começa e a que sai quando ela termina (0 a 2)."""
+    hub = blocos["EMPRESA"] == empresa_hub
+    viagem = blocos["VIAGEM"].astype(str)
+    outros = blocos[~hub]
+    chegadas = pd.MultiIndex.from_arrays([viagem[~hub], outros["HORA CHEGADA"]])
+    partidas = pd.MultiIndex.from_arrays([viagem[~hub], outros["HORA PARTIDA"]])
+
+    paradas = blocos[hub]
+    inicio = pd.MultiIndex.from_arrays([viagem[hub], paradas["HORA PARTIDA"]])
+    fim = pd.MultiIndex.from_arrays([viagem[hub], paradas["HORA CHEGADA"]])
+    return inicio.isin(chegadas).astype(np.int64) + fim.isin(partidas).astype(np.int64)
+
+
+def ocupacao_hub(
+    blocos: pd.DataFrame,
+    horizonte: float = LIMITE_SEMANA,
+    empresa_hub: str = EMPRESA_HUB,
+) -> pd.DataFrame:
+    """Viagens e veículos parados no HUB em cada minuto do horizonte.
+
+    ``blocos`` são os da timeline (``IndiceTimeline.blocos`` ou o retorno
+    de ``filtrar``), com HORA_ABSOLUTA e DURACAO_H em horas.
+    """
+    paradas = blocos[blocos["EMPRESA"] == empresa_hub]
+    inicio = paradas["HORA_ABSOLUTA"].to_numpy(dtype=float)
+    duracao = paradas["DURACAO_H"].to_numpy(dtype=float)
+    minutos = np.arange(int(round(horizonte * 60)))
+    return pd.DataFrame({
+        "MINUTO": minutos,
+        "HORA": minutos / 60,
+        "VIAGENS": perfil(inicio, duracao, horizonte=horizonte).astype(np.int64),
+        "VEICULOS": perfil(
+            inicio, duracao, veiculos_por_parada(blocos, empresa_hub), horizonte
+        ).astype(np.int64),
+        "NA_OPERACAO": na_operacao(minutos / 60),
+    })
+
+
+def _posicoes_pico(ocupacao: pd.DataFrame, coluna: str) -> pd.Series:
+    """Linha do primeiro minuto de valor máximo de cada dia."""
+    return ocupacao[coluna].groupby(ocupacao["MINUTO"] // 1440).idxmax()
+
+
+def picos(ocupacao: pd.DataFrame, coluna: str = "VEICULOS") -> pd.DataFrame:
+    """Pico diário de ``coluna`` e quanto do dia teve ocupação fora do
+    horário de operação (minutos e maior valor fora da janela)."""
+    posicao = _posicoes_pico(ocupacao, coluna)
+    pico = ocupacao.loc[posicao]
+    dia = ocupacao["MINUTO"] // 1440
+    fora = ocupacao[coluna].where(~ocupacao["NA_OPERACAO"], 0)
+    minuto = pico["MINUTO"].to_numpy() % 1440
+    return pd.DataFrame({
+        "DIA": [ORDEM_DIAS[d % 7] for d in posicao.index],
+        "PICO": pico[coluna].to_numpy(),
+        "HORARIO_PICO": [f"{m // 60:02d}:{m % 60:02d}" for m in minuto],
+        "PICO_NA_OPERACAO": pico["NA_OPERACAO"].to_numpy(),
+        "MINUTOS_FORA_DA_OPERACAO": (fora > 0).groupby(dia).sum().to_numpy(),
+        "PICO_FORA_DA_OPERACAO": fora.groupby(dia).max().to_numpy(),
+    })
+
+
+def montar_figura_ocupacao(ocupacao: pd.DataFrame, horizonte: float = LIMITE_SEMANA) -> go.Figure:
+    """Painel da ocupação (degraus por minuto) com a faixa de operação do
+    HUB e os picos diários de veículos; picos fora da faixa ficam em vermelho."""
+    fig = go.Figure()
+    for dia in range(int(np.ceil(horizonte / 24))):
+        fig.add_vrect(
+            x0=dia * 24 + OPERACAO_HUB[0],
+            x1=dia * 24 + OPERACAO_HUB[1],
+            fillcolor="rgba(144,238,144,0.2)",
+            line_width=0,
+            layer="below",
+        )
+    for coluna, nome, cor in (("VEICULOS", "Veículos", "firebrick"), ("VIAGENS", "Viagens", "royalblue")):
+        fig.add_trace(
+            go.Scatter(
+                x=ocupacao["HORA"],
+                y=ocupacao[coluna],
+                mode="lines",
+                line=dict(color=cor, width=1.5, shape="hv"),
+                name=nome,
+                hovertemplate="%{y}<extra>" + nome + "</extra>",
+            )
+        )
+
+    # Pico de cada dia
+    pico = ocupacao.loc[_posicoes_pico(ocupacao, "VEICULOS")]
+    pico = pico[pico["VEICULOS"] > 0]
+    fig.add_trace(
+        go.Scatter(
+            x=pico["HORA"],
+            y=pico["VEICULOS"],
+            mode="markers",
+            marker=dict(
+                size=9,
+                color=np.where(pico["NA_OPERACAO"], "black", "red"),
+                symbol="triangle-down",
+            ),
+            name="Pico do dia",
+            hovertemplate="Pico: %{y} veículos<extra></extra>",
+        )
+    )
+
+    x_ticks = list(range(0, int(horizonte) + 1, 6))
+    fig.update_layout(
+        height=260,
+        margin=dict(l=0, r=0, t=30, b=40),
+        xaxis=dict(
+            range=[0, horizonte],
+            tickmode="array",
+            tickvals=x_ticks,
+            ticktext=[f"{ORDEM_DIAS[(h // 24) % 7]} {h % 24}h" if h % 24 == 0 else str(h % 24) for h in x_ticks],
+            tickfont=dict(size=9),
+            title="Horário do Dia",
+        ),
+        yaxis=dict(title="No HUB", rangemode="tozero"),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5),
+        hovermode="x unified",
+    )
+    return fig
@@ -0,0 +1,232 @@
+"""Executa os scripts de preparação na ordem certa, só quando necessário.
+
+Cada etapa declara o script, os arquivos de entrada e os de saída; os
+módulos locais que o script importa também contam como entrada. Uma etapa
+é refeita quando o hash de alguma entrada (incluindo o código) mudou desde
+a última execução, ou quando uma saída sumiu ou foi alterada. Nos .xlsx o
+hash ignora as datas que o ``to_excel`` grava (ver ``leitura.hash_arquivo``),
+então regravar a mesma tabela não invalida as etapas seguintes. Etapas que
+não dependem umas das outras (ramos Itapemirim e Guanabara) rodam em
+paralelo.
+
+Uso:
+    python pipeline.py                # refaz o que estiver desatualizado
+    python pipeline.py --forcar       # refaz tudo
+    python pipeline.py rotas_gua      # só a etapa (e o que ela precisa)
+"""
+import argparse
+import json
+import subprocess
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List
+
+from leitura import hash_com_manifesto, modulos_locais
+
+ARQUIVO_ESTADO = Path(".pipeline_estado.json")
+
+
+@dataclass
+class Etapa:
+    nome: str
+    script: str
+    entradas: List[str]
+    saidas: List[str]
+    # Código extra além dos módulos locais que o script importa (estes são
+    # encontrados por ``modulos_locais``): mudanças nele também invalidam a etapa
+    codigo: List[str] = field(default_factory=list)
+
+    def arquivos_de_entrada(self) -> List[str]:
+        codigo = sorted(set(self.codigo) | modulos_locais(self.script))
+        return [self.script, *codigo, *self.entradas]
+
+
+ETAPAS = [
+    Etapa(
+        "malha",
+        "Formatacao.py",
+        entradas=["18 06 2025 - Malha.xlsx", "linhas_FSA.xlsx", "Coordenadas.xlsx"],
+        saidas=["Malha_Formatada.csv"],
+    ),
+    Etapa(
+        "rotas_gua",
+        "Formatacao_Gua.py",
+        entradas=["QT Guanabara - Maio de 2025.xlsx", "Coordenadas_gua.xlsx"],
+        saidas=["Rotas_Guanabara_Formatadas.xlsx"],
+    ),
+    Etapa(
+        "linhas_gua",
+        "Linhas_selecionadas_Gua.py",
+        entradas=["Rotas_Guanabara_Formatadas.xlsx"],
+        saidas=["Linhas_selecionadas_Gua.xlsx"],
+    ),
+    Etapa(
+        "rotas_gua_meses",
+        "Formatacao_Gua_Meses.py",
+        # Mesmo padrão de Formatacao_Gua_Meses.PADRAO_QT: um QT novo entra como entrada nova
+        entradas=[*sorted(str(a) for a in Path(".").glob("QT Guanabara - *.xlsx")), "Coordenadas_gua.xlsx"],
+        saidas=["Rotas_Guanabara_Meses.xlsx"],
+    ),
+    Etapa(
+        "jornadas_fsa",
+        "Jornadas_FSA.py",
+        entradas=["Malha_Formatada.csv", "Rotas_Guanabara_Formatadas.xlsx"],
+        saidas=["Jornadas_via_FSA.xlsx"],
+    ),
+    # Relatório: só imprime a tabela, que o runner repassa quando a malha muda
+    Etapa(
+        "horarios_fsa",
+        "Horarios_FSA.py",
+        entradas=["Malha_Formatada.csv"],
+        saidas=[],
+    ),
+]
+
+
+def _hashes(arquivos: List[str]) -> Dict[str, str]:
+    return {a: hash_com_manifesto(a) if Path(a).exists() else None for a in arquivos}
+
+
+def carregar_estado(caminho: Path = ARQUIVO_ESTADO) -> dict:
+    if caminho.exists():
+        try:
+            return json.loads(caminho.read_text(encoding="utf-8"))
+        except ValueError:
+            pass
+    return {}
+
+
+def dependencias(etapas: List[Etapa]) -> Dict[str, List[str]]:
+    """Etapas que produzem alguma entrada de cada etapa."""
+    produtor = {saida: e.nome for e in etapas for saida in e.saidas}
+    return {
+        e.nome: sorted({produtor[a] for a in e.entradas if a in produtor} - {e.nome})
+        for e in etapas
+    }
+
+
+def motivo_para_refazer(etapa: Etapa, estado: dict) -> str:
+    """Motivo pelo qual a etapa está desatualizada ('' se estiver em dia)."""
+    anterior = estado.get(etapa.nome)
+    if anterior is None:
+        return "nunca executada"
+    for arquivo in etapa.saidas:
+        if not Path(arquivo).exists():
+            return f"saída ausente: {arquivo}"
+    entradas = _hashes(etapa.arquivos_de_entrada())
+    removidas = sorted(set(anterior["entradas"]) - set(entradas))
+    if removidas:
+        return f"entrada removida: {removidas[0]}"
+    for arquivo, h in entradas.items():
+        if h is None:
+            raise FileNotFoundError(f"Entrada da etapa '{etapa.nome}' não encontrada: {arquivo}")
+        if anterior["entradas"].get(arquivo) != h:
+            return f"entrada alterada: {arquivo}"
+    for arquivo, h in _hashes(etapa.saidas).items():
+        if anterior["saidas"].get(arquivo) != h:
+            return f"saída alterada: {arquivo}"
+    return ""
+
+
+def executar_etapa(etapa: Etapa) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, etapa.script], capture_output=True, text=True
+    )
+
+
+def executar(
+    etapas: List[Etapa] = ETAPAS,
+    alvos: List[str] = None,
+    forcar: bool = False,
+    processos: int = 2,
+    caminho_estado: Path = ARQUIVO_ESTADO,
+) -> bool:
+    """Roda as etapas desatualizadas respeitando as dependências.
+
+    Retorna False se alguma etapa falhar; as que dependem dela não rodam.
+    """
+    por_nome = {e.nome: e for e in etapas}
+    deps = dependencias(etapas)
+
+    # Restringe aos alvos pedidos e a tudo de que eles dependem
+    selecionadas = set(por_nome)
+    if alvos:
+        selecionadas = set()
+        pendentes = list(alvos)
+        while pendentes:
+            nome = pendentes.pop()
+            if nome not in por_nome:
+                raise KeyError(f"Etapa desconhecida: {nome}")
+            if nome not in selecionadas:
+                selecionadas.add(nome)
+                pendentes.extend(deps[nome])
+
+    estado = carregar_estado(caminho_estado)
+    trava = threading.Lock()
+    concluidas, falhas = set(), set()
+    em_execucao = {}
+
+    def prontas():
+        return [
+            nome for nome in sorted(selecionadas)
+            if nome not in concluidas and nome not in falhas and nome not in em_execucao.values()
+            and all(d in concluidas or d not in selecionadas for d in deps[nome])
+            and not any(d in falhas for d in deps[nome])
+        ]
+
+    def registrar(etapa: Etapa) -> None:
+        with trava:
+            estado[etapa.nome] = {
+                "entradas": _hashes(etapa.arquivos_de_entrada()),
+                "saidas": _hashes(etapa.saidas),
+            }
+            tmp = caminho_estado.with_suffix(".tmp")
+            tmp.write_text(json.dumps(estado, indent=2, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(caminho_estado)
+
+    with ThreadPoolExecutor(max_workers=max(1, processos)) as pool:
+        while True:
+            for nome in prontas():
+                etapa = por_nome[nome]
+                motivo = "forçada" if forcar else motivo_para_refazer(etapa, estado)
+                if not motivo:
+                    print(f"[{nome}] em dia")
+                    concluidas.add(nome)
+                    continue
+                print(f"[{nome}] executando {etapa.script} ({motivo})")
+                em_execucao[pool.submit(executar_etapa, etapa)] = nome
+            if not em_execucao:
+                if not prontas():
+                    break
+                continue
+
+            feitas, _ = wait(list(em_execucao), return_when=FIRST_COMPLETED)
+            for futuro in feitas:
+                nome = em_execucao.pop(futuro)
+                resultado = futuro.result()
+                if resultado.returncode == 0:
+                    registrar(por_nome[nome])
+                    concluidas.add(nome)
+                    print(f"[{nome}] concluída")
+                    if not por_nome[nome].saidas:
+                        print(resultado.stdout, end="")
+                else:
+                    falhas.add(nome)
+                    print(f"[{nome}] falhou:\n{resultado.stderr}", file=sys.stderr)
+
+    nao_executadas = selecionadas - concluidas - falhas
+    for nome in sorted(nao_executadas):
+        print(f"[{nome}] não executada (dependência falhou)", file=sys.stderr)
+    return not falhas and not nao_executadas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa as etapas desatualizadas da preparação dos dados.")
+    parser.add_argument("etapas", nargs="*", help="etapas a executar (padrão: todas)")
+    parser.add_argument("--forcar", action="store_true", help="refaz as etapas mesmo em dia")
+    parser.add_argument("--processos", type=int, default=2, help="etapas simultâneas (padrão: 2)")
+    args = parser.parse_args()
+    sys.exit(0 if executar(alvos=args.etapas, forcar=args.forcar, processos=args.processos) else 1)
@@ -0,0 +1,304 @@
+"""Ordenação em lote das paradas das linhas (Formatacao_Gua.py).
+
+Todas as paradas de todas as rotas são projetadas de uma vez no vetor
+origem -> destino da própria rota e ordenadas por um único ``lexsort``
+agrupado, em vez de uma chave Python por parada dentro de cada grupo.
+Para arquivos grandes (vários meses), as rotas podem ser divididas em
+fatias processadas em paralelo (``processos``).
+"""
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from coordenadas import IndiceCoordenadas
+
+CHAVES_ROTA = ["PREFIXO", "DESCRICAO DA LINHA"]
+COLUNAS_SAIDA = ["PREFIXO", "DESCRICAO DA LINHA", "CIDADES", "LAT", "LON", "SENTIDO", "SEQUENCIA"]
+
+
+def _vetor_unitario(lat, lon) -> np.ndarray:
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def projetar(lat, lon, lat_o, lon_o, lat_d, lon_d, esferico: bool = False) -> np.ndarray:
+    """Posição de cada ponto ao longo do trajeto origem -> destino.
+
+    Retorna 0 na origem e 1 no destino. No modo plano é a projeção no vetor
+    (lat, lon), como o antigo ``param_along``; no modo esférico é a distância
+    ao longo do grande círculo, dividida pelo comprimento do trajeto, o que
+    evita distorções em linhas longas no sentido norte-sul. Pontos sem
+    coordenada ou rotas degeneradas recebem ``inf``.
+    """
+    lat, lon, lat_o, lon_o, lat_d, lon_d = (
+        np.asarray(v, dtype=float) for v in (lat, lon, lat_o, lon_o, lat_d, lon_d)
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if esferico:
+            a = _vetor_unitario(lat_o, lon_o)
+            b = _vetor_unitario(lat_d, lon_d)
+            p = _vetor_unitario(lat, lon)
+            normal = np.cross(a, b)
+            seno = np.linalg.norm(normal, axis=-1)
+            normal = normal / seno[..., None]
+            # Projeta o ponto no plano do grande círculo e mede o ângulo a partir da origem
+            plano = p - np.sum(p * normal, axis=-1)[..., None] * normal
+            angulo = np.arctan2(np.sum(np.cross(a, plano) * normal, axis=-1), np.sum(a * plano, axis=-1))
+            total = np.arctan2(seno, np.sum(a * b, axis=-1))
+            t = np.where(seno > 0, angulo / total, np.inf)
+        else:
+            vx = lat_d - lat_o
+            vy = lon_d - lon_o
+            denom = vx * vx + vy * vy
+            t = np.where(
+                denom != 0,
+                ((lat - lat_o) * vx + (lon - lon_o) * vy) / denom,
+                np.inf,
+            )
+    return np.where(np.isnan(t), np.inf, t)
+
+
+def extremos_da_descricao(descricoes) -> pd.DataFrame:
+    """Origem e destino de cada descrição 'ORIGEM - DESTINO - ...'.
+
+    Cada descrição distinta é separada uma única vez; descrições com menos
+    de duas partes ficam com origem/destino nulos."""
+    descricoes = pd.Series(descricoes, dtype=object)
+    unicas = descricoes.drop_duplicates()
+    partes = unicas.map(lambda d: [p.strip() for p in str(d).split(" - ")[:2]])
+    extremos = pd.DataFrame({
+        "ORIGEM": partes.map(lambda p: p[0] if len(p) >= 2 else None).to_numpy(),
+        "DESTINO": partes.map(lambda p: p[1] if len(p) >= 2 else None).to_numpy(),
+    }, index=unicas.to_numpy())
+    return extremos.reindex(descricoes.to_numpy()).reset_index(drop=True)
+
+
+def sequenciar_rotas(
+    rotas: pd.DataFrame,
+    indice: IndiceCoordenadas,
+    esferico: bool = False,
+    limiar_aproximado: Optional[float] = None,
+    processos: Optional[int] = 1,
+) -> pd.DataFrame:
+    """Ordena as cidades de todas as rotas e numera a sequência.
+
+    ``rotas`` deve ter PREFIXO, DESCRICAO DA LINHA, ORIGEM e DESTINO já
+    normalizados (``format_city``). As cidades de cada rota são as ORIGEM
+    seguidas das DESTINO, na ordem do arquivo, sem repetição; a origem e o
+    destino da descrição entram se faltarem. A ordenação é estável, então
+    empates mantêm essa ordem, como no ``sorted`` por grupo. Com
+    ``limiar_aproximado``, cidades sem correspondência exata no índice são
+    buscadas por similaridade. Com ``processos`` > 1 (None = todos os
+    núcleos) o trabalho é dividido entre processos; o resultado é idêntico.
+    """
+    rotas = rotas.dropna(subset=CHAVES_ROTA)
+    if processos is None:
+        processos = os.cpu_count() or 1
+    if processos > 1:
+        return _sequenciar_em_paralelo(rotas, indice, esferico, limiar_aproximado, processos)
+
+    grupos = rotas.groupby(CHAVES_ROTA, sort=True)
+    rota_da_linha = grupos.ngroup().to_numpy()
+    chaves = grupos.size().index
+    n_rotas = len(chaves)
+
+    extremos = extremos_da_descricao(chaves.get_level_values(1))
+    valida = extremos["ORIGEM"].notna().to_numpy()
+    origem_desc = extremos["ORIGEM"].to_numpy(dtype=object)
+    destino_desc = extremos["DESTINO"].to_numpy(dtype=object)
+
+    # Paradas: todas as ORIGEM da rota e depois todas as DESTINO
+    n = len(rotas)
+    paradas = pd.DataFrame({
+        "rota": np.concatenate([rota_da_linha, rota_da_linha]),
+        "cidade": np.concatenate([
+            rotas["ORIGEM"].to_numpy(dtype=object),
+            rotas["DESTINO"].to_numpy(dtype=object),
+        ]),
+        "coluna": np.repeat([0, 1], n),
+        "linha": np.tile(np.arange(n), 2),
+    })
+    paradas = paradas[paradas["cidade"].notna() & valida[paradas["rota"].to_numpy()]]
+    paradas = paradas.sort_values(["rota", "coluna", "linha"], kind="stable")
+    paradas = paradas.drop_duplicates(["rota", "cidade"], keep="first")
+
+    # Origem/destino da descrição que não aparecem nas seções da rota
+    existentes = pd.MultiIndex.from_frame(paradas[["rota", "cidade"]])
+    ids = np.flatnonzero(valida)
+    tem_origem = pd.MultiIndex.from_arrays([ids, origem_desc[ids]]).isin(existentes)
+    tem_destino = pd.MultiIndex.from_arrays([ids, destino_desc[ids]]).isin(existentes)
+    tem_destino |= destino_desc[ids] == origem_desc[ids]
+    extras = pd.DataFrame({
+        "rota": np.concatenate([ids[~tem_origem], ids[~tem_destino]]),
+        "cidade": np.concatenate([origem_desc[ids][~tem_origem], destino_desc[ids][~tem_destino]]),
+        "coluna": np.repeat([-1, 2], [(~tem_origem).sum(), (~tem_destino).sum()]),
+        "linha": 0,
+    })
+    paradas = pd.concat([paradas, extras], ignore_index=True)
+
+    # Projeção de todas as paradas de uma vez
+    rota = paradas["rota"].to_numpy()
+    lat, lon = indice.buscar(paradas["cidade"], limiar_aproximado)
+    lat_o, lon_o = indice.buscar(origem_desc, limiar_aproximado)
+    lat_d, lon_d = indice.buscar(destino_desc, limiar_aproximado)
+    t = projetar(lat, lon, lat_o[rota], lon_o[rota], lat_d[rota], lon_d[rota], esferico)
+
+    # Ordenação agrupada: rota, posição projetada e ordem de entrada
+    ordem = np.lexsort((paradas["linha"].to_numpy(), paradas["coluna"].to_numpy(), t, rota))
+    rota = rota[ordem]
+    cidades = paradas["cidade"].to_numpy(dtype=object)[ordem]
+
+    inicio_rota = np.r_[True, rota[1:] != rota[:-1]] if len(rota) else np.empty(0, dtype=bool)
+    posicao_inicio = np.maximum.accumulate(np.where(inicio_rota, np.arange(len(rota)), 0))
+    sequencia = np.arange(len(rota)) - posicao_inicio + 1
+
+    primeira = np.full(n_rotas, None, dtype=object)
+    primeira[rota[inicio_rota]] = cidades[inicio_rota]
+    sentido = np.where(primeira == origem_desc, "IDA", "VOLTA")
+
+    return pd.DataFrame({
+        "PREFIXO": chaves.get_level_values(0).to_numpy(dtype=object)[rota],
+        "DESCRICAO DA LINHA": chaves.get_level_values(1).to_numpy(dtype=object)[rota],
+        "CIDADES": cidades,
+        "LAT": lat[ordem],
+        "LON": lon[ordem],
+        "SENTIDO": sentido[rota],
+        "SEQUENCIA": sequencia,
+    }, columns=COLUNAS_SAIDA)
+
+
+# === EXECUÇÃO EM PARALELO ===
+FATIAS_POR_PROCESSO = 4  # fatias menores equilibram processos com rotas de tamanhos diferentes
+
+# Índice de coordenadas de cada processo do pool, recebido uma única vez
+# na inicialização em vez de ir junto com cada fatia
+_indice_do_processo: Optional[IndiceCoordenadas] = None
+
+
+def _iniciar_processo(indice: IndiceCoordenadas) -> None:
+    global _indice_do_processo
+    _indice_do_processo = indice
+
+
+def _sequenciar_fatia(rotas: pd.DataFrame, esferico: bool, limiar_aproximado: Optional[float]) -> pd.DataFrame:
+    return sequenciar_rotas(rotas, _indice_do_processo, esferico, limiar_aproximado)
+
+
+def _sequenciar_em_paralelo(
+    rotas: pd.DataFrame,
+    indice: IndiceCoordenadas,
+    esferico: bool,
+    limiar_aproximado: Optional[float],
+    processos: int,
+) -> pd.DataFrame:
+    """Divide as rotas em fatias de grupos inteiros, na ordem das chaves, e
+    junta os resultados na mesma ordem: a saída é igual à da execução serial."""
+    grupo = rotas.groupby(CHAVES_ROTA, sort=True).ngroup().to_numpy()
+    n_grupos = int(grupo.max()) + 1 if len(grupo) else 0
+    n_fatias = min(n_grupos, processos * FATIAS_POR_PROCESSO)
+    if n_fatias < 2:
+        return sequenciar_rotas(rotas, indice, esferico, limiar_aproximado)
+
+    limites = np.linspace(0, n_grupos, n_fatias + 1).astype(np.int64)
+    fatia = np.searchsorted(limites, grupo, side="right") - 1
+    ordem = np.argsort(fatia, kind="stable")
+    cortes = np.searchsorted(fatia[ordem], np.arange(1, n_fatias))
+    fatias = [rotas.iloc[posicoes] for posicoes in np.split(ordem, cortes)]
+
+    with ProcessPoolExecutor(
+        max_workers=min(processos, n_fatias),
+        initializer=_iniciar_processo,
+        initargs=(indice,),
+    ) as pool:
+        resultados = list(pool.map(
+            _sequenciar_fatia, fatias, repeat(esferico), repeat(limiar_aproximado)
+        ))
+    return pd.concat(resultados, ignore_index=True)
+
+
+# === VÁRIOS MESES ===
+COLUNAS_IMPRESSAO = ["ORIGEM", "DESTINO"]
+
+
+def impressoes_das_rotas(rotas: pd.DataFrame) -> pd.Series:
+    """Impressão digital do conteúdo de cada rota, indexada pelas chaves.
+
+    Leva em conta as chaves e as seções (ORIGEM, DESTINO) na ordem do
+    arquivo, que é tudo o que o sequenciamento usa: rotas com a mesma
+    impressão produzem a mesma sequência.
+    """
+    rotas = rotas.dropna(subset=CHAVES_ROTA)
+    grupos = rotas.groupby(CHAVES_ROTA, sort=True)
+    grupo = grupos.ngroup().to_numpy()
+    linhas = pd.util.hash_pandas_object(
+        rotas[CHAVES_ROTA + COLUNAS_IMPRESSAO], index=False
+    ).to_numpy()
+    ordem = np.argsort(grupo, kind="stable")
+    cortes = np.flatnonzero(np.diff(grupo[ordem])) + 1
+    impressoes = [
+        hashlib.blake2b(linhas[posicoes].tobytes(), digest_size=16).hexdigest()
+        for posicoes in np.split(ordem, cortes)
+    ] if len(grupo) else []
+    return pd.Series(impressoes, index=grupos.size().index, name="IMPRESSAO", dtype=object)
+
+
+def sequenciar_meses(
+    rotas_por_mes: Dict[str, pd.DataFrame],
+    indice: IndiceCoordenadas,
+    esferico: bool = False,
+    limiar_aproximado: Optional[float] = None,
+    processos: Optional[int] = 1,
+) -> pd.DataFrame:
+    """Sequencia vários meses de QT em uma tabela única com a coluna MES.
+
+    Cada rota é identificada pela impressão do seu conteúdo: uma rota que
+    não mudou desde um mês anterior reaproveita a sequência já calculada, e
+    só as rotas novas ou alteradas de cada mês passam por
+    ``sequenciar_rotas``. A coluna ALTERADA indica se a rota é diferente
+    da do mês anterior (ou se não existia nele).
+    """
+    calculadas = []
+    vistas = set()
+    tabelas = []
+    anterior = pd.Series(dtype=object)
+    for mes, rotas in rotas_por_mes.items():
+        rotas = rotas.dropna(subset=CHAVES_ROTA)
+        impressoes = impressoes_das_rotas(rotas)
+
+        novas = ~impressoes.isin(vistas)
+        if novas.any():
+            chaves_novas = impressoes.index[novas.to_numpy()]
+            linha_nova = pd.MultiIndex.from_frame(rotas[CHAVES_ROTA]).isin(chaves_novas)
+            resultado = sequenciar_rotas(
+                rotas[linha_nova], indice, esferico, limiar_aproximado, processos
+            )
+            chaves_resultado = pd.MultiIndex.from_frame(resultado[CHAVES_ROTA])
+            resultado.insert(0, "IMPRESSAO", impressoes.reindex(chaves_resultado).to_numpy())
+            calculadas.append(resultado)
+            vistas.update(impressoes[novas])
+
+        do_mes = impressoes.rename_axis(CHAVES_ROTA).reset_index()
+        do_mes["ALTERADA"] = ~do_mes["IMPRESSAO"].isin(anterior)
+        tabelas.append((mes, do_mes))
+        anterior = impressoes
+
+    todas = pd.concat(calculadas, ignore_index=True) if calculadas else pd.DataFrame(
+        columns=["IMPRESSAO", *COLUNAS_SAIDA]
+    )
+    partes = []
+    for mes, do_mes in tabelas:
+        tabela = do_mes[["IMPRESSAO", "ALTERADA"]].merge(
+            todas, on="IMPRESSAO", how="inner", sort=False
+        )
+        tabela.insert(0, "MES", mes)
+        partes.append(tabela)
+    colunas = ["MES", *COLUNAS_SAIDA, "ALTERADA", "IMPRESSAO"]
+    if not partes:
+        return pd.DataFrame(columns=colunas)
+    return pd.concat(partes, ignore_index=True)[colunas]
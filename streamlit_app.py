@@ -1,393 +1,139 @@
-import streamlit as st
-import pandas as pd
 import plotly.graph_objects as go
-from datetime import datetime
+import plotly.io as pio
+import streamlit as st
+
+from conexoes import ESPERA_MAXIMA_MIN, ESPERA_MINIMA_MIN, IndiceConexoes
+from esquema import compactar, relatorio_memoria
+from leitura import hash_com_manifesto, ler_excel
+from ocupacao import montar_figura_ocupacao, ocupacao_hub, picos
+from linha_do_tempo import (
+    COLUNAS_PLANILHA,
+    LEGENDA_OBS,
+    LIMIAR_TEXTO,
+    LIMIAR_WEBGL,
+    LIMITE_SEMANA,
+    ORDEM_DIAS,
+    VIAGENS_POR_PAGINA,
+    IndiceTimeline,
+    adicionar_conexoes,
+    figura_serializada,
+    normalizar_filtros,
+    paginar_viagens,
+    quebrar_viagem,
+)
+
+CAMINHO_PLANILHA = "Planejamento operacional.xlsx"
 
 # === CONFIGURAÇÃO STREAMLIT ===
 st.set_page_config(layout="wide")
 st.title("🕒 Timeline Operacional - HUB FSA - ITAPEMIRIM + GUANABARA")
 
-# === CONSTANTES ===
-CORES = {"GUANABARA": "royalblue", "ITAPEMIRIM": "gold", "HUB": "firebrick"}
-ORDEM_DIAS = ["QUA", "QUI", "SEX", "SÁB", "DOM", "SEG", "TER"]
-LIMIAR_TEXTO = 9  # horas
-
-@st.cache_data
-def load_data(path: str):
-    """Carrega a planilha e prepara as colunas utilizadas no gráfico."""
-    df = pd.read_excel(path)
-    df["HORA PARTIDA"] = pd.to_datetime(df["HORA PARTIDA"])
-    df["HORA CHEGADA"] = pd.to_datetime(df["HORA CHEGADA"])
-    df["DURACAO_H"] = (
-        df["HORA CHEGADA"] - df["HORA PARTIDA"]
-    ).dt.total_seconds() / 3600
-    df = df[df["DURACAO_H"] > 0].copy()
-
-    # Calcula a diferença, em horas, entre a primeira quarta-feira e cada
-    # horário de partida para manter a continuidade mesmo após a troca de semana
-    primeira_data = df["HORA PARTIDA"].min().normalize()
-    dias_ate_quarta = (primeira_data.weekday() - 2) % 7
-    quarta_inicial = primeira_data - pd.Timedelta(days=dias_ate_quarta)
-    df["HORA_ABSOLUTA"] = (
-        (df["HORA PARTIDA"] - quarta_inicial).dt.total_seconds() / 3600
-    )
-    df["COR"] = df["EMPRESA"].map(CORES).fillna("gray")
-
-    dia_col = "DIA SEMANA" if "DIA SEMANA" in df.columns else "DIA SEMANA PARTIDA"
-    viagem_dia = df.groupby("VIAGEM")[dia_col].first().str.upper()
-    viagens_ordenadas = sorted(
-        viagem_dia.index, key=lambda v: ORDEM_DIAS.index(viagem_dia.loc[v])
-    )
-    df["VIAGEM"] = pd.Categorical(
-        df["VIAGEM"], categories=viagens_ordenadas, ordered=True
-    )
-    df.sort_values("VIAGEM", inplace=True)
-    return df, viagens_ordenadas
-
-df, viagens_ordenadas = load_data("Planejamento operacional.xlsx")
-
-# Considera apenas os primeiros 10 dias (de quarta a sexta da semana seguinte)
-
-
-# Divide os blocos que ultrapassam o final da terça-feira (168h)
-LIMITE_SEMANA = 168  # 7 dias * 24 horas
-df_quebrado = []
+@st.cache_resource(max_entries=2, show_spinner=False)
+def carregar_planilha(path: str, hash_planilha: str):
+    """Colunas usadas da planilha, no esquema compacto (ver esquema.py).
 
-for _, row in df.iterrows():
-    hora_ini = row["HORA_ABSOLUTA"]
-    dur = row["DURACAO_H"]
-    hora_fim = hora_ini + dur
+    ``hash_planilha`` só entra na chave do cache: se o arquivo mudar, relê."""
+    return compactar(ler_excel(path, colunas=COLUNAS_PLANILHA, ignorar_ausentes=True))
 
-    if hora_ini < LIMITE_SEMANA and hora_fim <= LIMITE_SEMANA:
-        # Bloco totalmente dentro da semana
-        df_quebrado.append(row)
-        row["BLOCO_QUEBRADO"] = "completo"
 
+@st.cache_resource(max_entries=4, show_spinner=False)
+def carregar_indice(path: str, hash_planilha: str, horizonte) -> IndiceTimeline:
+    """Prepara os blocos da planilha e monta os índices dos filtros."""
+    return IndiceTimeline.de_planilha(carregar_planilha(path, hash_planilha), horizonte)
 
-    elif hora_ini < LIMITE_SEMANA and hora_fim > LIMITE_SEMANA:
-        # Bloco que cruza terça — quebrar em dois
-        parte1 = row.copy()
-        parte1["DURACAO_H"] = LIMITE_SEMANA - hora_ini
-        parte1["BLOCO_QUEBRADO"] = "final"
-        df_quebrado.append(parte1)
-        
-        parte2 = row.copy()
-        parte2["HORA_ABSOLUTA"] = 0
-        parte2["DURACAO_H"] = hora_fim - LIMITE_SEMANA
-        parte2["BLOCO_QUEBRADO"] = "inicio"
-        df_quebrado.append(parte2)
 
-    elif hora_ini >= LIMITE_SEMANA:
-        # Bloco que começa após terça — realocar na esquerda
-        parte = row.copy()
-        parte["HORA_ABSOLUTA"] = hora_ini - LIMITE_SEMANA
-        df_quebrado.append(parte)
+@st.cache_resource(max_entries=2, show_spinner=False)
+def carregar_conexoes(path: str, hash_planilha: str) -> IndiceConexoes:
+    """Chegadas e partidas ordenadas para a busca de conexões."""
+    return IndiceConexoes.de_planilha(carregar_planilha(path, hash_planilha))
 
-df = pd.DataFrame(df_quebrado)
 
+@st.cache_resource(max_entries=32, show_spinner=False)
+def carregar_figura(path: str, hash_planilha: str, horizonte, filtros, limiar, pagina, por_pagina):
+    """Figura pronta, compartilhada entre sessões e usuários.
 
+    O JSON vem do cache em disco (``figura_serializada``); a figura só é
+    montada de novo quando a planilha ou alguma opção muda."""
+    indice = carregar_indice(path, hash_planilha, horizonte)
+    texto = figura_serializada(
+        path, horizonte, filtros, limiar, pagina, por_pagina, indice=indice
+    )
+    return pio.from_json(texto, skip_invalid=True)
 
 
+hash_planilha = hash_com_manifesto(CAMINHO_PLANILHA)
 
-# Todos os blocos são tratados de maneira única
-df["PARTE"] = 0
-
-# Define qual coluna de dia da semana usar
-dia_col = "DIA SEMANA" if "DIA SEMANA" in df.columns else "DIA SEMANA PARTIDA"
-import re
-
-def quebrar_viagem(texto):
-    texto = re.sub(r"\s&\s", "<br>& ", texto, count=1)   # quebra no primeiro "&"
-    texto = texto.replace(' - "', '<br>"')               # quebra antes da hora
-    return texto
-
-df["VIAGEM"] = df["VIAGEM"].astype(str).apply(quebrar_viagem)
-
-
-# Recalcula os ordenamentos com os nomes já formatados
-
+# === OPÇÕES DE VISUALIZAÇÃO ===
+horizonte = st.sidebar.number_input("Horizonte (h)", min_value=24, value=LIMITE_SEMANA, step=24)
+indice = carregar_indice(CAMINHO_PLANILHA, hash_planilha, horizonte)
 
-# Agrupar por viagem para obter o dia da semana e o horário de partida
-# Converte a hora para valor decimal (ex: 13:30 → 13.5)
-df["HORA_VIAGEM_DECIMAL"] = df["HORA VIAGEM"].apply(
-    lambda x: x.hour + x.minute / 60 if pd.notnull(x) else None
+st.sidebar.header("Filtros")
+todas_empresas = sorted(indice.blocos["EMPRESA"].dropna().unique())
+empresas = st.sidebar.multiselect("Empresas", todas_empresas, default=todas_empresas)
+dias = st.sidebar.multiselect("Dias da semana", ORDEM_DIAS, default=ORDEM_DIAS)
+obs = st.sidebar.multiselect(
+    "OBS", sorted(LEGENDA_OBS), default=sorted(LEGENDA_OBS), format_func=LEGENDA_OBS.get
 )
+janela = st.sidebar.slider("Horário de partida da viagem", 0.0, 24.0, (0.0, 24.0), step=0.5)
+limiar = st.sidebar.number_input("Duração mínima para os dois textos (h)", min_value=0, value=LIMIAR_TEXTO)
 
-# Agrupa por VIAGEM e extrai o dia e hora decimal
-viagem_info = df.groupby("VIAGEM").agg({
-    dia_col: lambda x: x.iloc[0].upper(),
-    "HORA_VIAGEM_DECIMAL": "first"
-})
-
-# Ordena por dia e hora
-viagem_info["ORD_DIA"] = viagem_info[dia_col].apply(lambda d: ORDEM_DIAS.index(d))
-viagem_info = viagem_info.sort_values(["ORD_DIA", "HORA_VIAGEM_DECIMAL"])
-
-# Gera a nova ordenação
-viagens_ordenadas = viagem_info.index.tolist()
-
-
-
-
-df["VIAGEM"] = pd.Categorical(df["VIAGEM"], categories=viagens_ordenadas, ordered=True)
-
-# === GRÁFICO ===
-fig = go.Figure()
-
-# 0. Camada de fundo levemente opaca para bloquear a grade atrás dos blocos
-for empresa, grupo in df.groupby("EMPRESA"):
-    fig.add_trace(
-        go.Bar(
-            x=grupo["DURACAO_H"],
-            y=grupo["VIAGEM"],
-            base=grupo["HORA_ABSOLUTA"],
-            orientation="h",
-            marker=dict(
-                color="rgba(0,0,0,0.4)",  # tom escuro translúcido — pode ajustar
-                line=dict(width=0)
-            ),
-            width=0.50,  # levemente maior que os blocos reais
-            showlegend=False,
-            hoverinfo="skip",
-            xaxis="x2"
-        )
-    )
-
-
-# 1. Desenha os retângulos
-for empresa, grupo in df.groupby("EMPRESA"):
-    fig.add_trace(
-        go.Bar(
-            x=grupo["DURACAO_H"],
-            y=grupo["VIAGEM"],
-            base=grupo["HORA_ABSOLUTA"],
-            orientation="h",
-            marker=dict(
-                color=CORES.get(empresa, "gray"),
-                line=dict(
-                    color="black" if empresa != "HUB" else "rgba(0,0,0,0)",
-                    width=1 if empresa != "HUB" else 0
-                )
-            ),
-            name=empresa,
-            legendgroup=empresa,
-            width=0.35 if empresa != "HUB" else 1,
-            customdata=grupo[["ORIGEM", "DESTINO", "HORA PARTIDA", "HORA CHEGADA"]],
-            hovertemplate=(
-                "<b>%{y}</b><br>" +
-                "Origem: %{customdata[0]} → %{customdata[1]}<br>" +
-                "Início: %{customdata[2]|%d/%m %H:%M}<br>" +
-                "Fim: %{customdata[3]|%d/%m %H:%M}<br>" +
-                "Duração: %{x:.1f}h"
-        ),
-            xaxis="x2",
-        )
+with st.sidebar.expander("Memória das tabelas"):
+    st.dataframe(
+        relatorio_memoria({"planilha": carregar_planilha(CAMINHO_PLANILHA, hash_planilha)}),
+        hide_index=True,
     )
 
-# 2. Textos para dentro dos blocos — com exceção "SPO" para blocos curtos
-textos_esquerda = []
-textos_direita = []
-
-for idx, row in df.iterrows():
-    dur = row["DURACAO_H"]
-    sentido = str(row.get("SENTIDO", "")).upper().strip()
-    tipo_quebra = row.get("BLOCO_QUEBRADO", "completo")
-
-    if dur < LIMIAR_TEXTO:
-        if sentido == "IDA":
-            textos_esquerda.append("")
-            textos_direita.append(row["DESTINO"])
-        elif sentido == "VOLTA":
-            textos_esquerda.append(row["ORIGEM"])
-            textos_direita.append("")
-        else:
-            textos_esquerda.append("")
-            textos_direita.append("")
-    else:
-        if tipo_quebra == "inicio":
-            textos_esquerda.append("")
-            textos_direita.append(row["DESTINO"])
-        elif tipo_quebra == "final":
-            textos_esquerda.append(row["ORIGEM"])
-            textos_direita.append("")
-        else:
-            textos_esquerda.append(row["ORIGEM"])
-            textos_direita.append(row["DESTINO"])
-
+# Filtros que não restringem nada ficam de fora (e da chave do cache)
+filtros = normalizar_filtros({
+    "empresas": None if set(empresas) == set(todas_empresas) else empresas,
+    "dias": None if set(dias) == set(ORDEM_DIAS) else dias,
+    "obs": None if set(obs) == set(LEGENDA_OBS) else obs,
+    "janela": None if janela == (0.0, 24.0) else janela,
+})
+blocos_filtrados, viagens_filtradas = indice.filtrar(**filtros)
 
-# ORIGEM (esquerda) – só aparece se for >= 8h
-fig.add_trace(
-    go.Bar(
-        x=df["DURACAO_H"],
-        y=df["VIAGEM"],
-        base=df["HORA_ABSOLUTA"],
-        orientation="h",
-        marker=dict(color="rgba(0,0,0,0)"),
-        text=textos_esquerda,
-        textposition="inside",
-        insidetextanchor="start",
-        textangle=0,  # mantém na horizontal
-        textfont=dict(size=12, color="black", family="Arial Black"),
-        showlegend=False,
-        hoverinfo="skip",
-        xaxis="x2",
-    )
+# Com muitas viagens o gráfico passa para o modo WebGL paginado
+modo_webgl = st.sidebar.toggle(
+    "Modo WebGL (muitas viagens)", value=len(indice.viagens) >= LIMIAR_WEBGL
 )
-
-# DESTINO (direita) – sempre "SPO" em blocos curtos
-fig.add_trace(
-    go.Bar(
-        x=df["DURACAO_H"],
-        y=df["VIAGEM"],
-        base=df["HORA_ABSOLUTA"],
-        orientation="h",
-        marker=dict(color="rgba(0,0,0,0)"),
-        text=textos_direita,
-        textposition="inside",
-        insidetextanchor="end",
-        textangle=0,
-        textfont=dict(size=12, color="black", family="Arial Black"),
-        showlegend=False,
-        hoverinfo="skip",
-        xaxis="x2",
+pagina, por_pagina = None, VIAGENS_POR_PAGINA
+if modo_webgl:
+    por_pagina = st.sidebar.number_input(
+        "Viagens por página", min_value=10, value=VIAGENS_POR_PAGINA, step=10
     )
+    _, total_paginas = paginar_viagens(viagens_filtradas, 0, por_pagina)
+    pagina = st.sidebar.number_input("Página", min_value=1, max_value=total_paginas, value=1) - 1
+    st.caption(f"Página {pagina + 1} de {total_paginas} ({len(viagens_filtradas)} viagens)")
+
+# === CONEXÕES NOS HUBS ===
+st.sidebar.header("Conexões")
+indice_conexoes = carregar_conexoes(CAMINHO_PLANILHA, hash_planilha)
+espera = st.sidebar.slider(
+    "Espera na conexão (min)", 0, 720, (ESPERA_MINIMA_MIN, ESPERA_MAXIMA_MIN), step=10
 )
+hubs = st.sidebar.multiselect("HUBs", list(indice_conexoes.hubs), default=list(indice_conexoes.hubs))
+mostrar_conexoes = st.sidebar.toggle("Mostrar conexões no gráfico", value=False)
+conexoes = indice_conexoes.conexoes(*espera, hubs=hubs)
 
-# === GRADE DE HORAS E DIAS ===
-x_ticks = list(range(0, 24 * 7 + 1))
-dias_semana = ["QUA", "QUI", "SEX", "SÁB", "DOM", "SEG", "TER"]
-
-ticks_dias = [i * 24 for i in range(7)]
-x_labels = [str(h % 24) if h % 24 != 0 else "" for h in x_ticks]
-
-# Delimitações entre os dias
-for x in ticks_dias:
-    fig.add_shape(
-        type="line",
-        x0=x,
-        x1=x,
-        y0=0,
-        y1=1,
-        xref="x2",
-        yref="paper",
-        line=dict(color="white", width=3),
-        layer="below",
-    )
-
-# Fundo verde claro de 07:00 às 22:00 para cada um dos dez dias
-for dia in range(7):
-    fig.add_shape(
-        type="rect",
-        x0=dia * 24 + 7,
-        x1=dia * 24 + 22,
-        y0=0,
-        y1=1,
-        xref="x2",
-        yref="paper",
-        fillcolor="rgba(144,238,144,0.2)",
-        line=dict(width=0),
-        layer="below"
-    )
-
-# Anotações dos dias da semana
-anotacoes = []
-for i, x in enumerate(ticks_dias):
-    anotacoes.append(dict(
-        x=x + 12,
-        y=1.015,
-        xref="x2",
-        yref="paper",
-        text=f"<b>{dias_semana[i]}</b>",
-        showarrow=False,
-        font=dict(size=14, color="white"),
-        align="center"
-    ))
+# === GRÁFICO ===
+if not viagens_filtradas:
+    st.info("Nenhuma viagem atende aos filtros selecionados.")
+    st.stop()
 
-# Legenda para o período de operação do HUB
-fig.add_trace(
-    go.Scatter(
-        x=[None],
-        y=[None],
-        mode="markers",
-        marker=dict(size=10, color="rgba(144,238,144,0.2)", symbol="square"),
-        showlegend=True,
-        name="HUB - FSA<br>(07:00 às 22:00)",
-        hoverinfo="skip",
-        legendgroup="CATEGORIAS",
-        xaxis="x2"
-    )
+fig = carregar_figura(
+    CAMINHO_PLANILHA, hash_planilha, horizonte, filtros, limiar, pagina, por_pagina
 )
 
-LEGENDA_OBS = {
-    1: "1 - INTEGRADO - FREQ. MÍNIMA",
-    2: "2 - INTEGRADO + HUB GUANABARA",
-    3: "3 - INTERCONEXÕES + HUB GUANABARA",
-    4: "4 - FREQ. MÍNIMA"
-}
-
-# Legenda visual para os códigos de OBS (1 a 4)
-for cod in sorted(LEGENDA_OBS.keys(), reverse=True):
-    texto = LEGENDA_OBS[cod]
-    fig.add_trace(
-        go.Scatter(
-            x=[None],
-            y=[None],
-            mode="markers",
-            marker=dict(size=10, color="white", symbol="circle"),  # cor neutra
-            showlegend=True,
-            name=texto,
-            hoverinfo="skip",
-            legendgroup="CATEGORIAS",
-            xaxis="x2"
-        )
+if mostrar_conexoes:
+    # Cópia: a figura do cache é compartilhada entre as sessões
+    fig = adicionar_conexoes(
+        go.Figure(fig),
+        conexoes,
+        viagens_filtradas if pagina is None else paginar_viagens(viagens_filtradas, pagina, por_pagina)[0],
+        horizonte,
+        webgl=pagina is not None,
     )
 
-# Layout final
-fig.update_layout(
-    annotations=anotacoes,
-    barmode="stack",
-    bargap=0.15,
-    dragmode="pan",
-    xaxis=dict(visible=False),
-    xaxis2=dict(
-        domain=[0.0, 1.0],
-        anchor="y",
-        tickmode="array",
-        tickvals=x_ticks,
-        ticktext=x_labels,
-        showgrid=True,
-        gridcolor="lightgray",
-        griddash="dot",
-        ticklen=3,
-        tickfont=dict(size=9),
-        ticks="outside",
-        title="Horário do Dia",
-        range=[0, 24 * 7], 
-    ),
-    yaxis=dict(
-        title="VIAGEM",
-        autorange="reversed",
-        tickfont=dict(size=9),
-        categoryorder="array",
-        categoryarray=viagens_ordenadas
-    ),
-    legend=dict(
-        orientation="h",
-        yanchor="bottom",   # ancora a parte inferior da legenda
-        y=1.018,              # ligeiramente acima dos dias da semana
-        xanchor="center",
-        x=0.5,               # centralizado horizontalmente
-        font=dict(size=13),
-        traceorder="normal"
-    ),
-    margin=dict(l=0, r=0, t=120, b=60),  # mantém folga no topo
-
-    height=500 + 30 * len(viagens_ordenadas),
-    hoverlabel=dict(font_size=11)
-)
-
-
-
 # Exibição
 config = {
     "scrollZoom": True,
@@ -395,3 +141,25 @@ config = {
     "responsive": True
 }
 st.plotly_chart(fig, use_container_width=True, config=config)
+
+# === OCUPAÇÃO DO HUB ===
+# Recalculada a cada execução a partir dos blocos filtrados (uma varredura)
+ocupacao = ocupacao_hub(blocos_filtrados, horizonte)
+st.subheader("Ocupação do HUB")
+st.plotly_chart(montar_figura_ocupacao(ocupacao, horizonte), use_container_width=True, config=config)
+with st.expander("Picos diários"):
+    st.dataframe(picos(ocupacao), hide_index=True)
+
+# === TABELA DE CONEXÕES ===
+# Só as conexões entre viagens que passam nos filtros
+visiveis = set(viagens_filtradas)
+conexoes = conexoes[
+    conexoes["VIAGEM_CHEGADA"].map(quebrar_viagem).isin(visiveis)
+    & conexoes["VIAGEM_PARTIDA"].map(quebrar_viagem).isin(visiveis)
+]
+st.subheader(f"Conexões nos HUBs ({len(conexoes)})")
+st.dataframe(
+    conexoes.drop(columns=["HORA_ABSOLUTA_CHEGADA", "HORA_ABSOLUTA_PARTIDA"]),
+    hide_index=True,
+    use_container_width=True,
+)